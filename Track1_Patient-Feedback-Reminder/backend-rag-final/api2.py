@@ -6,6 +6,16 @@ import pandas as pd
 from openpyxl import load_workbook
 import re
 import json
+import shutil
+import threading
+import hashlib
+import sqlite3
+import time
+import numpy as np
+import faiss
+import collections
+import multiprocessing
+import multiprocessing.connection
 
 from flask import Flask, request, jsonify
 from werkzeug.exceptions import BadRequest, InternalServerError
@@ -30,6 +40,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# On-disk FAISS index and the per-file metadata (fingerprints and chunk ids) it was built from
+VECTOR_STORE_PATH = "faiss_index_api"
+METADATA_PATH = "processed_files_metadata.json"
+EMBEDDING_MODEL = "models/embedding-001"
+
 class SentimentAnalyzer:
     """Professional sentiment analysis system for healthcare feedback"""
     
@@ -302,7 +317,9 @@ class SentimentAnalyzer:
                 'actionable_insights': ['Manual review required'],
                 'urgency_level': 2,
                 'sentiment_explanation': 'Fallback analysis used',
-                'department_specific_insights': 'Standard protocols apply'
+                'department_specific_insights': 'Standard protocols apply',
+                # Not a real analysis: clients must not cache it and should retry later
+                'provisional': True
             },
             'contextual_data': {
                 'patient_age': feedback_data.get('patient_age', 'unknown'),
@@ -315,6 +332,447 @@ class SentimentAnalyzer:
             'recommendations': ['Manual sentiment analysis required']
         }
 
+# Document extraction and chunking. These are module-level functions so that they can run
+# in the worker processes of PDFRAGService's extraction pool.
+
+# (chunk_size, chunk_overlap) of the text splitter per source type
+CHUNK_SETTINGS = {
+    "pdf": (10000, 1000),
+    "excel": (8000, 500),
+}
+
+
+def extract_pdf_text(pdf_path: str, start_page: int = 0, stop_page: Optional[int] = None) -> str:
+    """Extract text from a PDF file, or from its pages [start_page, stop_page)"""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PdfReader(file)
+        pages = pdf_reader.pages[start_page:stop_page]
+        return "".join(page.extract_text() or "" for page in pages)
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    with open(pdf_path, 'rb') as file:
+        return len(PdfReader(file).pages)
+
+
+def render_sheet_rows(df: pd.DataFrame) -> pd.Series:
+    """
+    Render each row as "Row N: column: value, column: value" (empty cells skipped) with
+    column-wise vectorized string operations instead of iterating over the rows.
+    """
+    rendered = pd.Series("", index=df.index, dtype=object)
+    for col_name in df.columns:
+        column = df[col_name]
+        # str() per value keeps the rendering of timestamps identical to f-string formatting
+        values = column.map(str) if pd.api.types.is_datetime64_any_dtype(column) else column.astype(str)
+        rendered = rendered + (f"{col_name}: " + values + ", ").where(column.notna(), "")
+    row_numbers = pd.Series(range(1, len(df) + 1), index=df.index).astype(str)
+    return ("Row " + row_numbers + ": " + rendered).str.rstrip(", ")
+
+
+# Typed metadata attached to Excel row documents, detected from the column names
+EXCEL_FIELD_COLUMNS = {
+    'feedback_id': ('feedback_id', 'feedbackid', 'id_feedback'),
+    'department': ('department', 'departement', 'département', 'service'),
+    'rating': ('rating', 'note', 'score'),
+    'date': ('date', 'date_submitted', 'feedback_date', 'submitted_at', 'created_at', 'timestamp'),
+}
+
+
+def detect_field_columns(columns) -> Dict[str, object]:
+    """Map each typed field of EXCEL_FIELD_COLUMNS to the first matching column of a sheet"""
+    normalized = {str(col).strip().lower().replace(' ', '_'): col for col in columns}
+    detected = {}
+    for field, aliases in EXCEL_FIELD_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                detected[field] = normalized[alias]
+                break
+    return detected
+
+
+def _optional_values(values) -> List:
+    """Values as a list, with None for every missing value (NaN, NaT, pd.NA) whatever the dtype"""
+    return [None if pd.isna(value) else value for value in values]
+
+
+def _typed_field_values(df: pd.DataFrame, field_columns: Dict[str, object]) -> Dict[str, List]:
+    """Per-row typed values (None when missing or unparsable), computed column-wise"""
+    # Missing values are converted explicitly: with the string dtype of pandas 3,
+    # .where(..., None) keeps NaN instead of storing None
+    size = len(df)
+    values = {field: [None] * size for field in EXCEL_FIELD_COLUMNS}
+    for field in ('feedback_id', 'department'):
+        if field in field_columns:
+            values[field] = [None if pd.isna(value) else str(value).strip() for value in df[field_columns[field]]]
+    if 'rating' in field_columns:
+        ratings = pd.to_numeric(df[field_columns['rating']], errors='coerce')
+        values['rating'] = _optional_values(ratings.astype(object))
+    if 'date' in field_columns:
+        dates = pd.to_datetime(df[field_columns['date']], errors='coerce')
+        values['date'] = _optional_values(dates.dt.strftime('%Y-%m-%d'))
+    return values
+
+
+def extract_excel_documents(excel_path: str, rows_per_document: int = 1) -> Tuple[List[str], List[Dict], Dict]:
+    """
+    Turn every sheet of an Excel file (read in a single pass) into row-level documents of up to
+    rows_per_document rows, grouped by department so that each document has a single one.
+    Returns (documents, their typed metadata, per-sheet details). Document metadata holds the
+    sheet, row range, department, feedback_ids and the rating/date ranges of its rows.
+    """
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    rows_per_document = max(1, rows_per_document)
+    documents = []
+    documents_fields = []
+    sheet_info = {}
+
+    for sheet_name, df in sheets.items():
+        try:
+            sheet_documents = []
+            sheet_fields = []
+            field_columns = detect_field_columns(df.columns)
+            if not df.empty:
+                lines = render_sheet_rows(df).tolist()
+                values = _typed_field_values(df, field_columns)
+
+                if 'department' in field_columns:
+                    department_keys = pd.Series(values['department'], dtype=object).fillna('')
+                    groups = list(department_keys.groupby(department_keys, sort=False).indices.values())
+                else:
+                    groups = [np.arange(len(df))]
+
+                for positions in groups:
+                    for start in range(0, len(positions), rows_per_document):
+                        batch = [int(position) for position in positions[start:start + rows_per_document]]
+                        ratings = [values['rating'][p] for p in batch if values['rating'][p] is not None]
+                        dates = [values['date'][p] for p in batch if values['date'][p] is not None]
+                        fields = {
+                            'sheet': str(sheet_name),
+                            'row_start': batch[0] + 1,
+                            'row_end': batch[-1] + 1,
+                            'department': values['department'][batch[0]],
+                            'feedback_ids': [values['feedback_id'][p] for p in batch if values['feedback_id'][p]],
+                            'rating_min': min(ratings) if ratings else None,
+                            'rating_max': max(ratings) if ratings else None,
+                            'date_min': min(dates) if dates else None,
+                            'date_max': max(dates) if dates else None,
+                        }
+                        text = f"Sheet: {sheet_name}\n" + "\n".join(lines[p] for p in batch)
+                        # Exceptionally long rows are split; every part keeps the rows' metadata
+                        parts = split_text_into_chunks(text, "excel") if len(text) > CHUNK_SETTINGS["excel"][0] else [text]
+                        for part in parts:
+                            sheet_documents.append(part)
+                            sheet_fields.append(dict(fields))
+
+            documents.extend(sheet_documents)
+            documents_fields.extend(sheet_fields)
+
+            sheet_info[sheet_name] = {
+                'rows': len(df),
+                'columns': [str(col) for col in df.columns],
+                'non_empty_cells': int(df.count().sum()),
+                'documents': len(sheet_documents),
+                'typed_fields': {field: str(col) for field, col in field_columns.items()}
+            }
+
+        except Exception as e:
+            logger.warning(f"Error reading sheet {sheet_name}: {str(e)}")
+            continue
+
+    return documents, documents_fields, sheet_info
+
+
+def split_text_into_chunks(text: str, source_type: str = "pdf") -> List[str]:
+    """Split text into chunks for processing"""
+    chunk_size, chunk_overlap = CHUNK_SETTINGS.get(source_type, CHUNK_SETTINGS["pdf"])
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return text_splitter.split_text(text)
+
+
+def extract_and_chunk_file(file_path: str, source_type: str, pdf_page_threshold: int = 0,
+                           rows_per_document: int = 1) -> Dict:
+    """
+    Extract and chunk one file. Returns {'chunks': [...], 'chunk_fields': [...], 'sheets': {...}}
+    (chunk_fields: typed metadata of each Excel row document), or {'page_count': n} without
+    extracting when the file is a PDF of more than pdf_page_threshold pages, so that its pages
+    can be extracted in parallel.
+    """
+    if source_type == 'pdf':
+        if pdf_page_threshold > 0:
+            page_count = count_pdf_pages(file_path)
+            if page_count > pdf_page_threshold:
+                return {'page_count': page_count}
+        text = extract_pdf_text(file_path)
+        return {
+            'chunks': split_text_into_chunks(text, source_type) if text else [],
+            'chunk_fields': None,
+            'sheets': None
+        }
+
+    documents, documents_fields, sheets = extract_excel_documents(file_path, rows_per_document)
+    return {
+        'chunks': documents,
+        'chunk_fields': documents_fields,
+        'sheets': sheets
+    }
+
+
+# Metadata filters accepted by PDFRAGService.query
+QUERY_FILTER_KEYS = (
+    'source_type', 'source', 'department', 'feedback_id',
+    'rating_min', 'rating_max', 'date_from', 'date_to'
+)
+
+
+class ExtractionTimeout(Exception):
+    """A file took longer than the configured per-file extraction timeout"""
+
+
+def _extraction_worker(conn):
+    """Worker process of ExtractionPool: runs the (function, args) tasks received on `conn` until None"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        function, args = task
+        try:
+            conn.send(('done', function(*args)))
+        except Exception as e:
+            # Sent as text: not every exception (or result) can be pickled back to the parent
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class ExtractionPool:
+    """
+    Extraction worker processes managed directly, each with its own pipe, so that a worker stuck
+    on a task can be terminated and replaced without stopping the others. Tasks are handed to
+    idle workers by the parent, and each must complete within `timeout` seconds of being handed out.
+    """
+
+    def __init__(self, workers: int, timeout: float):
+        self.timeout = timeout
+        self._context = multiprocessing.get_context()
+        # pid -> (process, parent end of its pipe)
+        self._workers = {}
+        self._idle = []
+        # pid -> (task_id, deadline)
+        self._running = {}
+        self._waiting = collections.deque()
+        self._next_task_id = 0
+        for _ in range(workers):
+            self._start_worker()
+
+    def _start_worker(self):
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_extraction_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[process.pid] = (process, conn)
+        self._idle.append(process.pid)
+
+    def _replace_worker(self, pid: int):
+        process, conn = self._workers.pop(pid)
+        process.terminate()
+        process.join(timeout=5)
+        conn.close()
+        self._start_worker()
+
+    def submit(self, function, *args) -> int:
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        self._waiting.append((task_id, function, args))
+        return task_id
+
+    def _dispatch(self):
+        while self._idle and self._waiting:
+            pid = self._idle.pop()
+            task_id, function, args = self._waiting.popleft()
+            self._workers[pid][1].send((function, args))
+            self._running[pid] = (task_id, time.monotonic() + self.timeout)
+
+    def results(self):
+        """
+        Yield (task_id, result) as tasks complete, including tasks submitted meanwhile.
+        A task that failed or timed out yields its exception.
+        """
+        while True:
+            self._dispatch()
+            if not self._running:
+                return
+            wait = max(0.0, min(deadline for _, deadline in self._running.values()) - time.monotonic())
+            pids = {self._workers[pid][1]: pid for pid in self._running}
+            for conn in multiprocessing.connection.wait(list(pids), timeout=wait):
+                pid = pids[conn]
+                task_id, _ = self._running.pop(pid)
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    # The worker died (crash, out of memory): start a new one
+                    self._replace_worker(pid)
+                    yield task_id, RuntimeError(f"extraction worker {pid} exited unexpectedly")
+                    continue
+                self._idle.append(pid)
+                yield task_id, payload if kind == 'done' else RuntimeError(payload)
+
+            now = time.monotonic()
+            for pid, (task_id, deadline) in list(self._running.items()):
+                if deadline <= now:
+                    del self._running[pid]
+                    self._replace_worker(pid)
+                    yield task_id, ExtractionTimeout(f"extraction took more than {self.timeout}s")
+
+    def shutdown(self):
+        """Stop the workers: idle ones exit on their own, busy or stuck ones are terminated"""
+        for pid, (process, conn) in self._workers.items():
+            if pid not in self._running:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+        for pid, (process, conn) in self._workers.items():
+            process.join(timeout=0 if pid in self._running else 5)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=5)
+            conn.close()
+        self._workers = {}
+        self._idle = []
+        self._running = {}
+        self._waiting.clear()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of chunk embeddings (SQLite, vectors stored as float32 NumPy blobs).
+    Entries are keyed by a hash of the embedding model name and the chunk text, so an
+    unchanged chunk is never sent to the embeddings API twice. The least recently used
+    entries are evicted once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, model_name: str, max_bytes: int, write_batch_size: int = 256):
+        self.path = path
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.write_batch_size = max(1, write_batch_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors of the given texts, keyed by text"""
+        keys = {self._key(text): text for text in texts}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, self._key(text)) for text in found]
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Write computed vectors back in a single transaction, then enforce the size bound"""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            array = np.asarray(vector, dtype=np.float32)
+            rows.append((self._key(text), self.model_name, int(array.shape[0]), array.tobytes(), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        if total_bytes <= self.max_bytes or count == 0:
+            return
+        # Entries of one model have the same size: estimate how many oldest entries to drop
+        excess_entries = -(-(total_bytes - self.max_bytes) * count // total_bytes)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess_entries,)
+        )
+        self._conn.commit()
+        self.evictions += excess_entries
+        logger.info(f"Embedding cache: evicted {excess_entries} least recently used entries")
+
+    def embed_documents(self, embeddings, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts through the cache: cached vectors are reused and only the missing ones are
+        sent to `embeddings`, batch by batch, each batch being written back as soon as it is computed.
+        """
+        vectors = self.get_many(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        for start in range(0, len(missing), self.write_batch_size):
+            batch = missing[start:start + self.write_batch_size]
+            batch_vectors = embeddings.embed_documents(batch)
+            self.put_many(batch, batch_vectors)
+            vectors.update(zip(batch, batch_vectors))
+        return [vectors[text] for text in texts]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "model": self.model_name,
+            "entries": count,
+            "size_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions
+        }
+
 class PDFRAGService:
     """Enhanced RAG service with sentiment analysis integration"""
     def __init__(self, api_key: str, pdf_directory: str = "pdfs", excel_directory: str = "excel_files"):
@@ -323,9 +781,26 @@ class PDFRAGService:
         self.excel_directory = excel_directory
         self.vector_store = None
         self.embeddings = None
+        self.embedding_cache = None
         self.chain = None
         self.pdf_metadata = {}
         self.excel_metadata = {}
+        # Serializes index updates with searches (FAISS is not safe for concurrent writes)
+        self._index_lock = threading.RLock()
+        # Extraction pool (0 or 1 worker: files are extracted in-process, one at a time)
+        self.extraction_workers = int(os.getenv('EXTRACTION_WORKERS', str(min(os.cpu_count() or 1, 4))))
+        self.extraction_timeout = float(os.getenv('EXTRACTION_FILE_TIMEOUT', '300'))
+        # PDFs with more pages than this are split into page ranges extracted in parallel
+        self.pdf_page_threshold = int(os.getenv('PDF_PAGE_PARALLEL_THRESHOLD', '200'))
+        self.pdf_pages_per_task = max(1, int(os.getenv('PDF_PAGES_PER_TASK', '50')))
+        # Excel rows are indexed as documents of up to this many rows, with typed metadata
+        self.excel_rows_per_document = max(1, int(os.getenv('EXCEL_ROWS_PER_DOCUMENT', '1')))
+        # Typed metadata of the indexed documents by FAISS position, rebuilt after index changes
+        self._metadata_frame = None
+        # Files indexed, removed and failed by the last index update
+        self.last_index_summary = {'indexed': [], 'removed': [], 'failed': []}
+        # Files that could not be indexed, with the fingerprint they had: skipped until they change
+        self.failed_files = {}
     
         # Initialize sentiment analyzer
         self.sentiment_analyzer = SentimentAnalyzer(api_key)
@@ -339,310 +814,417 @@ class PDFRAGService:
         """Initialize Google AI embeddings"""
         try:
             self.embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001", 
+                model=EMBEDDING_MODEL, 
                 google_api_key=self.api_key
             )
             logger.info("Embeddings initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize embeddings: {str(e)}")
             raise
-    
-    def _extract_pdf_text(self, pdf_path: str) -> str:
-        """Extract text from a single PDF file"""
+
+        if os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() != 'true':
+            logger.info("Embedding cache disabled")
+            return
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text
-                return text
+            self.embedding_cache = EmbeddingCache(
+                os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3'),
+                EMBEDDING_MODEL,
+                max_bytes=int(float(os.getenv('EMBEDDING_CACHE_MAX_MB', '512')) * 1024 * 1024),
+                write_batch_size=int(os.getenv('EMBEDDING_CACHE_WRITE_BATCH', '256'))
+            )
+            logger.info(f"Embedding cache opened: {self.embedding_cache.path}")
         except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-            return ""
+            logger.warning(f"Failed to open embedding cache: {str(e)}. Continuing without cache.")
+            self.embedding_cache = None
+
+    def _embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Embed chunks, reusing cached vectors before calling the embeddings API"""
+        if self.embedding_cache is None:
+            return self.embeddings.embed_documents(chunks)
+        return self.embedding_cache.embed_documents(self.embeddings, chunks)
     
-    def _extract_excel_text(self, excel_path: str) -> str:
-        """Extract text from all sheets of an Excel file"""
-        try:
-            excel_file = pd.ExcelFile(excel_path)
-            combined_text = ""
-            sheet_info = {}
-            
-            for sheet_name in excel_file.sheet_names:
-                try:
-                    df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                    sheet_text = f"\n=== SHEET: {sheet_name} ===\n"
-                    
-                    if not df.empty:
-                        sheet_text += f"Columns: {', '.join(df.columns.tolist())}\n"
-                        sheet_text += f"Row count: {len(df)}\n\n"
-                        
-                        for index, row in df.iterrows():
-                            row_text = f"Row {index + 1}: "
-                            for col_name, value in row.items():
-                                if pd.notna(value):
-                                    row_text += f"{col_name}: {value}, "
-                            sheet_text += row_text.rstrip(", ") + "\n"
-                    
-                    combined_text += sheet_text + "\n"
-                    
-                    sheet_info[sheet_name] = {
-                        'rows': len(df),
-                        'columns': df.columns.tolist(),
-                        'non_empty_cells': df.count().sum()
-                    }
-                    
-                except Exception as e:
-                    logger.warning(f"Error reading sheet {sheet_name}: {str(e)}")
+    def _scan_source_files(self) -> Dict[str, Dict]:
+        """List the PDF and Excel files currently on disk with their size and modification time"""
+        current_files = {}
+        sources = [
+            (self.pdf_directory, ('.pdf',), 'pdf'),
+            (self.excel_directory, ('.xlsx', '.xls'), 'excel')
+        ]
+        for directory, extensions, source_type in sources:
+            if not os.path.exists(directory):
+                continue
+            for file in os.listdir(directory):
+                if not file.lower().endswith(extensions):
                     continue
-            
-            filename = os.path.basename(excel_path)
-            self.excel_metadata[filename] = {
-                'path': excel_path,
-                'sheets': sheet_info,
-                'total_sheets': len(sheet_info),
-                'processed_at': datetime.now().isoformat()
-            }
-            
-            return combined_text
-            
-        except Exception as e:
-            logger.error(f"Error extracting Excel text from {excel_path}: {str(e)}")
-            return ""
-    
-    def _get_text_chunks(self, text: str, source_type: str = "pdf") -> List[str]:
-        """Split text into chunks for processing"""
-        if source_type == "excel":
-            chunk_size = 8000
-            chunk_overlap = 500
-        else:
-            chunk_size = 10000
-            chunk_overlap = 1000
-            
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
-        )
-        return text_splitter.split_text(text)
-    
+                file_path = os.path.join(directory, file)
+                try:
+                    modified = os.path.getmtime(file_path)
+                    size = os.path.getsize(file_path)
+                except (OSError, PermissionError) as e:
+                    logger.warning(f"Cannot access file {file_path}: {str(e)}")
+                    modified, size = None, None  # Treat inaccessible files as changed
+                current_files[file] = {
+                    'path': file_path,
+                    'source_type': source_type,
+                    'modified': modified,
+                    'size': size
+                }
+        return current_files
+
+    def _cached_file_info(self, file: str) -> Optional[Dict]:
+        return self.pdf_metadata.get(file, self.excel_metadata.get(file))
+
+    @staticmethod
+    def _fingerprint_changed(info: Dict, recorded: Dict) -> bool:
+        """Compare a scanned file with a recorded fingerprint (1-second tolerance for timestamp)"""
+        return (info['modified'] is None or
+                abs(info['modified'] - recorded.get('last_modified', 0)) > 1.0 or
+                info['size'] != recorded.get('file_size', 0))
+
+    def _failed_unchanged(self, file: str, info: Dict) -> bool:
+        """True when the file already failed to index with its current content and settings"""
+        failed_info = self.failed_files.get(file)
+        if failed_info is None or self._fingerprint_changed(info, failed_info):
+            return False
+        return (info['source_type'] != 'excel' or
+                failed_info.get('rows_per_document') == self.excel_rows_per_document)
+
+    def _diff_files(self, current_files: Dict[str, Dict]) -> Tuple[List[str], List[str]]:
+        """Return (files to (re)index, files removed from disk) compared with the cached metadata"""
+        to_index = []
+        for file, info in current_files.items():
+            cached_info = self._cached_file_info(file)
+            if self._failed_unchanged(file, info):
+                # Retried once the file changes, not on every check
+                continue
+            if not cached_info:
+                logger.info(f"New file detected: {file}")
+                to_index.append(file)
+            elif self._fingerprint_changed(info, cached_info):
+                logger.info(f"File modified: {file}")
+                to_index.append(file)
+            # Excel files indexed as text blobs, or with another EXCEL_ROWS_PER_DOCUMENT
+            elif (info['source_type'] == 'excel' and
+                  cached_info.get('rows_per_document') != self.excel_rows_per_document):
+                logger.info(f"Excel document layout changed: {file}")
+                to_index.append(file)
+
+        all_cached_files = set(self.pdf_metadata.keys()) | set(self.excel_metadata.keys())
+        removed = sorted(all_cached_files - set(current_files.keys()))
+        for file in removed:
+            logger.info(f"File deleted: {file}")
+        return to_index, removed
+
     def _files_changed(self) -> bool:
         """Check if files have been modified since last processing"""
         try:
-            current_files = {}
-            
-            # Check PDF files
-            if os.path.exists(self.pdf_directory):
-                for file in os.listdir(self.pdf_directory):
-                    if file.lower().endswith('.pdf'):
-                        file_path = os.path.join(self.pdf_directory, file)
-                        try:
-                            current_files[file] = {
-                                'path': file_path,
-                                'modified': os.path.getmtime(file_path),
-                                'size': os.path.getsize(file_path)
-                            }
-                        except (OSError, PermissionError) as e:
-                            logger.warning(f"Cannot access file {file_path}: {str(e)}")
-                            return True  # Treat inaccessible files as changed
-            
-            # Check Excel files
-            if os.path.exists(self.excel_directory):
-                for file in os.listdir(self.excel_directory):
-                    if file.lower().endswith(('.xlsx', '.xls')):
-                        file_path = os.path.join(self.excel_directory, file)
-                        try:
-                            current_files[file] = {
-                                'path': file_path,
-                                'modified': os.path.getmtime(file_path),
-                                'size': os.path.getsize(file_path)
-                            }
-                        except (OSError, PermissionError) as e:
-                            logger.warning(f"Cannot access file {file_path}: {str(e)}")
-                            return True  # Treat inaccessible files as changed
-            
-            # Compare with cached metadata
-            for file, info in current_files.items():
-                cached_info = self.pdf_metadata.get(file, self.excel_metadata.get(file))
-                if not cached_info:
-                    logger.info(f"New file detected: {file}")
-                    return True  # New file found
-                
-                # Check if file has changed (allow 1-second tolerance for timestamp)
-                if (abs(info['modified'] - cached_info.get('last_modified', 0)) > 1.0 or 
-                    info['size'] != cached_info.get('file_size', 0)):
-                    logger.info(f"File modified: {file}")
-                    return True
-            
-            # Check for deleted files
-            all_cached_files = set(self.pdf_metadata.keys()) | set(self.excel_metadata.keys())
-            current_file_names = set(current_files.keys())
-            if all_cached_files != current_file_names:
-                logger.info("File set changed (files added or deleted)")
-                return True
-            
-            logger.info("No file changes detected")
-            return False
-        
+            to_index, removed = self._diff_files(self._scan_source_files())
+            if not to_index and not removed:
+                logger.info("No file changes detected")
+                return False
+            return True
+
         except Exception as e:
             logger.warning(f"Error checking file changes: {str(e)}. Triggering reprocessing as a precaution.")
             return True
-    
+
+    @staticmethod
+    def _chunk_ids(file: str, count: int) -> List[str]:
+        """Stable vector store ids of a file's chunks, used to replace or delete them later"""
+        return [f"{file}::{i}" for i in range(count)]
+
+    def _extract_files_sequentially(self, files: List[Tuple[str, Dict]]) -> Dict[str, object]:
+        results = {}
+        for file, info in files:
+            logger.info(f"Processing {info['source_type'].upper()}: {file}")
+            try:
+                results[file] = extract_and_chunk_file(
+                    info['path'], info['source_type'], rows_per_document=self.excel_rows_per_document
+                )
+            except Exception as e:
+                results[file] = e
+        return results
+
+    def _extract_files(self, files: List[Tuple[str, Dict]]) -> Dict[str, object]:
+        """
+        Extract and chunk files in a pool of worker processes, each task (a file, or a page range
+        of a large PDF) within extraction_timeout seconds. Large PDFs are split into page ranges
+        extracted in parallel. Results are merged in the order of `files`; a file that failed or
+        timed out maps to its exception.
+        """
+        if self.extraction_workers <= 1 or not files:
+            return self._extract_files_sequentially(files)
+        try:
+            pool = ExtractionPool(self.extraction_workers, self.extraction_timeout)
+        except Exception as e:
+            logger.warning(f"Cannot start extraction pool: {str(e)}. Extracting sequentially.")
+            return self._extract_files_sequentially(files)
+
+        results = {}
+        file_tasks = {}
+        # Page range task -> (file, range index), and the texts of each split PDF by range
+        page_tasks = {}
+        page_texts = {}
+        try:
+            for file, info in files:
+                logger.info(f"Processing {info['source_type'].upper()}: {file}")
+                results[file] = None  # Keeps the file's position; filled in below
+                file_tasks[pool.submit(
+                    extract_and_chunk_file, info['path'], info['source_type'], self.pdf_page_threshold,
+                    self.excel_rows_per_document
+                )] = file
+            paths = {file: info['path'] for file, info in files}
+
+            for task_id, result in pool.results():
+                if task_id in page_tasks:
+                    file, index = page_tasks.pop(task_id)
+                    if isinstance(results[file], Exception):
+                        continue  # Another range of this file already failed
+                    if isinstance(result, Exception):
+                        results[file] = result
+                        continue
+                    page_texts[file][index] = result
+                    if all(text is not None for text in page_texts[file]):
+                        text = "".join(page_texts.pop(file))
+                        results[file] = {
+                            'chunks': split_text_into_chunks(text, 'pdf') if text else [],
+                            'chunk_fields': None,
+                            'sheets': None
+                        }
+                    continue
+
+                file = file_tasks.pop(task_id)
+                if isinstance(result, Exception) or 'page_count' not in result:
+                    results[file] = result
+                    continue
+
+                page_count = result['page_count']
+                logger.info(f"Extracting {page_count} pages of {file} in parallel")
+                starts = range(0, page_count, self.pdf_pages_per_task)
+                page_texts[file] = [None] * len(starts)
+                for index, start in enumerate(starts):
+                    page_tasks[pool.submit(
+                        extract_pdf_text, paths[file], start, min(start + self.pdf_pages_per_task, page_count)
+                    )] = (file, index)
+        finally:
+            pool.shutdown()
+
+        return results
+
+    def _record_file_chunks(self, file: str, info: Dict, result: Dict) -> Tuple[List[str], List[Dict]]:
+        """Record the metadata entry of an extracted file and build its chunks' metadata"""
+        chunks = result['chunks']
+        source_type = info['source_type']
+        if not chunks:
+            logger.warning(f"No text extracted from {file}")
+            return [], []
+
+        file_metadata = {
+            'path': info['path'],
+            'processed_at': datetime.now().isoformat()
+        }
+        if source_type == 'pdf':
+            self.pdf_metadata[file] = file_metadata
+        else:
+            file_metadata['sheets'] = result['sheets']
+            file_metadata['total_sheets'] = len(result['sheets'])
+            file_metadata['rows_per_document'] = self.excel_rows_per_document
+            self.excel_metadata[file] = file_metadata
+
+        file_metadata['chunk_count'] = len(chunks)
+        file_metadata['chunk_ids'] = self._chunk_ids(file, len(chunks))
+        file_metadata['source_type'] = source_type
+        # Fingerprint taken before extraction: a file modified meanwhile is re-indexed next time
+        file_metadata['last_modified'] = info['modified']
+        file_metadata['file_size'] = info['size']
+
+        chunk_metadata = [
+            {
+                'source': file,
+                'source_type': source_type,
+                'chunk_id': i,
+                'text_preview': chunk[:100] + "..." if len(chunk) > 100 else chunk
+            } for i, chunk in enumerate(chunks)
+        ]
+        for metadata, fields in zip(chunk_metadata, result.get('chunk_fields') or []):
+            metadata.update(fields)
+        return chunks, chunk_metadata
+
+    def _record_failed_file(self, file: str, info: Dict, error: str):
+        """Remember the fingerprint a file failed with, so that it is not reprocessed until it changes"""
+        failed_info = {
+            'source_type': info['source_type'],
+            'last_modified': info['modified'],
+            'file_size': info['size'],
+            'error': error,
+            'failed_at': datetime.now().isoformat()
+        }
+        if info['source_type'] == 'excel':
+            failed_info['rows_per_document'] = self.excel_rows_per_document
+        self.failed_files[file] = failed_info
+
+    def _forget_file(self, file: str) -> List[str]:
+        """Drop a file's metadata entry and return the vector ids it owned"""
+        cached_info = self.pdf_metadata.pop(file, None) or self.excel_metadata.pop(file, None) or {}
+        return cached_info.get('chunk_ids', [])
+
+    def _delete_vectors(self, ids: List[str]):
+        if not ids or self.vector_store is None:
+            return
+        known_ids = set(self.vector_store.index_to_docstore_id.values())
+        ids = [doc_id for doc_id in ids if doc_id in known_ids]
+        if ids:
+            self.vector_store.delete(ids)
+            self._metadata_frame = None
+
+    def _add_vectors(self, chunks: List[str], vectors: List[List[float]], chunk_metadata: List[Dict], ids: List[str]):
+        text_embeddings = list(zip(chunks, vectors))
+        self._metadata_frame = None
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_embeddings(
+                text_embeddings,
+                self.embeddings,
+                metadatas=chunk_metadata,
+                ids=ids
+            )
+        else:
+            self.vector_store.add_embeddings(text_embeddings, metadatas=chunk_metadata, ids=ids)
+
+    def _persist_vector_store(self):
+        """Save the FAISS index and the per-file metadata, or remove the index once it is empty"""
+        if self.vector_store is not None and self.vector_store.index.ntotal == 0:
+            self.vector_store = None
+
+        if self.vector_store is not None:
+            self.vector_store.save_local(VECTOR_STORE_PATH)
+            logger.info(f"Vector store saved to {VECTOR_STORE_PATH}")
+        elif os.path.exists(VECTOR_STORE_PATH):
+            shutil.rmtree(VECTOR_STORE_PATH)
+            logger.info(f"Empty vector store removed from {VECTOR_STORE_PATH}")
+
+        self._save_metadata()
+
+    def _update_vector_store(self) -> Dict[str, List[str]]:
+        """
+        Bring the vector store in line with the files on disk: only new or modified files
+        are extracted and embedded, their previous chunks are replaced, and the chunks of
+        deleted files are removed. Returns the files indexed, removed and failed.
+        """
+        with self._index_lock:
+            current_files = self._scan_source_files()
+            to_index, removed = self._diff_files(current_files)
+            summary = {'indexed': [], 'removed': [], 'failed': []}
+            self.last_index_summary = summary
+            if not to_index and not removed:
+                return summary
+
+            logger.info(f"Incremental update: {len(to_index)} file(s) to index, {len(removed)} removed")
+
+            for file in removed:
+                self._delete_vectors(self._forget_file(file))
+                summary['removed'].append(file)
+            for file in [file for file in self.failed_files if file not in current_files]:
+                del self.failed_files[file]
+
+            extracted = self._extract_files([(file, current_files[file]) for file in to_index])
+
+            for file in to_index:
+                info = current_files[file]
+                previous_info = self._cached_file_info(file)
+                previous_ids = (previous_info or {}).get('chunk_ids', [])
+                try:
+                    result = extracted[file]
+                    if isinstance(result, Exception):
+                        raise result
+                    chunks, chunk_metadata = self._record_file_chunks(file, info, result)
+                    if not chunks:
+                        # Nothing left to index for this file: drop its previous chunks
+                        self._forget_file(file)
+                        self._delete_vectors(previous_ids)
+                        self._record_failed_file(file, info, "No text extracted")
+                        summary['failed'].append(file)
+                        continue
+
+                    # Embed before touching the index so that a failed call keeps the previous chunks
+                    vectors = self._embed_chunks(chunks)
+                    self._delete_vectors(previous_ids)
+                    self._add_vectors(chunks, vectors, chunk_metadata, self._chunk_ids(file, len(chunks)))
+                    self.failed_files.pop(file, None)
+                    summary['indexed'].append(file)
+                except Exception as e:
+                    logger.error(f"Error processing {info['source_type'].upper()} {file}: {str(e)}")
+                    # Keep the previous version's chunks and metadata (if any); this version is
+                    # skipped until the file changes again
+                    self._forget_file(file)
+                    if previous_info is not None:
+                        source_type = previous_info.get('source_type', info['source_type'])
+                        metadata_map = self.pdf_metadata if source_type == 'pdf' else self.excel_metadata
+                        metadata_map[file] = previous_info
+                    self._record_failed_file(file, info, str(e))
+                    summary['failed'].append(file)
+
+            self._persist_vector_store()
+
+            total_chunks = self.vector_store.index.ntotal if self.vector_store is not None else 0
+            logger.info(
+                f"Vector store updated: {len(summary['indexed'])} indexed, {len(summary['removed'])} removed, "
+                f"{len(summary['failed'])} failed ({total_chunks} chunks in total)"
+            )
+            logger.info(f"Sources: {len(self.pdf_metadata)} PDFs, {len(self.excel_metadata)} Excel files")
+            return summary
+
+    def refresh_index(self) -> Dict[str, List[str]]:
+        """Incrementally apply file additions, modifications and deletions to the vector store"""
+        summary = self._update_vector_store()
+        if self.vector_store is None and (summary['indexed'] or summary['failed']):
+            raise ValueError("No valid content found")
+        return summary
+
     def _load_and_process_files(self):
-        """Load all PDFs and Excel files and create vector store"""
+        """Load all PDFs and Excel files and create vector store from scratch"""
         # Ensure directories exist
         for directory in [self.pdf_directory, self.excel_directory]:
             if not os.path.exists(directory):
                 os.makedirs(directory)
                 logger.info(f"Directory created: {directory}")
-        
-        pdf_files = [f for f in os.listdir(self.pdf_directory) if f.lower().endswith('.pdf')]
-        excel_files = [f for f in os.listdir(self.excel_directory) 
-                      if f.lower().endswith(('.xlsx', '.xls'))]
-        
-        if not pdf_files and not excel_files:
-            logger.warning("No PDF or Excel files found")
+
+        with self._index_lock:
             self.vector_store = None
-            return
-        
-        logger.info(f"Found {len(pdf_files)} PDF files and {len(excel_files)} Excel files")
-        
-        all_chunks = []
-        chunk_metadata = []
-        
-        # Process PDF files
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(self.pdf_directory, pdf_file)
-            logger.info(f"Processing PDF: {pdf_file}")
-            
-            try:
-                text = self._extract_pdf_text(pdf_path)
-                if text:
-                    chunks = self._get_text_chunks(text, "pdf")
-                    all_chunks.extend(chunks)
-                    
-                    self.pdf_metadata[pdf_file] = {
-                        'path': pdf_path,
-                        'chunk_count': len(chunks),
-                        'source_type': 'pdf',
-                        'processed_at': datetime.now().isoformat(),
-                        'last_modified': os.path.getmtime(pdf_path),
-                        'file_size': os.path.getsize(pdf_path)
-                    }
-                    
-                    for i, chunk in enumerate(chunks):
-                        chunk_metadata.append({
-                            'source': pdf_file,
-                            'source_type': 'pdf',
-                            'chunk_id': i,
-                            'text_preview': chunk[:100] + "..." if len(chunk) > 100 else chunk
-                        })
-                else:
-                    logger.warning(f"No text extracted from {pdf_file}")
-            except Exception as e:
-                logger.error(f"Error processing PDF {pdf_file}: {str(e)}")
-                continue
-        
-        # Process Excel files
-        for excel_file in excel_files:
-            excel_path = os.path.join(self.excel_directory, excel_file)
-            logger.info(f"Processing Excel file: {excel_file}")
-            
-            try:
-                text = self._extract_excel_text(excel_path)
-                if text:
-                    chunks = self._get_text_chunks(text, "excel")
-                    all_chunks.extend(chunks)
-                    
-                    self.excel_metadata[excel_file]['chunk_count'] = len(chunks)
-                    self.excel_metadata[excel_file]['source_type'] = 'excel'
-                    self.excel_metadata[excel_file]['last_modified'] = os.path.getmtime(excel_path)
-                    self.excel_metadata[excel_file]['file_size'] = os.path.getsize(excel_path)
-                    
-                    for i, chunk in enumerate(chunks):
-                        chunk_metadata.append({
-                            'source': excel_file,
-                            'source_type': 'excel',
-                            'chunk_id': i,
-                            'text_preview': chunk[:100] + "..." if len(chunk) > 100 else chunk
-                        })
-                else:
-                    logger.warning(f"No text extracted from {excel_file}")
-            except Exception as e:
-                logger.error(f"Error processing Excel {excel_file}: {str(e)}")
-                continue
-        
-        if all_chunks:
-            try:
-                self.vector_store = FAISS.from_texts(
-                    all_chunks, 
-                    embedding=self.embeddings,
-                    metadatas=chunk_metadata
-                )
-                
-                vector_store_path = "faiss_index_api"
-                self.vector_store.save_local(vector_store_path)
-                logger.info(f"Vector store saved to {vector_store_path}")
-                
-                # Save metadata
-                self._save_metadata()
-                
-                logger.info(f"Vector store created with {len(all_chunks)} chunks")
-                logger.info(f"Sources: {len(self.pdf_metadata)} PDFs, {len(self.excel_metadata)} Excel files")
-                
-            except Exception as e:
-                logger.error(f"Failed to create vector store: {str(e)}")
-                self.vector_store = None
-                raise
-        else:
+            self._metadata_frame = None
+            self.pdf_metadata = {}
+            self.excel_metadata = {}
+            self.failed_files = {}
+
+            if not self._scan_source_files():
+                logger.warning("No PDF or Excel files found")
+                self._persist_vector_store()
+                return
+
+            summary = self._update_vector_store()
+
+        if self.vector_store is None:
             logger.error("No valid text extracted from files")
-            self.vector_store = None
             raise ValueError("No valid content found")
-    
+        logger.info(f"Vector store created from {len(summary['indexed'])} files")
+
     def _save_metadata(self):
         """Save metadata to file for caching"""
         try:
-            # Remove stale metadata entries
-            for file in list(self.pdf_metadata.keys()):
-                file_path = self.pdf_metadata[file]['path']
-                if not os.path.exists(file_path):
-                    logger.info(f"Removing stale metadata for {file}")
-                    del self.pdf_metadata[file]
-            
-            for file in list(self.excel_metadata.keys()):
-                file_path = self.excel_metadata[file]['path']
-                if not os.path.exists(file_path):
-                    logger.info(f"Removing stale metadata for {file}")
-                    del self.excel_metadata[file]
-            
-            # Update metadata with file info
-            for file, meta in self.pdf_metadata.items():
-                file_path = meta['path']
-                if os.path.exists(file_path):
-                    meta['last_modified'] = os.path.getmtime(file_path)
-                    meta['file_size'] = os.path.getsize(file_path)
-            
-            for file, meta in self.excel_metadata.items():
-                file_path = meta['path']
-                if os.path.exists(file_path):
-                    meta['last_modified'] = os.path.getmtime(file_path)
-                    meta['file_size'] = os.path.getsize(file_path)
-            
             metadata = {
                 'pdf_metadata': self.pdf_metadata,
                 'excel_metadata': self.excel_metadata,
+                'failed_files': self.failed_files,
                 'last_updated': datetime.now().isoformat()
             }
-            
-            metadata_path = "processed_files_metadata.json"
-            with open(metadata_path, 'w') as f:
+
+            with open(METADATA_PATH, 'w') as f:
                 json.dump(metadata, f, indent=2)
-            
-            logger.info(f"Metadata saved to {metadata_path}")
-        
+
+            logger.info(f"Metadata saved to {METADATA_PATH}")
+
         except Exception as e:
             logger.warning(f"Error saving metadata: {str(e)}. Continuing without metadata update.")
-    
+
     def _validate_vector_store(self) -> bool:
         """Validate if the current vector store is usable"""
         if self.vector_store is None:
@@ -654,58 +1236,65 @@ class PDFRAGService:
         except Exception as e:
             logger.warning(f"Vector store validation failed: {str(e)}")
             return False
-    
+
+    def _metadata_supports_incremental_updates(self) -> bool:
+        """Metadata written before per-file chunk ids were tracked requires a full rebuild"""
+        return all(
+            'chunk_ids' in meta
+            for meta in list(self.pdf_metadata.values()) + list(self.excel_metadata.values())
+        )
+
     def _load_or_create_vector_store(self):
         """Load existing vector store or create new one if needed"""
-        vector_store_path = "faiss_index_api"
-        metadata_path = "processed_files_metadata.json"
-        
         # Initialize metadata if empty
         self.pdf_metadata = self.pdf_metadata or {}
         self.excel_metadata = self.excel_metadata or {}
-        
+
         # Check if vector store and metadata exist
-        if os.path.exists(vector_store_path) and os.path.exists(metadata_path):
+        if os.path.exists(VECTOR_STORE_PATH) and os.path.exists(METADATA_PATH):
             try:
                 # Load existing vector store
                 self.vector_store = FAISS.load_local(
-                    vector_store_path, 
+                    VECTOR_STORE_PATH,
                     self.embeddings,
                     allow_dangerous_deserialization=True
                 )
+                self._metadata_frame = None
                 logger.info("Loaded existing vector store from cache")
-                
+
                 # Load metadata
                 try:
-                    with open(metadata_path, 'r') as f:
+                    with open(METADATA_PATH, 'r') as f:
                         metadata = json.load(f)
                         self.pdf_metadata = metadata.get('pdf_metadata', {})
                         self.excel_metadata = metadata.get('excel_metadata', {})
+                        self.failed_files = metadata.get('failed_files', {})
                         logger.info("Loaded existing metadata from cache")
                 except Exception as e:
                     logger.warning(f"Failed to load metadata: {str(e)}. Reprocessing files.")
                     self._load_and_process_files()
                     return
-                
+
                 # Validate vector store
-                if self._validate_vector_store():
-                    # Check if files have changed
-                    if self._files_changed():
-                        logger.info("Files have changed, reprocessing...")
-                        self._load_and_process_files()
-                    else:
-                        logger.info("Files unchanged, using cached vector store")
-                else:
+                if not self._validate_vector_store():
                     logger.info("Vector store invalid, reprocessing...")
                     self._load_and_process_files()
-                
+                elif not self._metadata_supports_incremental_updates():
+                    logger.info("Cached metadata has no per-file chunk ids, reprocessing...")
+                    self._load_and_process_files()
+                elif self._files_changed():
+                    logger.info("Files have changed, updating vector store incrementally...")
+                    self.refresh_index()
+                else:
+                    logger.info("Files unchanged, using cached vector store")
+
             except Exception as e:
                 logger.warning(f"Failed to load cached vector store: {str(e)}. Creating new vector store...")
                 self._load_and_process_files()
         else:
             logger.info("No cached vector store or metadata found, creating new one...")
             self._load_and_process_files()
-    
+
     def _initialize_chain(self):
         """Initialize conversational chain with instructions for PDF and Excel"""
         prompt_template = """
@@ -754,16 +1343,138 @@ class PDFRAGService:
             logger.error(f"Failed to initialize chain: {str(e)}")
             raise
     
-    def query(self, question: str) -> Dict:
-        """Process a query and return a fresh response"""
+    @staticmethod
+    def _normalize_filters(filters: Optional[Dict]) -> Dict:
+        """
+        Validate query metadata filters. Supported keys: source_type, source, department and
+        feedback_id (a value or a list of values), rating_min/rating_max (numbers) and
+        date_from/date_to (ISO dates, inclusive).
+        """
+        if not filters:
+            return {}
+        if not isinstance(filters, dict):
+            raise BadRequest("Filters must be an object")
+
+        unknown = set(filters) - set(QUERY_FILTER_KEYS)
+        if unknown:
+            raise BadRequest(f"Unknown filters: {', '.join(sorted(unknown))}. Supported: {', '.join(QUERY_FILTER_KEYS)}")
+
+        normalized = {}
+        for key, value in filters.items():
+            if value is None or value == [] or value == "":
+                continue
+            if key in ('source_type', 'source', 'department', 'feedback_id'):
+                values = value if isinstance(value, list) else [value]
+                if not all(isinstance(item, (str, int)) for item in values):
+                    raise BadRequest(f"Filter {key} must be a string or a list of strings")
+                normalized[key] = [str(item).strip() for item in values]
+            elif key in ('rating_min', 'rating_max'):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise BadRequest(f"Filter {key} must be a number")
+                normalized[key] = float(value)
+            else:
+                try:
+                    normalized[key] = datetime.fromisoformat(str(value)).strftime('%Y-%m-%d')
+                except ValueError:
+                    raise BadRequest(f"Filter {key} must be an ISO date (YYYY-MM-DD)")
+        return normalized
+
+    def _get_metadata_frame(self) -> pd.DataFrame:
+        """Typed metadata of every indexed document, one row per FAISS position"""
+        if self._metadata_frame is None:
+            records = []
+            for position, doc_id in self.vector_store.index_to_docstore_id.items():
+                metadata = self.vector_store.docstore.search(doc_id).metadata
+                # Indexes built before missing values were stored as None may hold NaN here
+                department = metadata.get('department')
+                records.append({
+                    'position': position,
+                    'source': metadata.get('source'),
+                    'source_type': metadata.get('source_type'),
+                    'department': (department.lower() or None) if isinstance(department, str) else None,
+                    'feedback_ids': [value for value in metadata.get('feedback_ids') or [] if isinstance(value, str)],
+                    'rating_min': metadata.get('rating_min'),
+                    'rating_max': metadata.get('rating_max'),
+                    'date_min': metadata.get('date_min'),
+                    'date_max': metadata.get('date_max')
+                })
+            frame = pd.DataFrame.from_records(records, columns=[
+                'position', 'source', 'source_type', 'department', 'feedback_ids',
+                'rating_min', 'rating_max', 'date_min', 'date_max'
+            ])
+            for column in ('rating_min', 'rating_max'):
+                frame[column] = pd.to_numeric(frame[column], errors='coerce')
+            # ISO dates compare correctly as strings; missing dates never match a date filter
+            for column in ('date_min', 'date_max'):
+                frame[column] = frame[column].fillna('')
+            self._metadata_frame = frame
+        return self._metadata_frame
+
+    def _filter_positions(self, filters: Dict) -> np.ndarray:
+        """FAISS positions of the documents matching every filter (vectorized over the metadata)"""
+        frame = self._get_metadata_frame()
+        mask = pd.Series(True, index=frame.index)
+        if 'source_type' in filters:
+            mask &= frame['source_type'].isin(filters['source_type'])
+        if 'source' in filters:
+            mask &= frame['source'].isin(filters['source'])
+        if 'department' in filters:
+            mask &= frame['department'].isin([department.lower() for department in filters['department']])
+        if 'feedback_id' in filters:
+            feedback_ids = frame['feedback_ids'].explode()
+            matching = feedback_ids[feedback_ids.isin(filters['feedback_id'])].index.unique()
+            mask &= frame.index.isin(matching)
+        # Documents span a range of rows: they match when the range overlaps the filter
+        if 'rating_min' in filters:
+            mask &= frame['rating_max'] >= filters['rating_min']
+        if 'rating_max' in filters:
+            mask &= frame['rating_min'] <= filters['rating_max']
+        if 'date_from' in filters:
+            mask &= (frame['date_max'] != '') & (frame['date_max'] >= filters['date_from'])
+        if 'date_to' in filters:
+            mask &= (frame['date_min'] != '') & (frame['date_min'] <= filters['date_to'])
+        return frame.loc[mask, 'position'].to_numpy(dtype=np.int64)
+
+    def _search(self, question: str, k: int, filters: Dict) -> Tuple[List, Optional[int]]:
+        """
+        Similarity search restricted to the documents matching `filters`: the candidates are
+        selected from the metadata first and FAISS only scores those (IDSelectorBatch).
+        Returns the documents and the number of candidates (None when unfiltered).
+        """
+        if not filters:
+            with self._index_lock:
+                return self.vector_store.similarity_search(question, k=k), None
+
+        query_vector = np.asarray([self.embeddings.embed_query(question)], dtype=np.float32)
+        if getattr(self.vector_store, '_normalize_L2', False):
+            faiss.normalize_L2(query_vector)
+
+        with self._index_lock:
+            positions = self._filter_positions(filters)
+            if len(positions) == 0:
+                return [], 0
+            selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+            _, indices = self.vector_store.index.search(
+                query_vector, min(k, len(positions)), params=faiss.SearchParameters(sel=selector)
+            )
+            docs = [
+                self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[int(i)])
+                for i in indices[0] if i != -1
+            ]
+        return docs, len(positions)
+
+    def query(self, question: str, filters: Optional[Dict] = None) -> Dict:
+        """Process a query and return a fresh response, optionally restricted by metadata filters"""
         if not question or not question.strip():
             raise BadRequest("Question cannot be empty")
         
+        filters = self._normalize_filters(filters)
+        
         if not self.vector_store or not self.chain:
             raise InternalServerError("RAG system not properly initialized")
         
         try:
-            docs = self.vector_store.similarity_search(question, k=4)
+            docs, candidates = self._search(question, 4, filters)
             
             logger.info(f"Processing new query: {question[:100]}...")
             logger.info(f"Number of documents found: {len(docs)}")
@@ -792,6 +1503,8 @@ class PDFRAGService:
                 "timestamp": datetime.now().isoformat(),
                 "processing_id": datetime.now().strftime("%Y%m%d_%H%M%S_%f"),
                 "sources_used": len(docs),
+                "filters": filters,
+                "filtered_candidates": candidates,
                 "pdf_sources": list(set(pdf_sources)),
                 "excel_sources": list(set(excel_sources)),
                 "relevant_passages": [
@@ -829,9 +1542,11 @@ class PDFRAGService:
             "excel_files": list(self.excel_metadata.keys()),
             "pdf_details": self.pdf_metadata,
             "excel_details": self.excel_metadata,
+            "failed_files": self.failed_files,
             "vector_store_ready": self.vector_store is not None,
             "chain_ready": self.chain is not None,
             "sentiment_analyzer_ready": self.sentiment_analyzer is not None,
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else {"enabled": False},
             "last_check": datetime.now().isoformat()
         }
 
@@ -901,8 +1616,11 @@ class WhatsAppService:
             logger.error(f"Error retrieving message status: {str(e)}")
             return {'error': str(e)}
 
-def initialize_services():
-    """Initialize all services at startup"""
+def initialize_services() -> Dict[str, List[str]]:
+    """
+    Initialize all services at startup, or bring the RAG index up to date with the files on disk.
+    Returns the files indexed, removed and failed by the index update.
+    """
     global rag_service, whatsapp_service
     
     google_api_key = os.getenv('GOOGLE_API_KEY')
@@ -915,10 +1633,13 @@ def initialize_services():
     # Check if RAG service is already initialized and valid
     if rag_service and rag_service.vector_store and rag_service.chain:
         try:
-            system_info = rag_service.get_system_info()
-            if system_info['vector_store_ready'] and system_info['chain_ready'] and not rag_service._files_changed():
+            if not rag_service._files_changed():
                 logger.info("Existing RAG service is valid and files unchanged, skipping reinitialization")
-                return
+                return {'indexed': [], 'removed': [], 'failed': []}
+            # Only the added, modified or deleted files are (re)embedded
+            summary = rag_service.refresh_index()
+            logger.info(f"Existing RAG service updated incrementally: {summary}")
+            return summary
         except Exception as e:
             logger.warning(f"Existing RAG service invalid or files changed: {str(e)}. Reinitializing...")
     
@@ -948,6 +1669,8 @@ def initialize_services():
         logger.warning("WhatsApp service not configured - missing Twilio credentials")
         whatsapp_service = None
 
+    return rag_service.last_index_summary
+
 # Initialize services
 load_dotenv()
 rag_service = None
@@ -980,7 +1703,8 @@ def query_documents():
         if not question:
             return jsonify({"error": "Question cannot be empty"}), 400
         
-        result = rag_service.query(question)
+        # Optional metadata filters, e.g. {"department": "Oncology", "rating_max": 2}
+        result = rag_service.query(question, data.get('filters'))
         
         return jsonify({
             "success": True,
@@ -1200,12 +1924,22 @@ def upload_file():
         logger.info(f"File uploaded: {file_path}")
         
         # Trigger reload to process new file
-        initialize_services()
+        summary = initialize_services()
+        
+        if file.filename in summary['failed']:
+            logger.error(f"Uploaded file could not be indexed: {file_path}")
+            return jsonify({
+                "success": False,
+                "error": f"File uploaded but could not be indexed: {file.filename}",
+                "file_path": file_path,
+                "index_summary": summary
+            }), 422
         
         return jsonify({
             "success": True,
             "message": f"File uploaded and processed successfully: {file.filename}",
-            "file_path": file_path
+            "file_path": file_path,
+            "index_summary": summary
         })
         
     except Exception as e:
@@ -0,0 +1,107 @@
+"""
+Benchmark of the Excel-to-text conversion used when indexing Excel files.
+
+Builds a synthetic feedback workbook (100k rows by default, two sheets) and times
+api2.extract_excel_documents against the previous text conversion, which re-read the
+workbook for every sheet and rendered rows with iterrows(). Both must render the same rows.
+
+    python benchmark_excel_extraction.py [--rows 100000] [--workbook path.xlsx]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from api2 import extract_excel_documents
+
+DEPARTMENTS = ["Oncology", "Cardiology", "Pediatrics", "Emergency", "Radiology", "Maternity"]
+COMMENTS = [
+    "Very long wait before the consultation",
+    "Staff were kind and attentive",
+    "The room was not clean",
+    "Excellent care, thank you",
+    None,
+]
+# Rendered row lines ("Row N: ..."), as opposed to the legacy "Row count: N" header
+ROW_LINE = re.compile(r"^Row \d+: ")
+
+
+def build_workbook(path: str, rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    feedback = pd.DataFrame({
+        "feedback_id": [f"FB{i:06d}" for i in range(rows)],
+        "patient_id": [f"P{i:05d}" for i in rng.integers(0, 20000, rows)],
+        "department": rng.choice(DEPARTMENTS, rows),
+        "rating": rng.integers(1, 6, rows),
+        "wait_time_min": rng.integers(0, 240, rows),
+        "feedback_text": rng.choice(np.array(COMMENTS, dtype=object), rows),
+        "date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24, rows), unit="h"),
+    })
+    departments = feedback.groupby("department").agg(
+        feedback_count=("feedback_id", "count"),
+        average_rating=("rating", "mean"),
+    ).reset_index()
+    with pd.ExcelWriter(path) as writer:
+        feedback.to_excel(writer, sheet_name="feedback", index=False)
+        departments.to_excel(writer, sheet_name="departments", index=False)
+
+
+def legacy_extract_excel_text(excel_path: str) -> str:
+    """Previous implementation: one read_excel per sheet and iterrows() string concatenation"""
+    excel_file = pd.ExcelFile(excel_path)
+    combined_text = ""
+    for sheet_name in excel_file.sheet_names:
+        df = pd.read_excel(excel_path, sheet_name=sheet_name)
+        sheet_text = f"\n=== SHEET: {sheet_name} ===\n"
+        if not df.empty:
+            sheet_text += f"Columns: {', '.join(df.columns.tolist())}\n"
+            sheet_text += f"Row count: {len(df)}\n\n"
+            for index, row in df.iterrows():
+                row_text = f"Row {index + 1}: "
+                for col_name, value in row.items():
+                    if pd.notna(value):
+                        row_text += f"{col_name}: {value}, "
+                sheet_text += row_text.rstrip(", ") + "\n"
+        combined_text += sheet_text + "\n"
+    return combined_text
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workbook", help="Existing workbook to benchmark instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.workbook
+        if path is None:
+            path = os.path.join(tmp_dir, "synthetic_feedback.xlsx")
+            _, elapsed = timed(build_workbook, path, args.rows)
+            print(f"Synthetic workbook: {args.rows} rows written in {elapsed:.1f}s")
+
+        legacy_text, legacy_time = timed(legacy_extract_excel_text, path)
+        (documents, _, _), new_time = timed(extract_excel_documents, path)
+
+        # Row documents are grouped by department: compare the rendered rows regardless of order
+        legacy_rows = sorted(line for line in legacy_text.splitlines() if ROW_LINE.match(line))
+        rows = sorted(line for document in documents for line in document.splitlines() if ROW_LINE.match(line))
+
+        print(f"legacy (iterrows):        {legacy_time:8.2f}s")
+        print(f"extract_excel_documents:  {new_time:8.2f}s  ({legacy_time / new_time:.1f}x faster)")
+        print(f"output: {len(documents):,} row documents, identical rows: {rows == legacy_rows}")
+        if rows != legacy_rows:
+            raise SystemExit("Rendered rows differ")
+
+
+if __name__ == "__main__":
+    main()
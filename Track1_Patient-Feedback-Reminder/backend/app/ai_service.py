@@ -0,0 +1,307 @@
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+import app.models
+import logging
+from typing import Optional, Dict, Any
+import asyncio
+import json
+import httpx
+import os
+import time
+
+from app.analysis_cache import get_cached_analysis, store_cached_analysis
+from app.fallback_analyzer import fallback_analysis
+from app.metrics import AI_CIRCUIT_OPEN, AI_FALLBACKS, record_ai_call
+from app.resilience import CircuitBreaker, RetryBudget, jittered_backoff
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AI_API_URL = os.getenv("AI_API_URL")
+if not AI_API_URL:
+    logger.error("AI_API_URL environment variable not set. AI analysis will not function.")
+
+# Configuration du client HTTP partagé vers le service AI
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+AI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "30.0"))
+AI_HTTP2 = os.getenv("AI_HTTP2", "false").lower() == "true"
+AI_HTTP_CONNECT_TIMEOUT = float(os.getenv("AI_HTTP_CONNECT_TIMEOUT", "5.0"))
+AI_HTTP_READ_TIMEOUT = float(os.getenv("AI_HTTP_READ_TIMEOUT", "30.0"))
+AI_HTTP_POOL_TIMEOUT = float(os.getenv("AI_HTTP_POOL_TIMEOUT", "5.0"))
+
+# Résilience des appels au service AI
+AI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("AI_CIRCUIT_FAILURE_THRESHOLD", "5"))
+AI_CIRCUIT_RESET_TIMEOUT = float(os.getenv("AI_CIRCUIT_RESET_TIMEOUT", "30.0"))
+AI_RETRY_MAX_ATTEMPTS = int(os.getenv("AI_RETRY_MAX_ATTEMPTS", "2"))
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", "4.0"))
+AI_RETRY_BUDGET_RATIO = float(os.getenv("AI_RETRY_BUDGET_RATIO", "0.2"))
+AI_FALLBACK_ENABLED = os.getenv("AI_FALLBACK_ENABLED", "true").lower() == "true"
+
+ai_circuit_breaker = CircuitBreaker(
+    failure_threshold=AI_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=AI_CIRCUIT_RESET_TIMEOUT
+)
+ai_retry_budget = RetryBudget(ratio=AI_RETRY_BUDGET_RATIO)
+
+_ai_http_client: Optional[httpx.AsyncClient] = None
+
+
+class AICircuitOpenError(HTTPException):
+    """
+    503 levée quand le disjoncteur refuse l'appel (circuit ouvert) et qu'aucune analyse
+    de secours n'est autorisée. Distingue ce refus des erreurs renvoyées par le service AI.
+    """
+
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail="Service AI externe temporairement indisponible (circuit ouvert).")
+
+def create_ai_http_client() -> httpx.AsyncClient:
+    """
+    Crée le client HTTP partagé (niveau application) utilisé pour appeler le service AI.
+    Les connexions sont conservées (keep-alive) et réutilisées d'un appel à l'autre,
+    ce qui évite une poignée de main TCP/TLS à chaque feedback analysé.
+    """
+    global _ai_http_client
+    if _ai_http_client is None:
+        http2 = AI_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("AI_HTTP2=true mais le paquet 'h2' n'est pas installé (pip install 'httpx[http2]'). HTTP/1.1 utilisé.")
+                http2 = False
+
+        _ai_http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=AI_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=AI_HTTP_CONNECT_TIMEOUT,
+                read=AI_HTTP_READ_TIMEOUT,
+                write=AI_HTTP_READ_TIMEOUT,
+                pool=AI_HTTP_POOL_TIMEOUT
+            )
+        )
+        logger.info(f"Client HTTP du service AI créé (http2={http2}, max_connections={AI_HTTP_MAX_CONNECTIONS}).")
+    return _ai_http_client
+
+async def close_ai_http_client():
+    """
+    Ferme le client HTTP partagé et ses connexions persistantes.
+    """
+    global _ai_http_client
+    if _ai_http_client is not None:
+        await _ai_http_client.aclose()
+        _ai_http_client = None
+        logger.info("Client HTTP du service AI fermé.")
+
+def get_ai_http_client() -> httpx.AsyncClient:
+    """
+    Retourne le client HTTP partagé, en le créant à la volée si le hook de démarrage
+    n'a pas été exécuté (scripts, tests).
+    """
+    return _ai_http_client or create_ai_http_client()
+
+def _is_ai_failure(error: HTTPException) -> bool:
+    """
+    Erreurs imputables au service AI (indisponibilité, surcharge, timeout) : elles comptent
+    pour le disjoncteur et justifient un retry. Les 4xx (requête refusée) ne comptent pas.
+    """
+    return error.status_code >= 500 or error.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+async def call_ai_analysis_service(
+    feedback_text: str,
+    patient_id: Optional[str] = None,
+    patient_age: Optional[float] = None,
+    patient_gender: Optional[str] = None,
+    department: Optional[str] = None,
+    wait_time_min: Optional[float] = None,
+    resolution_time_min: Optional[float] = None,
+    rating: Optional[float] = None,
+    allow_fallback: bool = True
+) -> Dict[str, Any]:
+    """
+    Appelle le service AI externe pour obtenir l'analyse de sentiment, les recommandations,
+    et d'autres analyses détaillées pour un texte de feedback donné.
+
+    Les appels passent par un disjoncteur : tant qu'il est ouvert, le service n'est plus
+    sollicité et, si `allow_fallback` (et AI_FALLBACK_ENABLED), l'analyseur local à règles
+    renvoie immédiatement une analyse marquée `provisional`. Sinon une 503 est levée sans attente.
+    Les échecs transitoires sont retentés avec un délai aléatoire, dans la limite du budget de retries.
+
+    Un contenu déjà analysé (même texte normalisé et même contexte, cf. app/analysis_cache.py)
+    est servi depuis le cache sans aucun appel externe.
+    """
+    feedback_input = {
+        "feedback_text": feedback_text,
+        "patient_id": patient_id,
+        "patient_age": patient_age,
+        "patient_gender": patient_gender,
+        "department": department,
+        "wait_time_min": wait_time_min,
+        "resolution_time_min": resolution_time_min,
+        "rating": rating
+    }
+    cached = await get_cached_analysis(feedback_input)
+    if cached is not None:
+        return cached
+
+    if not AI_API_URL:
+        # Erreur de configuration : ni retry ni échec compté par le disjoncteur
+        logger.error("AI_API_URL is not set, cannot call external AI service.")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Service AI externe non configuré.")
+
+    use_fallback = allow_fallback and AI_FALLBACK_ENABLED
+    ai_retry_budget.record_request()
+
+    attempt = 0
+    while True:
+        if not ai_circuit_breaker.allow_request():
+            AI_CIRCUIT_OPEN.set(1)
+            if use_fallback:
+                AI_FALLBACKS.inc()
+                logger.warning("Service AI indisponible (circuit ouvert) : analyse locale provisoire utilisée.")
+                return fallback_analysis(**feedback_input)
+            raise AICircuitOpenError()
+
+        try:
+            result = await _request_ai_analysis(feedback_input)
+        except HTTPException as e:
+            if not _is_ai_failure(e):
+                ai_circuit_breaker.release_probe()
+                raise
+            ai_circuit_breaker.record_failure()
+            circuit_open = ai_circuit_breaker.state == CircuitBreaker.OPEN
+            AI_CIRCUIT_OPEN.set(1 if circuit_open else 0)
+            attempt += 1
+            if circuit_open:
+                # L'échec vient d'ouvrir le circuit : l'itération suivante bascule
+                # sur l'analyse de secours (ou lève une 503) sans retenter l'appel.
+                continue
+            if attempt > AI_RETRY_MAX_ATTEMPTS or not ai_retry_budget.try_acquire_retry():
+                raise
+            await asyncio.sleep(jittered_backoff(attempt, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY))
+            continue
+
+        ai_circuit_breaker.record_success()
+        AI_CIRCUIT_OPEN.set(0)
+        await store_cached_analysis(feedback_input, result)
+        return result
+
+async def _request_ai_analysis(feedback_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Un appel HTTP au service AI (payload plat), sans retry.
+    Parse la réponse pour l'adapter à la structure de notre modèle interne AnalysisIn.
+    """
+    if not AI_API_URL:
+        logger.error("AI_API_URL is not set, cannot call external AI service.")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Service AI externe non configuré.")
+
+    # Issue de l'appel pour les métriques : code HTTP, 'connection_error', 'invalid_response' ou 'error'
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        client = get_ai_http_client()
+        ai_request_body = {k: v for k, v in feedback_input.items() if v is not None}
+
+        response = await client.post(AI_API_URL, json=ai_request_body)
+        outcome = str(response.status_code)
+        response.raise_for_status()
+        raw_ai_result = response.json()
+
+        validated_overall_response = app.models.ExternalAIOverallResponse(**raw_ai_result)
+        ai_response_content = validated_overall_response.data 
+
+        analysis_data_for_db = app.models.AnalysisDataIn(
+            primary_sentiment=ai_response_content.ai_analysis.primary_sentiment,
+            confidence_score=ai_response_content.ai_analysis.confidence_score,
+            actionable_insights=ai_response_content.ai_analysis.actionable_insights,
+            keywords=ai_response_content.ai_analysis.key_themes,
+            personalized_message_draft=ai_response_content.ai_analysis.personalized_message_draft,
+            contextual_factors=ai_response_content.ai_analysis.contextual_factors,
+            department_specific_insights=ai_response_content.ai_analysis.department_specific_insights,
+            emotional_intensity=ai_response_content.ai_analysis.emotional_intensity,
+            key_themes=ai_response_content.ai_analysis.key_themes,
+            patient_behavior_analysis=ai_response_content.ai_analysis.patient_behavior_analysis,
+            sentiment_explanation=ai_response_content.ai_analysis.sentiment_explanation,
+            urgency_level=ai_response_content.ai_analysis.urgency_level,
+            contextual_data=ai_response_content.contextual_data,
+            risk_factors=ai_response_content.risk_factors,
+            sticker_analysis=ai_response_content.sticker_analysis,
+            # Analyse de repli du service AI lui-même (échec du LLM) : ni mise en cache ni définitive
+            provisional=True if getattr(ai_response_content.ai_analysis, "provisional", None) else None
+        )
+
+        recommendations_for_db = ai_response_content.recommendations
+
+        return {
+            "analysis": analysis_data_for_db.model_dump(mode='json'),
+            "recommendations": recommendations_for_db
+        }
+
+    except httpx.RequestError as e:
+        outcome = "connection_error"
+        logger.error(f"Erreur de connexion au service AI externe: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail=f"Impossible de se connecter au service AI externe: {e}")
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Erreur du service AI externe (statut {e.response.status_code}): {e.response.text}")
+        logger.error(f"Réponse complète de l'erreur du service AI: {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code,
+                            detail=f"Erreur du service AI externe: {e.response.text[:200]}...")
+    except json.JSONDecodeError:
+        outcome = "invalid_response"
+        logger.error("Réponse invalide (non-JSON) du service AI externe.")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail="Réponse invalide du service AI externe.")
+    except Exception as e:
+        logger.exception("Erreur inattendue lors de l'appel au service AI externe ou de l'analyse de sa réponse.")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Erreur inattendue lors de l'intégration AI: {e}")
+    finally:
+        record_ai_call(outcome, time.perf_counter() - start)
+
+
+def feedback_row_to_ai_input(feedback_row) -> Dict[str, Any]:
+    """
+    Construit les arguments de call_ai_analysis_service à partir d'une ligne de la table feedbacks.
+    """
+    note = feedback_row["note"]
+    return {
+        "feedback_text": feedback_row["text"],
+        "patient_id": feedback_row["patient_id"],
+        "patient_age": feedback_row.get("patient_age"),
+        "patient_gender": feedback_row.get("patient_gender"),
+        "department": feedback_row.get("department"),
+        "wait_time_min": feedback_row.get("wait_time_min"),
+        "resolution_time_min": feedback_row.get("resolution_time_min"),
+        "rating": float(note) if note is not None else None
+    }
+
+async def save_ai_analysis(conn, feedback_id: int, ai_response_data_parsed: Dict[str, Any]):
+    """
+    Valide la réponse du service AI (modèle AnalysisIn) et l'insère dans la table ai_analysis.
+    Retourne la ligne insérée (id, feedback_id, analysis, recommendations, analysis_timestamp),
+    ou None si une analyse existe déjà pour ce feedback (fonction SQL upsert_ai_analysis,
+    la table partitionnée ne pouvant pas porter d'index unique sur feedback_id).
+    Une analyse provisoire (analyseur de secours) est remplacée par une analyse définitive.
+    """
+    analysis_payload = app.models.AnalysisIn(**ai_response_data_parsed)
+    return await conn.fetchrow(
+        """
+        SELECT id, feedback_id, analysis, recommendations, analysis_timestamp
+        FROM upsert_ai_analysis($1, $2::jsonb, $3::jsonb);
+        """,
+        feedback_id,
+        analysis_payload.analysis.model_dump(mode='json'),
+        analysis_payload.recommendations if analysis_payload.recommendations is not None else []
+    )
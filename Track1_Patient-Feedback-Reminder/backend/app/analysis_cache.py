@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.database import acquire_connection
+from app.metrics import ANALYSIS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "2048"))
+# Au-delà, une entrée (en mémoire ou persistante) est ignorée et réécrite au prochain appel AI ;
+# les valeurs fractionnaires sont acceptées (0.5 = 12 heures)
+ANALYSIS_CACHE_TTL_DAYS = float(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30"))
+ANALYSIS_CACHE_TTL_SECONDS = ANALYSIS_CACHE_TTL_DAYS * 86400
+
+# Champs de contexte envoyés au service AI et qui entrent dans la clé. patient_id est exclu :
+# l'analyse ne dépend pas de l'identité du patient, et l'inclure rendrait chaque clé unique.
+CACHE_CONTEXT_FIELDS = (
+    "patient_age", "patient_gender", "department", "wait_time_min", "resolution_time_min", "rating"
+)
+
+# Champs de l'analyse propres au patient (brouillon de message repris par les rappels) : retirés
+# de l'entrée partagée et mémorisés dans une entrée dont la clé inclut patient_id.
+PATIENT_SPECIFIC_FIELDS = ("personalized_message_draft",)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_feedback_text(text: str) -> str:
+    """
+    Normalisation du texte pour la clé : NFKC, minuscules, espaces réduits.
+    Les emojis sont conservés (ils portent du sentiment).
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip().lower()
+
+
+def _normalize_context_value(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # 4 et 4.0 donnent la même clé
+        return float(value)
+    return _WHITESPACE.sub(" ", str(value)).strip().lower()
+
+
+def analysis_cache_key(feedback_input: Dict[str, Any]) -> str:
+    """
+    Empreinte SHA-256 du texte normalisé et des champs de contexte du payload AI.
+    """
+    material = {
+        "text": normalize_feedback_text(feedback_input.get("feedback_text")),
+        **{field: _normalize_context_value(feedback_input.get(field)) for field in CACHE_CONTEXT_FIELDS},
+    }
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _patient_cache_key(shared_key: str, patient_id: str) -> str:
+    return hashlib.sha256(f"{shared_key}\0patient\0{patient_id}".encode("utf-8")).hexdigest()
+
+
+class _LRU:
+    """LRU en mémoire dont chaque entrée expire comme la ligne correspondante de ai_analysis_cache."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any], ttl_seconds: float = ANALYSIS_CACHE_TTL_SECONDS):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_memory_tier = _LRU(ANALYSIS_CACHE_MAX_ENTRIES)
+
+
+async def _read_entry(key: str) -> Optional[Dict[str, Any]]:
+    cached = _memory_tier.get(key)
+    if cached is not None:
+        return cached
+    try:
+        async with acquire_connection() as conn:
+            row = await conn.fetchrow("""
+                SELECT analysis, recommendations,
+                       EXTRACT(EPOCH FROM created_at + make_interval(secs => $2) - CURRENT_TIMESTAMP)::DOUBLE PRECISION
+                           AS remaining_seconds
+                FROM ai_analysis_cache
+                WHERE content_hash = $1 AND created_at > CURRENT_TIMESTAMP - make_interval(secs => $2);
+            """, key, ANALYSIS_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Lecture du cache d'analyses impossible : {e}")
+        return None
+    if row is None:
+        return None
+    cached = {"analysis": row["analysis"], "recommendations": row["recommendations"] or []}
+    # Le niveau mémoire n'allonge pas la durée de vie de l'entrée persistante
+    _memory_tier.put(key, cached, row["remaining_seconds"])
+    return cached
+
+
+async def _write_entry(key: str, entry: Dict[str, Any]):
+    _memory_tier.put(key, entry)
+    try:
+        async with acquire_connection() as conn:
+            await conn.execute("""
+                INSERT INTO ai_analysis_cache (content_hash, analysis, recommendations)
+                VALUES ($1, $2::jsonb, $3::jsonb)
+                ON CONFLICT (content_hash) DO UPDATE
+                    SET analysis = EXCLUDED.analysis,
+                        recommendations = EXCLUDED.recommendations,
+                        created_at = CURRENT_TIMESTAMP;
+            """, key, entry["analysis"], entry.get("recommendations") or [])
+    except Exception as e:
+        logger.warning(f"Écriture du cache d'analyses impossible : {e}")
+
+
+async def get_cached_analysis(feedback_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Cherche une analyse déjà calculée pour un contenu identique : d'abord en mémoire,
+    puis dans la table ai_analysis_cache. Retourne {"analysis", "recommendations"} ou None.
+    Les champs de PATIENT_SPECIFIC_FIELDS ne sont repris que d'une analyse du même patient ;
+    sinon ils sont absents (les rappels utilisent alors REMINDER_TEMPLATE).
+    Une erreur de base de données est traitée comme un défaut de cache.
+    """
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    key = analysis_cache_key(feedback_input)
+
+    in_memory = _memory_tier.get(key) is not None
+    cached = await _read_entry(key)
+    if cached is None:
+        ANALYSIS_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+    ANALYSIS_CACHE_LOOKUPS.labels("memory_hit" if in_memory else "db_hit").inc()
+
+    analysis = dict(cached["analysis"])
+    patient_id = feedback_input.get("patient_id")
+    if patient_id:
+        personal = await _read_entry(_patient_cache_key(key, str(patient_id)))
+        if personal is not None:
+            analysis.update(personal["analysis"])
+    return {"analysis": analysis, "recommendations": cached["recommendations"]}
+
+
+async def store_cached_analysis(feedback_input: Dict[str, Any], result: Dict[str, Any]):
+    """
+    Mémorise une analyse renvoyée par le service AI. Les analyses provisoires
+    (analyseur de secours) ne sont jamais mises en cache. Les champs propres au patient
+    sont retirés de l'entrée partagée et stockés sous une clé qui inclut patient_id.
+    """
+    if not ANALYSIS_CACHE_ENABLED or (result.get("analysis") or {}).get("provisional"):
+        return
+    key = analysis_cache_key(feedback_input)
+    analysis = dict(result["analysis"])
+    personal = {field: analysis.pop(field) for field in PATIENT_SPECIFIC_FIELDS if analysis.get(field) is not None}
+    await _write_entry(key, {"analysis": analysis, "recommendations": result.get("recommendations") or []})
+
+    patient_id = feedback_input.get("patient_id")
+    if personal and patient_id:
+        await _write_entry(_patient_cache_key(key, str(patient_id)), {"analysis": personal, "recommendations": []})
@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import app.models
+from app.ai_service import call_ai_analysis_service, close_ai_http_client, feedback_row_to_ai_input
+from app.database import close_database_connection_pool, get_database_connection_pool
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_CONCURRENCY = int(os.getenv("BACKLOG_CONCURRENCY", "8"))
+BACKLOG_BATCH_SIZE = int(os.getenv("BACKLOG_BATCH_SIZE", "50"))
+BACKLOG_PAGE_SIZE = int(os.getenv("BACKLOG_PAGE_SIZE", "500"))
+BACKLOG_PROGRESS_INTERVAL = float(os.getenv("BACKLOG_PROGRESS_INTERVAL", "10.0"))
+
+
+class BacklogProgress:
+    """
+    Compteurs d'avancement d'une passe de rattrapage des analyses IA manquantes.
+    """
+
+    def __init__(self, total: int, concurrency: int):
+        self.total = total
+        self.concurrency = concurrency
+        self.analyzed = 0
+        self.saved = 0
+        self.failed = 0
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.running = True
+        self.last_error: Optional[str] = None
+        self._start = time.monotonic()
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self._start
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = self.elapsed_seconds
+        done = self.analyzed + self.failed
+        return {
+            "running": self.running,
+            "total": self.total,
+            "analyzed": self.analyzed,
+            "saved": self.saved,
+            "failed": self.failed,
+            "remaining": max(self.total - done, 0),
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(elapsed, 1),
+            "throughput_per_second": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "last_error": self.last_error,
+        }
+
+
+async def _insert_analysis_batch(pool, batch: List[tuple]) -> int:
+    """
+    Écrit un lot d'analyses en une seule requête (unnest + upsert_ai_analysis), en ignorant
+    les feedbacks analysés entre-temps par une autre voie (job, endpoint unitaire).
+    Les analyses provisoires sont remplacées.
+    """
+    if not batch:
+        return 0
+    # Verrous consultatifs par feedback pris dans un ordre stable : pas d'interblocage entre lots
+    batch = sorted(batch, key=lambda item: item[0])
+    feedback_ids = [item[0] for item in batch]
+    analyses = [item[1] for item in batch]
+    recommendations = [item[2] for item in batch]
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT saved.id
+            FROM unnest($1::int[], $2::jsonb[], $3::jsonb[]) AS b(feedback_id, analysis, recommendations)
+            CROSS JOIN LATERAL upsert_ai_analysis(b.feedback_id, b.analysis, b.recommendations) AS saved;
+            """,
+            feedback_ids, analyses, recommendations
+        )
+    return len(rows)
+
+
+_MISSING_ANALYSIS_CONDITION = """
+    NOT EXISTS (
+        SELECT 1 FROM ai_analysis a
+        WHERE a.feedback_id = f.id AND COALESCE(a.analysis ->> 'provisional', 'false') <> 'true'
+    )
+"""
+
+
+async def analyze_backlog(
+    concurrency: int = BACKLOG_CONCURRENCY,
+    batch_size: int = BACKLOG_BATCH_SIZE,
+    limit: Optional[int] = None,
+    progress: Optional[BacklogProgress] = None,
+) -> BacklogProgress:
+    """
+    Analyse tous les feedbacks qui n'ont pas encore d'analyse définitive dans ai_analysis
+    (aucune ligne, ou seulement une analyse provisoire de l'analyseur de secours).
+    Les feedbacks sont lus par pages de BACKLOG_PAGE_SIZE (keyset sur f.id) et déposés dans
+    une file bornée consommée par `concurrency` workers : la mémoire utilisée ne dépend pas
+    de la taille du backlog. Les résultats sont écrits par lots de `batch_size`. L'avancement
+    et le débit sont journalisés toutes les BACKLOG_PROGRESS_INTERVAL secondes.
+    """
+    concurrency = max(1, concurrency)
+    pool = await get_database_connection_pool()
+    async with pool.acquire() as conn:
+        total = await conn.fetchval(f"SELECT count(*) FROM feedbacks f WHERE {_MISSING_ANALYSIS_CONDITION}")
+    if limit is not None:
+        total = min(total, max(int(limit), 0))
+
+    if progress is None:
+        progress = BacklogProgress(total=total, concurrency=concurrency)
+    else:
+        progress.total = total
+    logger.info(f"Rattrapage des analyses IA : {progress.total} feedbacks sans analyse (concurrence {concurrency}).")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    pending_batch: List[tuple] = []
+    flush_lock = asyncio.Lock()
+
+    async def flush():
+        async with flush_lock:
+            batch = pending_batch[:]
+            pending_batch.clear()
+            progress.saved += await _insert_analysis_batch(pool, batch)
+
+    async def produce():
+        # Une page à la fois : seules BACKLOG_PAGE_SIZE lignes (plus la file) sont en mémoire
+        remaining = total
+        last_id = 0
+        try:
+            while remaining > 0:
+                async with pool.acquire() as conn:
+                    rows = await conn.fetch(
+                        f"""
+                        SELECT f.id, f.text, f.patient_id, f.note, f.patient_age, f.patient_gender,
+                               f.department, f.wait_time_min, f.resolution_time_min
+                        FROM feedbacks f
+                        WHERE f.id > $1 AND {_MISSING_ANALYSIS_CONDITION}
+                        ORDER BY f.id
+                        LIMIT $2
+                        """,
+                        last_id, min(BACKLOG_PAGE_SIZE, remaining)
+                    )
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                remaining -= len(rows)
+                for feedback_row in rows:
+                    await queue.put(feedback_row)
+        finally:
+            # Un marqueur de fin par worker
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def analyze_one(feedback_row):
+        try:
+            ai_response_data_parsed = await call_ai_analysis_service(**feedback_row_to_ai_input(feedback_row), allow_fallback=False)
+            analysis_payload = app.models.AnalysisIn(**ai_response_data_parsed)
+        except HTTPException as e:
+            progress.failed += 1
+            progress.last_error = f"feedback {feedback_row['id']}: {e.detail}"
+            return
+        except Exception as e:
+            progress.failed += 1
+            progress.last_error = f"feedback {feedback_row['id']}: {e}"
+            logger.exception(f"Erreur inattendue lors de l'analyse du feedback {feedback_row['id']}.")
+            return
+
+        progress.analyzed += 1
+        pending_batch.append((
+            feedback_row["id"],
+            analysis_payload.analysis.model_dump(mode='json'),
+            analysis_payload.recommendations or []
+        ))
+        if len(pending_batch) >= batch_size:
+            await flush()
+
+    async def worker():
+        while True:
+            feedback_row = await queue.get()
+            if feedback_row is None:
+                return
+            await analyze_one(feedback_row)
+
+    async def report_progress():
+        while True:
+            await asyncio.sleep(BACKLOG_PROGRESS_INTERVAL)
+            snapshot = progress.snapshot()
+            logger.info(
+                f"Rattrapage : {snapshot['analyzed'] + snapshot['failed']}/{snapshot['total']} traités "
+                f"({snapshot['saved']} enregistrés, {snapshot['failed']} échecs), "
+                f"{snapshot['throughput_per_second']} feedbacks/s."
+            )
+
+    reporter = asyncio.create_task(report_progress())
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+        await flush()
+    finally:
+        for task in tasks:
+            task.cancel()
+        reporter.cancel()
+        progress.running = False
+        progress.finished_at = datetime.now()
+
+    snapshot = progress.snapshot()
+    logger.info(
+        f"Rattrapage terminé : {snapshot['saved']} analyses enregistrées, {snapshot['failed']} échecs "
+        f"en {snapshot['elapsed_seconds']}s ({snapshot['throughput_per_second']} feedbacks/s)."
+    )
+    return progress
+
+
+# --- Exécution en tâche de fond depuis l'API ---
+
+_current_run: Optional[BacklogProgress] = None
+_current_task: Optional[asyncio.Task] = None
+
+
+def get_backlog_progress() -> Optional[BacklogProgress]:
+    """
+    Retourne l'avancement de la dernière passe lancée depuis ce processus.
+    """
+    return _current_run
+
+
+def start_backlog_run(concurrency: int, batch_size: int, limit: Optional[int]) -> BacklogProgress:
+    """
+    Lance une passe de rattrapage en tâche de fond. Une seule passe à la fois par processus.
+    """
+    global _current_run, _current_task
+    if _current_task is not None and not _current_task.done():
+        raise RuntimeError("Une passe de rattrapage est déjà en cours.")
+
+    _current_run = BacklogProgress(total=0, concurrency=concurrency)
+
+    async def run():
+        try:
+            await analyze_backlog(concurrency=concurrency, batch_size=batch_size, limit=limit, progress=_current_run)
+        except Exception as e:
+            logger.exception("Échec de la passe de rattrapage des analyses IA.")
+            _current_run.last_error = str(e)
+            _current_run.running = False
+            _current_run.finished_at = datetime.now()
+
+    _current_task = asyncio.create_task(run(), name="analysis-backlog")
+    return _current_run
+
+
+# --- Point d'entrée CLI : python -m app.backlog ---
+
+async def _main(args):
+    try:
+        await analyze_backlog(concurrency=args.concurrency, batch_size=args.batch_size, limit=args.limit)
+    finally:
+        await close_ai_http_client()
+        await close_database_connection_pool(await get_database_connection_pool())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Analyse les feedbacks qui n'ont pas encore d'analyse IA.")
+    parser.add_argument("--concurrency", type=int, default=BACKLOG_CONCURRENCY, help="Appels simultanés au service AI.")
+    parser.add_argument("--batch-size", type=int, default=BACKLOG_BATCH_SIZE, help="Nombre d'analyses par insertion.")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximum de feedbacks à traiter.")
+    asyncio.run(_main(parser.parse_args()))
@@ -20,6 +20,18 @@ import asyncpg
 from dotenv import load_dotenv
 import os
 import json 
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from app.migrations import run_migrations
+from app.metrics import DB_READ_ROUTES, DB_REPLICA_LAG, record_query, register_pool, timed_acquire
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel : repli sur le module json standard
+    orjson = None
 
 load_dotenv()
 
@@ -29,12 +41,50 @@ DB_NAME = os.getenv("DB_NAME_POSTGRES")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# Réplique en lecture optionnelle (streaming replication) : désactivée si DB_REPLICA_HOST est vide.
+# Les autres paramètres de connexion reprennent ceux du primaire par défaut.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_NAME = os.getenv("DB_REPLICA_NAME", DB_NAME)
+DB_REPLICA_USER = os.getenv("DB_REPLICA_USER", DB_USER)
+DB_REPLICA_PASSWORD = os.getenv("DB_REPLICA_PASSWORD", DB_PASSWORD)
+# Au-delà de ce retard, les lectures repassent sur le primaire
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5.0"))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "5.0"))
+
+logger = logging.getLogger(__name__)
+
 _db_pool = None 
+_read_pool = None
+
+if orjson is not None:
+    def _json_encode(value):
+        return orjson.dumps(value).decode("utf-8")
+    _json_decode = orjson.loads
+else:
+    _json_encode = json.dumps
+    _json_decode = json.loads
+
+async def _init_connection(conn):
+    """
+    Appelé par asyncpg pour chaque nouvelle connexion du pool.
+    Enregistre un codec JSON/JSONB : les colonnes JSON sont décodées en dict/list Python
+    et les paramètres JSON acceptent directement des dict/list (sans json.dumps côté routes).
+    Branche aussi la mesure de durée de chaque instruction SQL (métriques /metrics).
+    """
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=_json_encode,
+            decoder=_json_decode,
+            schema="pg_catalog"
+        )
+    conn.add_query_logger(record_query)
 
 async def get_database_connection_pool():
     """
     Crée et retourne un pool de connexions asynchrones à PostgreSQL.
-    Initialise également les tables si elles n'existent pas.
+    Applique également les migrations de schéma en attente (voir app/migrations.py).
     """
     global _db_pool
     if _db_pool is None:
@@ -46,79 +96,148 @@ async def get_database_connection_pool():
                 user=DB_USER,
                 password=DB_PASSWORD,
                 min_size=5, 
-                max_size=10 
+                max_size=10,
+                init=_init_connection
             )
             print("Pool de connexions PostgreSQL créé avec succès.")
+            register_pool(_db_pool)
 
+            # Schéma versionné : une simple lecture de version si la base est déjà à jour
             async with _db_pool.acquire() as conn:
-                async with conn.transaction():
-                    # Table des feedbacks bruts
-                    await conn.execute("""
-                        CREATE TABLE IF NOT EXISTS feedbacks (
-                            id SERIAL PRIMARY KEY,
-                            patient_id TEXT NOT NULL,
-                            text TEXT NOT NULL,
-                            note INTEGER,
-                            emoji TEXT,
-                            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            patient_age REAL, 
-                            patient_gender TEXT,
-                            department TEXT,
-                            wait_time_min REAL,
-                            resolution_time_min REAL
-                        );
-                    """)
-                    print("Table 'feedbacks' vérifiée/créée.")
-
-                    await conn.execute("""
-                        CREATE TABLE IF NOT EXISTS ai_analysis (
-                            id SERIAL PRIMARY KEY,
-                            feedback_id INTEGER REFERENCES feedbacks(id) ON DELETE CASCADE,
-                            analysis JSONB,
-                            recommendations JSONB,
-                            analysis_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        );
-                    """)
-                    print("Table 'ai_analysis' vérifiée/créée analysis et recommendations JSONB.")
-
-                    # Table des demandes de rappel/rendez-vous
-                    await conn.execute("""
-                        CREATE TABLE IF NOT EXISTS recall_requests (
-                            id SERIAL PRIMARY KEY,
-                            patient_id TEXT NOT NULL,
-                            request_object TEXT NOT NULL, 
-                            requested_date DATE, 
-                            request_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            status TEXT DEFAULT 'pending', -- Status of the request: 'pending', 'approved', 'rejected', 'completed'
-                            approved_by TEXT,
-                            approval_date TIMESTAMP 
-                        );
-                    """)
-                    print("Table 'recall_requests' vérifiée/créée.")
-
-                    # Table des messages personnalisés API 
-                    await conn.execute("""
-                        CREATE TABLE IF NOT EXISTS personalized_messages (
-                            id SERIAL PRIMARY KEY,
-                            recall_request_id INTEGER REFERENCES recall_requests(id) ON DELETE CASCADE,
-                            patient_id TEXT NOT NULL,
-                            message_content TEXT NOT NULL,
-                            sent_by TEXT NOT NULL, 
-                            sent_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            ai_message_analysis JSONB 
-                        );
-                    """)
-                    print("Table 'personalized_messages' vérifiée/créée.")
+                schema_version = await run_migrations(conn)
+            print(f"Schéma de la base de données à la version {schema_version}.")
 
             print("Base de données prête : toutes les tables configurées.")
 
         except Exception as e:
-            print(f"Erreur lors de la création du pool ou de l'initialisation des tables : {e}")
+            print(f"Erreur lors de la création du pool ou de la migration du schéma : {e}")
             _db_pool = None 
             raise 
 
     return _db_pool
 
+async def open_dedicated_connection():
+    """
+    Ouvre une connexion PostgreSQL hors du pool, pour les usages de longue durée
+    (LISTEN/NOTIFY) qui ne doivent pas immobiliser une connexion du pool.
+    """
+    conn = await asyncpg.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD
+    )
+    await _init_connection(conn)
+    return conn
+
+# Retard de rejeu de la réplique ; 0 si tout le WAL reçu est rejoué (un primaire inactif
+# ne produit pas de transactions, le temps écoulé depuis la dernière n'est donc pas un retard).
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::DOUBLE PRECISION;
+"""
+
+class ReplicaStatus:
+    """
+    État de la réplique en lecture, revérifié au plus une fois toutes les
+    DB_REPLICA_LAG_CHECK_INTERVAL secondes (création du pool comprise si elle a échoué).
+    """
+
+    def __init__(self):
+        self.usable = False
+        self.lag_seconds = None
+        self._checked_at = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < DB_REPLICA_LAG_CHECK_INTERVAL
+
+    async def refresh(self) -> bool:
+        if self._is_fresh():
+            return self.usable
+        async with self._lock:
+            # Une autre requête a pu faire la vérification pendant l'attente du verrou
+            if self._is_fresh():
+                return self.usable
+            usable = False
+            try:
+                # Création du pool comprise : une réplique injoignable ne bloque pas la requête
+                # (ni celles qui attendent le verrou) au-delà de l'intervalle de vérification.
+                self.lag_seconds = await asyncio.wait_for(_replica_lag(), DB_REPLICA_LAG_CHECK_INTERVAL)
+                DB_REPLICA_LAG.set(self.lag_seconds)
+                usable = self.lag_seconds <= DB_REPLICA_MAX_LAG_SECONDS
+                if not usable:
+                    logger.warning(f"Réplique en retard de {self.lag_seconds:.1f}s : lectures sur le primaire.")
+            except Exception as e:
+                logger.warning(f"Réplique en lecture indisponible ({e}) : lectures sur le primaire.")
+            if usable and not self.usable:
+                logger.info("Lectures routées vers la réplique.")
+            self.usable = usable
+            self._checked_at = time.monotonic()
+            return usable
+
+    def mark_unavailable(self, error: Exception):
+        """
+        Écarte la réplique jusqu'à la prochaine vérification (connexion impossible à emprunter).
+        """
+        if self.usable:
+            logger.warning(f"Connexion à la réplique impossible ({error}) : lectures sur le primaire.")
+        self.usable = False
+        self._checked_at = time.monotonic()
+
+
+replica_status = ReplicaStatus()
+
+async def _replica_lag() -> float:
+    pool = await get_read_database_connection_pool()
+    return await pool.fetchval(REPLICA_LAG_QUERY)
+
+async def get_read_database_connection_pool():
+    """
+    Crée (une seule fois) et retourne le pool de connexions à la réplique en lecture.
+    Aucune migration n'y est appliquée : le schéma arrive par la réplication.
+    """
+    global _read_pool
+    if _read_pool is None:
+        _read_pool = await asyncpg.create_pool(
+            host=DB_REPLICA_HOST,
+            port=DB_REPLICA_PORT,
+            database=DB_REPLICA_NAME,
+            user=DB_REPLICA_USER,
+            password=DB_REPLICA_PASSWORD,
+            min_size=2,
+            max_size=10,
+            # Délai de connexion : une réplique injoignable doit échouer vite (repli sur le primaire)
+            timeout=DB_REPLICA_LAG_CHECK_INTERVAL,
+            init=_init_connection
+        )
+        print("Pool de connexions à la réplique PostgreSQL créé avec succès.")
+    return _read_pool
+
+async def _select_read_pool():
+    """
+    Pool à utiliser pour une lecture : la réplique si elle est configurée, joignable et
+    suffisamment à jour, sinon le primaire.
+    """
+    if DB_REPLICA_HOST and await replica_status.refresh():
+        DB_READ_ROUTES.labels("replica").inc()
+        return _read_pool
+    DB_READ_ROUTES.labels("primary").inc()
+    return await get_database_connection_pool()
+
+async def close_read_database_connection_pool():
+    """
+    Ferme le pool de la réplique en lecture s'il a été créé.
+    """
+    global _read_pool
+    if _read_pool is not None:
+        await _read_pool.close()
+        _read_pool = None
+
 async def close_database_connection_pool(pool):
     """
     Ferme le pool de connexions asynchrones.
@@ -138,8 +257,54 @@ async def get_connection():
         if _db_pool is None:
             raise RuntimeError("Le pool de base de données n'a pas pu être initialisé.")
 
-    conn = await _db_pool.acquire()
-    try:
+    async with timed_acquire(_db_pool) as conn:
         yield conn 
+
+@asynccontextmanager
+async def acquire_connection():
+    """
+    Emprunte une connexion au pool hors du système de dépendances FastAPI
+    (générateurs de réponses mises en cache, exports en streaming), en mesurant l'attente.
+    """
+    pool = await get_database_connection_pool()
+    async with timed_acquire(pool) as conn:
+        yield conn
+
+async def _enter_read_connection():
+    """
+    Emprunte une connexion de lecture et retourne (contexte, connexion). Si la connexion à la
+    réplique ne peut pas être empruntée, la réplique est écartée et le primaire est utilisé.
+    """
+    pool = await _select_read_pool()
+    context = timed_acquire(pool)
+    if pool is _read_pool:
+        try:
+            return context, await context.__aenter__()
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            replica_status.mark_unavailable(e)
+            DB_READ_ROUTES.labels("primary").inc()
+            context = timed_acquire(await get_database_connection_pool())
+    return context, await context.__aenter__()
+
+async def get_read_connection():
+    """
+    Dépendance FastAPI des routes de lecture qui tolèrent quelques secondes de retard
+    (listes, recherche) : connexion à la réplique, ou au primaire si elle est absente,
+    injoignable ou en retard de plus de DB_REPLICA_MAX_LAG_SECONDS.
+    """
+    context, conn = await _enter_read_connection()
+    try:
+        yield conn
+    finally:
+        await context.__aexit__(None, None, None)
+
+@asynccontextmanager
+async def acquire_read_connection():
+    """
+    Équivalent de acquire_connection pour les lectures pouvant être servies par la réplique.
+    """
+    context, conn = await _enter_read_connection()
+    try:
+        yield conn
     finally:
-        await _db_pool.release(conn)
+        await context.__aexit__(None, None, None)
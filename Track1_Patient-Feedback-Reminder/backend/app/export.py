@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.database import acquire_read_connection
+
+# Nombre de lignes pré-chargées par aller-retour du curseur serveur
+EXPORT_PREFETCH = int(os.getenv("EXPORT_PREFETCH", "500"))
+# Nombre de lignes regroupées dans un même morceau HTTP envoyé au client
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "200"))
+
+EXPORT_DATASETS: Dict[str, Dict[str, Any]] = {
+    "feedbacks": {
+        "table": "feedbacks",
+        "timestamp_column": "timestamp",
+        "columns": [
+            "id", "patient_id", "text", "note", "emoji", "timestamp", "patient_age",
+            "patient_gender", "department", "wait_time_min", "resolution_time_min",
+        ],
+    },
+    "insights": {
+        "table": "ai_analysis",
+        "timestamp_column": "analysis_timestamp",
+        "columns": ["id", "feedback_id", "analysis", "recommendations", "analysis_timestamp"],
+    },
+}
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _build_export_query(dataset: Dict[str, Any], date_from: Optional[datetime], date_to: Optional[datetime]):
+    conditions = []
+    params: List[Any] = []
+    if date_from is not None:
+        params.append(date_from)
+        conditions.append(f"{dataset['timestamp_column']} >= ${len(params)}")
+    if date_to is not None:
+        params.append(date_to)
+        conditions.append(f"{dataset['timestamp_column']} < ${len(params)}")
+
+    query = f"SELECT {', '.join(dataset['columns'])} FROM {dataset['table']}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    return query, params
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+# Premiers caractères interprétés comme une formule par les tableurs (injection CSV)
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        # Texte libre (feedback patient...) : neutralisé par une apostrophe, comme le fait Excel
+        return "'" + value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        # Colonnes JSONB, décodées par le codec du pool : ré-encodées en JSON dans la cellule
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+async def stream_export(
+    dataset_name: str,
+    export_format: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> AsyncIterator[str]:
+    """
+    Générateur asynchrone qui parcourt la table via un curseur côté serveur et produit
+    l'export au fil de l'eau (NDJSON ou CSV). Seules EXPORT_PREFETCH lignes sont en mémoire
+    à un instant donné, quelle que soit la taille de la table.
+
+    La connexion est prise directement dans le pool de lecture (réplique si disponible, et non
+    via une dépendance FastAPI) car elle doit rester ouverte pendant toute la durée de la
+    StreamingResponse.
+    """
+    dataset = EXPORT_DATASETS[dataset_name]
+    query, params = _build_export_query(dataset, date_from, date_to)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer is not None:
+        writer.writerow(dataset["columns"])
+
+    async with acquire_read_connection() as conn:
+        # Les curseurs côté serveur n'existent qu'à l'intérieur d'une transaction ;
+        # REPEATABLE READ garantit un instantané cohérent pendant tout l'export.
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            pending_rows = 0
+            async for record in conn.cursor(query, *params, prefetch=EXPORT_PREFETCH):
+                if writer is not None:
+                    writer.writerow([_csv_cell(record[column]) for column in dataset["columns"]])
+                else:
+                    buffer.write(json.dumps(dict(record), default=_json_default, ensure_ascii=False))
+                    buffer.write("\n")
+                pending_rows += 1
+
+                if pending_rows >= EXPORT_CHUNK_ROWS:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+                    pending_rows = 0
+
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining
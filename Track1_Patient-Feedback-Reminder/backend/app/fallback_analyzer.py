@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional
+
+import app.models
+
+# Règles reprises du service RAG (backend-rag-final/api2.py, SentimentAnalyzer) :
+# extract_sticker_sentiment, _assess_risk_factors et _generate_recommendations.
+# Elles servent d'analyse locale déterministe quand le service AI est indisponible ;
+# les analyses produites sont marquées `provisional` et remplacées dès qu'une vraie
+# analyse est enregistrée pour le même feedback.
+
+STICKER_SENTIMENT_MAP = {
+    '😊': 'positive', '😄': 'positive', '👍': 'positive', '❤️': 'positive',
+    '😢': 'negative', '😠': 'negative', '😡': 'negative', '👎': 'negative',
+    '😐': 'neutral', '🤔': 'neutral', '😕': 'slightly_negative',
+    '⭐': 'positive', '🌟': 'positive', '💯': 'positive'
+}
+
+# Indicateurs du service RAG, complétés de leurs équivalents français (feedbacks majoritairement en français)
+HEALTHCARE_POSITIVE_INDICATORS = [
+    'professional', 'excellent', 'caring', 'efficient', 'clean',
+    'helpful', 'quick', 'skilled', 'compassionate', 'thorough',
+    'professionnel', 'attentionné', 'efficace', 'propre', 'rapide',
+    'compétent', 'bienveillant', 'merci', 'satisfait'
+]
+
+HEALTHCARE_NEGATIVE_INDICATORS = [
+    'slow', 'rude', 'unprofessional', 'dirty', 'long wait',
+    'poor service', 'incompetent', 'rushed', 'dismissive',
+    'lent', 'impoli', 'sale', 'attente', 'incompétent', 'négligé',
+    'mécontent', 'déçu', 'inadmissible'
+]
+
+
+def extract_sticker_sentiment(feedback_text: str) -> Dict[str, Any]:
+    """Sentiment porté par les stickers/emojis du texte."""
+    sentiment_scores = {'positive': 0, 'negative': 0, 'neutral': 0}
+    stickers_found = []
+    if not feedback_text:
+        return {'sticker_sentiment': 'neutral', 'stickers_found': stickers_found, 'sentiment_scores': sentiment_scores}
+
+    for sticker, sentiment in STICKER_SENTIMENT_MAP.items():
+        if sticker in feedback_text:
+            stickers_found.append(sticker)
+            # 'slightly_negative' compté comme négatif (la table du service RAG n'a pas de case dédiée)
+            sentiment_scores['negative' if sentiment == 'slightly_negative' else sentiment] += 1
+
+    if sentiment_scores['positive'] > sentiment_scores['negative']:
+        sticker_sentiment = 'positive'
+    elif sentiment_scores['negative'] > sentiment_scores['positive']:
+        sticker_sentiment = 'negative'
+    else:
+        sticker_sentiment = 'neutral'
+
+    return {
+        'sticker_sentiment': sticker_sentiment,
+        'stickers_found': stickers_found,
+        'sentiment_scores': sentiment_scores
+    }
+
+
+def _assess_risk_factors(department: Optional[str], wait_time_min: Optional[float], rating: Optional[float],
+                         primary_sentiment: str, emotional_intensity: int) -> Dict[str, Any]:
+    """Facteurs de risque justifiant une escalade."""
+    risk_score = 0
+    risk_factors = []
+
+    if (wait_time_min or 0) > 60:
+        risk_score += 3
+        risk_factors.append('excessive_wait_time')
+
+    if rating is not None and rating <= 2:
+        risk_score += 4
+        risk_factors.append('low_rating')
+
+    if primary_sentiment == 'negative':
+        risk_score += 2
+        risk_factors.append('negative_sentiment')
+
+    if emotional_intensity >= 8:
+        risk_score += 3
+        risk_factors.append('high_emotional_intensity')
+
+    if department == 'Emergency' and primary_sentiment == 'negative':
+        risk_score += 2
+        risk_factors.append('emergency_negative_feedback')
+
+    return {
+        'risk_score': min(risk_score, 10),
+        'risk_level': 'high' if risk_score >= 7 else 'medium' if risk_score >= 4 else 'low',
+        'risk_factors': risk_factors
+    }
+
+
+def _generate_recommendations(department: Optional[str], wait_time_min: Optional[float], primary_sentiment: str) -> List[str]:
+    """Recommandations actionnables."""
+    recommendations = []
+    department = department or ''
+
+    if (wait_time_min or 0) > 45:
+        recommendations.append(f"Address wait time concerns in {department}")
+        recommendations.append("Implement better patient communication about delays")
+
+    if primary_sentiment == 'negative':
+        recommendations.append("Schedule follow-up contact with patient")
+        recommendations.append("Review staff training needs")
+    elif primary_sentiment == 'positive':
+        recommendations.append("Share positive feedback with staff")
+        recommendations.append("Identify best practices to replicate")
+
+    if department == 'Emergency':
+        recommendations.append("Review triage process efficiency")
+    elif department == 'Pediatrics':
+        recommendations.append("Enhance child-friendly environment")
+    elif department == 'Oncology':
+        recommendations.append("Ensure compassionate care protocols")
+
+    return recommendations
+
+
+def fallback_analysis(
+    feedback_text: str,
+    patient_id: Optional[str] = None,
+    patient_age: Optional[float] = None,
+    patient_gender: Optional[str] = None,
+    department: Optional[str] = None,
+    wait_time_min: Optional[float] = None,
+    resolution_time_min: Optional[float] = None,
+    rating: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Analyse déterministe locale, de même signature et de même format de retour que
+    call_ai_analysis_service ({"analysis": ..., "recommendations": ...}).
+    """
+    sticker_analysis = extract_sticker_sentiment(feedback_text)
+    lowered_text = (feedback_text or "").lower()
+    positive_hits = [word for word in HEALTHCARE_POSITIVE_INDICATORS if word in lowered_text]
+    negative_hits = [word for word in HEALTHCARE_NEGATIVE_INDICATORS if word in lowered_text]
+
+    # Score signé : stickers + indicateurs textuels + note (poids double)
+    score = sticker_analysis['sentiment_scores']['positive'] - sticker_analysis['sentiment_scores']['negative']
+    score += len(positive_hits) - len(negative_hits)
+    if rating is not None:
+        score += 2 if rating >= 4 else -2 if rating <= 2 else 0
+
+    primary_sentiment = 'positive' if score > 0 else 'negative' if score < 0 else 'neutral'
+    emotional_intensity = min(10, 3 + abs(score))
+    risk_factors = _assess_risk_factors(department, wait_time_min, rating, primary_sentiment, emotional_intensity)
+    urgency_level = {'high': 4, 'medium': 3, 'low': 2}[risk_factors['risk_level']]
+    key_themes = positive_hits + negative_hits or ['general_feedback']
+
+    analysis = app.models.AnalysisDataIn(
+        primary_sentiment=primary_sentiment,
+        confidence_score=30,
+        actionable_insights=['Manual review required'],
+        keywords=key_themes,
+        contextual_factors='Automated analysis unavailable: rule-based fallback used',
+        emotional_intensity=emotional_intensity,
+        key_themes=key_themes,
+        sentiment_explanation='Fallback analysis from stickers, healthcare indicators and rating',
+        urgency_level=urgency_level,
+        contextual_data=app.models.ExternalAIContextualData(
+            department=department,
+            patient_age=patient_age,
+            rating=rating,
+            resolution_time_min=resolution_time_min,
+            wait_time_min=wait_time_min
+        ),
+        risk_factors=app.models.ExternalAIRiskFactors(**risk_factors),
+        sticker_analysis=app.models.ExternalAIStickerAnalysis(**sticker_analysis),
+        provisional=True
+    )
+
+    return {
+        "analysis": analysis.model_dump(mode='json'),
+        "recommendations": _generate_recommendations(department, wait_time_min, primary_sentiment)
+    }
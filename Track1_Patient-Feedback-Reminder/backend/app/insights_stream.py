@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Set
+
+from fastapi import Request
+
+from app.database import acquire_connection
+from app.notifications import notification_listener
+
+logger = logging.getLogger(__name__)
+
+# Canal alimenté par le trigger trg_notify_urgent_analysis (migration 6)
+URGENT_ANALYSES_CHANNEL = "urgent_analyses"
+
+# Événements en attente par abonné : un client qui ne suit pas est déconnecté
+INSIGHTS_STREAM_QUEUE_SIZE = int(os.getenv("INSIGHTS_STREAM_QUEUE_SIZE", "100"))
+INSIGHTS_STREAM_MAX_SUBSCRIBERS = int(os.getenv("INSIGHTS_STREAM_MAX_SUBSCRIBERS", "500"))
+INSIGHTS_STREAM_HEARTBEAT_SECONDS = float(os.getenv("INSIGHTS_STREAM_HEARTBEAT_SECONDS", "15.0"))
+# Nombre maximum d'événements renvoyés lors d'une reprise avec Last-Event-ID
+INSIGHTS_STREAM_BACKFILL_LIMIT = int(os.getenv("INSIGHTS_STREAM_BACKFILL_LIMIT", "500"))
+
+# Seuils plancher appliqués par le trigger : les filtres des abonnés ne peuvent pas descendre en dessous
+MIN_URGENCY_FLOOR = 3
+RISK_LEVEL_RANKS = {"low": 1, "medium": 2, "high": 3}
+
+
+class StreamSubscriber:
+    """
+    Un client de GET /insights/stream : ses seuils et sa file d'événements bornée.
+    """
+
+    def __init__(self, min_urgency: int, min_risk_level: str, queue_size: int = INSIGHTS_STREAM_QUEUE_SIZE):
+        self.min_urgency = min_urgency
+        self.min_risk_rank = RISK_LEVEL_RANKS[min_risk_level]
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        # Positionné par le diffuseur : file pleine (client trop lent) ou perte de la connexion LISTEN
+        self.closed_reason: Optional[str] = None
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        urgency = event.get("urgency_level") or 0
+        risk_rank = RISK_LEVEL_RANKS.get(event.get("risk_level"), 0)
+        return urgency >= self.min_urgency or risk_rank >= self.min_risk_rank
+
+
+class AnalysisBroadcaster:
+    """
+    Diffuse en mémoire les notifications reçues sur la connexion LISTEN à tous les abonnés
+    du processus. La publication n'attend jamais : un abonné dont la file est pleine est
+    retiré au lieu de ralentir les autres.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[StreamSubscriber] = set()
+        self.dropped_subscribers = 0
+
+    def subscribe(self, min_urgency: int, min_risk_level: str) -> StreamSubscriber:
+        if len(self.subscribers) >= INSIGHTS_STREAM_MAX_SUBSCRIBERS:
+            raise RuntimeError("Nombre maximum d'abonnés au flux atteint.")
+        subscriber = StreamSubscriber(min_urgency, min_risk_level)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def _close(self, subscriber: StreamSubscriber, reason: str):
+        subscriber.closed_reason = reason
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: Dict[str, Any]):
+        for subscriber in list(self.subscribers):
+            if not subscriber.matches(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped_subscribers += 1
+                logger.warning("Abonné au flux des analyses urgentes trop lent : déconnecté.")
+                self._close(subscriber, "slow_consumer")
+
+    def close_all(self, reason: str):
+        for subscriber in list(self.subscribers):
+            self._close(subscriber, reason)
+
+
+broadcaster = AnalysisBroadcaster()
+
+
+def _on_urgent_analysis(payload: str):
+    broadcaster.publish(json.loads(payload))
+
+
+def _on_listener_state(connected: bool):
+    if not connected:
+        # Des événements vont être manqués : les clients se reconnectent avec Last-Event-ID
+        broadcaster.close_all("listener_lost")
+
+
+def start_insights_stream():
+    """
+    Abonne le diffuseur au canal URGENT_ANALYSES_CHANNEL de la connexion LISTEN partagée.
+    """
+    notification_listener.subscribe(URGENT_ANALYSES_CHANNEL, _on_urgent_analysis)
+    notification_listener.on_state_change(_on_listener_state)
+
+
+def stream_available() -> bool:
+    return notification_listener.connected
+
+
+async def _fetch_backfill(last_event_id: int):
+    """
+    Analyses au-dessus du seuil plancher écrites après `last_event_id`, au même format que
+    la charge utile du trigger notify_urgent_analysis.
+    """
+    async with acquire_connection() as conn:
+        rows = await conn.fetch("""
+            SELECT jsonb_build_object(
+                'id', id,
+                'feedback_id', feedback_id,
+                'urgency_level', urgency_level,
+                'risk_level', risk_level,
+                'risk_score', analysis -> 'risk_factors' -> 'risk_score',
+                'primary_sentiment', analysis ->> 'primary_sentiment',
+                'provisional', COALESCE((analysis ->> 'provisional')::BOOLEAN, FALSE),
+                'analysis_timestamp', analysis_timestamp
+            ) AS event
+            FROM (
+                SELECT *,
+                       CASE WHEN jsonb_typeof(analysis -> 'urgency_level') = 'number'
+                            THEN (analysis ->> 'urgency_level')::NUMERIC::INTEGER END AS urgency_level,
+                       analysis -> 'risk_factors' ->> 'risk_level' AS risk_level
+                FROM ai_analysis
+                WHERE id > $1
+            ) a
+            WHERE COALESCE(urgency_level, 0) >= $2 OR risk_level IN ('medium', 'high')
+            ORDER BY id
+            LIMIT $3;
+        """, last_event_id, MIN_URGENCY_FLOOR, INSIGHTS_STREAM_BACKFILL_LIMIT)
+    return [row["event"] for row in rows]
+
+
+def _format_event(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: urgent_analysis\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def urgent_analysis_events(request: Request, subscriber: StreamSubscriber, last_event_id: Optional[int]):
+    """
+    Générateur SSE d'un abonné : reprise éventuelle depuis Last-Event-ID, puis événements
+    en direct, avec un commentaire de maintien de connexion toutes les
+    INSIGHTS_STREAM_HEARTBEAT_SECONDS secondes.
+    """
+    try:
+        yield "retry: 5000\n\n"
+
+        backfilled_ids = set()
+        if last_event_id is not None:
+            for event in await _fetch_backfill(last_event_id):
+                if subscriber.matches(event):
+                    backfilled_ids.add(event["id"])
+                    yield _format_event(event)
+
+        while True:
+            if subscriber.closed_reason is not None:
+                # Les événements encore en file sont abandonnés : le client reprend avec Last-Event-ID
+                yield f"event: closed\ndata: {json.dumps({'reason': subscriber.closed_reason})}\n\n"
+                break
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=INSIGHTS_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": heartbeat\n\n"
+                continue
+            if event["id"] in backfilled_ids:
+                # Déjà envoyé pendant la reprise ; une mise à jour ultérieure (analyse provisoire
+                # remplacée) porte le même id et doit, elle, passer.
+                backfilled_ids.discard(event["id"])
+                continue
+            yield _format_event(event)
+    finally:
+        broadcaster.unsubscribe(subscriber)
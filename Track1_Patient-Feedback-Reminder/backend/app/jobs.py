@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from app.ai_service import (
+    AI_API_URL,
+    AI_CIRCUIT_RESET_TIMEOUT,
+    AI_FALLBACK_ENABLED,
+    AICircuitOpenError,
+    call_ai_analysis_service,
+    feedback_row_to_ai_input,
+    save_ai_analysis,
+)
+from app.fallback_analyzer import fallback_analysis
+from app.database import get_database_connection_pool
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "5"))
+ANALYSIS_JOB_POLL_INTERVAL = float(os.getenv("ANALYSIS_JOB_POLL_INTERVAL", "2.0"))
+# Un job resté 'running' plus longtemps que ce délai (worker arrêté en plein appel) est repris
+ANALYSIS_JOB_LEASE_SECONDS = float(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "300"))
+ANALYSIS_JOB_RETRY_BASE_DELAY = float(os.getenv("ANALYSIS_JOB_RETRY_BASE_DELAY", "5.0"))
+ANALYSIS_JOB_RETRY_MAX_DELAY = float(os.getenv("ANALYSIS_JOB_RETRY_MAX_DELAY", "300.0"))
+
+ANALYSIS_JOB_COLUMNS = "id, feedback_id, status, attempts, last_error, created_at, started_at, finished_at"
+
+# Réveille les workers de ce processus dès qu'un job est mis en file,
+# sans attendre le prochain cycle de polling.
+_jobs_available = asyncio.Event()
+
+
+async def enqueue_analysis_job(conn, feedback_id: int):
+    """
+    Ajoute un job d'analyse IA pour un feedback et retourne la ligne créée.
+    À appeler dans la même transaction que l'insertion du feedback.
+    """
+    return await conn.fetchrow(
+        f"INSERT INTO analysis_jobs (feedback_id) VALUES ($1) RETURNING {ANALYSIS_JOB_COLUMNS};",
+        feedback_id
+    )
+
+
+def wake_analysis_workers():
+    """
+    Signale aux workers locaux que de nouveaux jobs sont disponibles (après le commit).
+    """
+    _jobs_available.set()
+
+
+async def _claim_next_job(conn):
+    """
+    Réserve le prochain job exécutable. FOR UPDATE SKIP LOCKED permet à plusieurs workers
+    (et plusieurs processus uvicorn) de dépiler la file sans jamais se bloquer mutuellement.
+    Un job 'running' dont le bail a expiré n'est repris que s'il lui reste des tentatives ;
+    sinon (worker arrêté à chaque essai, feedback qui fait planter le traitement) il passe en 'failed'.
+    """
+    await conn.execute(
+        """
+        UPDATE analysis_jobs
+        SET status = 'failed',
+            last_error = COALESCE(last_error, 'Bail expiré après la dernière tentative.'),
+            finished_at = CURRENT_TIMESTAMP
+        WHERE status = 'running'
+          AND started_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+          AND attempts >= $2;
+        """,
+        ANALYSIS_JOB_LEASE_SECONDS, ANALYSIS_JOB_MAX_ATTEMPTS
+    )
+    return await conn.fetchrow(
+        """
+        UPDATE analysis_jobs
+        SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM analysis_jobs
+            WHERE (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+               OR (status = 'running' AND started_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                   AND attempts < $2)
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, feedback_id, attempts;
+        """,
+        ANALYSIS_JOB_LEASE_SECONDS, ANALYSIS_JOB_MAX_ATTEMPTS
+    )
+
+
+async def _fail_job(pool, job, error: str, retryable: bool):
+    delay = min(ANALYSIS_JOB_RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1), ANALYSIS_JOB_RETRY_MAX_DELAY)
+    give_up = not retryable or job["attempts"] >= ANALYSIS_JOB_MAX_ATTEMPTS
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE analysis_jobs
+            SET status = $2,
+                last_error = $3,
+                run_after = CURRENT_TIMESTAMP + make_interval(secs => $4),
+                finished_at = CASE WHEN $2 = 'failed' THEN CURRENT_TIMESTAMP ELSE NULL END
+            WHERE id = $1;
+            """,
+            job["id"], "failed" if give_up else "queued", error[:1000], delay
+        )
+    if give_up:
+        logger.error(f"Job d'analyse {job['id']} (feedback {job['feedback_id']}) en échec définitif: {error}")
+    else:
+        logger.warning(f"Job d'analyse {job['id']} (feedback {job['feedback_id']}) replanifié dans {delay:.0f}s: {error}")
+
+
+async def _requeue_job(conn, job, error: str, delay: float):
+    """
+    Remet un job en file sans consommer de tentative : le refus ne vient pas du service AI
+    lui-même mais du disjoncteur, et une panne prolongée ne doit pas épuiser les tentatives.
+    """
+    await conn.execute(
+        """
+        UPDATE analysis_jobs
+        SET status = 'queued',
+            attempts = GREATEST(attempts - 1, 0),
+            last_error = $2,
+            run_after = CURRENT_TIMESTAMP + make_interval(secs => $3),
+            finished_at = NULL
+        WHERE id = $1;
+        """,
+        job["id"], error[:1000], delay
+    )
+    logger.warning(f"Job d'analyse {job['id']} (feedback {job['feedback_id']}) remis en file dans {delay:.0f}s: {error}")
+
+
+async def _process_job(pool, job):
+    """
+    Exécute un job ; toute erreur inattendue (base de données, données du feedback invalides)
+    est enregistrée comme un échec réessayable, dans la limite de ANALYSIS_JOB_MAX_ATTEMPTS,
+    au lieu de laisser le job 'running' jusqu'à l'expiration de son bail.
+    """
+    try:
+        await _run_job(pool, job)
+    except Exception as e:
+        logger.exception(f"Erreur inattendue pendant le job d'analyse {job['id']}.")
+        await _fail_job(pool, job, str(e) or type(e).__name__, retryable=True)
+
+
+async def _run_job(pool, job):
+    """
+    Lecture du feedback, appel au service AI sans aucune connexion ni transaction ouverte,
+    puis écriture de l'analyse et clôture du job dans une transaction courte.
+
+    Circuit ouvert : l'analyse locale provisoire est enregistrée (si AI_FALLBACK_ENABLED) et le job
+    est remis en file sans consommer de tentative, pour être rejoué après AI_CIRCUIT_RESET_TIMEOUT.
+    Une analyse de repli renvoyée par le service AI lui-même est enregistrée comme provisoire et
+    compte comme un échec réessayable.
+    """
+    if not AI_API_URL:
+        await _fail_job(pool, job, "Service AI externe non configuré.", retryable=False)
+        return
+
+    async with pool.acquire() as conn:
+        feedback_row = await conn.fetchrow("""
+            SELECT text, patient_id, note, patient_age, patient_gender, department, wait_time_min, resolution_time_min
+            FROM feedbacks WHERE id = $1;
+        """, job["feedback_id"])
+
+    if feedback_row is None:
+        await _fail_job(pool, job, "Feedback introuvable.", retryable=False)
+        return
+
+    feedback_input = feedback_row_to_ai_input(feedback_row)
+    try:
+        ai_response_data_parsed = await call_ai_analysis_service(**feedback_input, allow_fallback=False)
+    except AICircuitOpenError as e:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if AI_FALLBACK_ENABLED:
+                    # Sans effet si une analyse existe déjà ; remplacée par l'analyse définitive
+                    await save_ai_analysis(conn, job["feedback_id"], fallback_analysis(**feedback_input))
+                await _requeue_job(conn, job, str(e.detail), AI_CIRCUIT_RESET_TIMEOUT)
+        return
+    except HTTPException as e:
+        retryable = e.status_code >= 500 or e.status_code == 429
+        await _fail_job(pool, job, str(e.detail), retryable=retryable)
+        return
+
+    if ai_response_data_parsed.get("analysis", {}).get("provisional"):
+        async with pool.acquire() as conn:
+            await save_ai_analysis(conn, job["feedback_id"], ai_response_data_parsed)
+        await _fail_job(pool, job, "Analyse de repli du service AI : analyse provisoire enregistrée.", retryable=True)
+        return
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Sans effet si une analyse définitive a été enregistrée entre-temps
+            await save_ai_analysis(conn, job["feedback_id"], ai_response_data_parsed)
+            await conn.execute("""
+                UPDATE analysis_jobs
+                SET status = 'done', last_error = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE id = $1;
+            """, job["id"])
+    logger.info(f"Job d'analyse {job['id']} terminé (feedback {job['feedback_id']}).")
+
+
+class AnalysisWorkerPool:
+    """
+    Pool de workers asynchrones qui dépilent la table analysis_jobs.
+    """
+
+    def __init__(self, worker_count: int = ANALYSIS_WORKERS):
+        self.worker_count = worker_count
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self):
+        pool = await get_database_connection_pool()
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._run(worker_id, pool), name=f"analysis-worker-{worker_id}")
+            for worker_id in range(self.worker_count)
+        ]
+        logger.info(f"{self.worker_count} workers d'analyse IA démarrés.")
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Arrête les workers. Un job interrompu en cours d'appel AI reste 'running'
+        et sera repris par un autre worker à l'expiration de ANALYSIS_JOB_LEASE_SECONDS.
+        """
+        self._stopping = True
+        _jobs_available.set()
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        logger.info("Workers d'analyse IA arrêtés.")
+
+    async def _wait_for_jobs(self):
+        try:
+            await asyncio.wait_for(_jobs_available.wait(), timeout=ANALYSIS_JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _jobs_available.clear()
+
+    async def _run(self, worker_id: int, pool):
+        while not self._stopping:
+            try:
+                async with pool.acquire() as conn:
+                    job = await _claim_next_job(conn)
+                if job is None:
+                    await self._wait_for_jobs()
+                    continue
+                await _process_job(pool, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Erreur inattendue dans le worker d'analyse {worker_id}.")
+                await asyncio.sleep(ANALYSIS_JOB_POLL_INTERVAL)
+
+
+_worker_pool: Optional[AnalysisWorkerPool] = None
+
+
+async def start_analysis_workers() -> Optional[AnalysisWorkerPool]:
+    """
+    Démarre le pool de workers d'analyse (ANALYSIS_WORKERS=0 pour le désactiver dans ce processus).
+    """
+    global _worker_pool
+    if _worker_pool is None and ANALYSIS_WORKERS > 0:
+        _worker_pool = AnalysisWorkerPool(ANALYSIS_WORKERS)
+        await _worker_pool.start()
+    return _worker_pool
+
+
+async def stop_analysis_workers():
+    """
+    Arrête le pool de workers d'analyse s'il a été démarré.
+    """
+    global _worker_pool
+    if _worker_pool is not None:
+        await _worker_pool.stop()
+        _worker_pool = None
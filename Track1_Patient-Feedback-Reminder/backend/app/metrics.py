@@ -0,0 +1,202 @@
+import re
+import time
+from functools import lru_cache
+
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+# Les métriques sont propres à chaque processus uvicorn : avec plusieurs workers,
+# Prometheus doit interroger chaque processus (ou passer par un agrégateur).
+
+# Bornes en secondes, de la requête SQL indexée (~1 ms) à l'appel IA lent (~30 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Durée de traitement des requêtes HTTP, par route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_ACQUIRE_DURATION = Histogram(
+    "db_pool_acquire_duration_seconds",
+    "Attente pour obtenir une connexion du pool asyncpg.",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_acquire_waiting",
+    "Nombre de requêtes en attente d'une connexion du pool.",
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Durée d'exécution des instructions SQL, par type d'instruction et table principale.",
+    ["statement", "table", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+AI_CALL_DURATION = Histogram(
+    "ai_call_duration_seconds",
+    "Durée des appels au service AI externe.",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+AI_CALLS = Counter(
+    "ai_calls",
+    "Appels au service AI externe, par issue (code HTTP, 'connection_error', 'invalid_response', 'error').",
+    ["outcome"],
+)
+
+ANALYSIS_CACHE_LOOKUPS = Counter(
+    "analysis_cache_lookups",
+    "Recherches dans le cache d'analyses par contenu : 'memory_hit', 'db_hit' ou 'miss'.",
+    ["result"],
+)
+AI_CIRCUIT_OPEN = Gauge(
+    "ai_circuit_open",
+    "1 si le disjoncteur du service AI est ouvert (appels court-circuités), 0 sinon.",
+)
+AI_FALLBACKS = Counter(
+    "ai_fallback_analyses",
+    "Analyses produites par l'analyseur local de secours pendant que le circuit est ouvert.",
+)
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Retard de réplication mesuré lors de la dernière vérification de la réplique en lecture.",
+)
+DB_READ_ROUTES = Counter(
+    "db_read_routes",
+    "Connexions de lecture empruntées, par cible : 'replica' ou 'primary' (pas de réplique, réplique en retard ou injoignable).",
+    ["target"],
+)
+
+
+# --- Requêtes HTTP ---
+
+async def http_metrics_middleware(request: Request, call_next):
+    """
+    Middleware HTTP : mesure la durée de chaque requête, étiquetée par le gabarit de route
+    (ex. /feedback/{feedback_id}) et non par l'URL brute, pour garder une cardinalité bornée.
+    """
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "<unmatched>")
+        HTTP_REQUEST_DURATION.labels(request.method, route_path, str(status_code)).observe(time.perf_counter() - start)
+
+
+# --- Requêtes SQL ---
+
+_STATEMENT_TABLE_PATTERNS = {
+    "select": re.compile(r"\bfrom\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "insert": re.compile(r"\binto\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "update": re.compile(r"^\s*update\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "delete": re.compile(r"\bfrom\s+([a-z_][a-z0-9_]*)", re.IGNORECASE),
+    "copy": re.compile(r"^\s*copy\s+\"?([a-z_][a-z0-9_]*)", re.IGNORECASE),
+}
+
+
+@lru_cache(maxsize=1024)
+def classify_query(query: str):
+    """
+    Retourne (type d'instruction, table principale) pour étiqueter une requête SQL.
+    Les requêtes de l'application sont des chaînes constantes : le cache LRU évite
+    de ré-analyser le texte à chaque exécution.
+    """
+    stripped = query.lstrip().lstrip("(")
+    keyword = stripped.split(None, 1)[0].lower() if stripped else "unknown"
+    if keyword == "with":
+        # CTE : on étiquette par l'instruction principale qui suit
+        match = re.search(r"\)\s*(select|insert|update|delete)\b", stripped, re.IGNORECASE)
+        keyword = match.group(1).lower() if match else "select"
+        if match:
+            stripped = stripped[match.start(1):]
+    pattern = _STATEMENT_TABLE_PATTERNS.get(keyword)
+    table = None
+    if pattern is not None:
+        match = pattern.search(stripped)
+        table = match.group(1).lower() if match else None
+    if keyword not in _STATEMENT_TABLE_PATTERNS and keyword not in ("begin", "commit", "rollback", "create", "alter", "drop", "lock", "listen"):
+        keyword = "other"
+    return keyword, table or "-"
+
+
+def record_query(record):
+    """
+    Callback asyncpg (Connection.add_query_logger) appelé après chaque instruction.
+    """
+    statement, table = classify_query(record.query)
+    outcome = "error" if record.exception is not None else "ok"
+    DB_QUERY_DURATION.labels(statement, table, outcome).observe(record.elapsed)
+
+
+# --- Pool de connexions ---
+
+class _PoolCollector:
+    """
+    Collecteur évalué au moment du scrape : lit l'état courant du pool asyncpg.
+    """
+
+    def __init__(self):
+        self.pool = None
+
+    def collect(self):
+        pool = self.pool
+        if pool is None:
+            return
+        size = pool.get_size()
+        idle = pool.get_idle_size()
+        yield GaugeMetricFamily("db_pool_size", "Connexions ouvertes dans le pool.", value=size)
+        yield GaugeMetricFamily("db_pool_idle", "Connexions libres dans le pool.", value=idle)
+        yield GaugeMetricFamily("db_pool_in_use", "Connexions empruntées au pool.", value=size - idle)
+        yield GaugeMetricFamily("db_pool_max_size", "Taille maximale du pool.", value=pool.get_max_size())
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def register_pool(pool):
+    """
+    Rattache le pool asyncpg aux jauges de saturation exposées sur /metrics.
+    """
+    _pool_collector.pool = pool
+
+
+class timed_acquire:
+    """
+    Contexte asynchrone qui emprunte une connexion au pool en mesurant l'attente.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        DB_POOL_WAITING.inc()
+        try:
+            self.conn = await self.pool.acquire()
+        finally:
+            DB_POOL_WAITING.dec()
+            DB_POOL_ACQUIRE_DURATION.observe(time.perf_counter() - start)
+        return self.conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.pool.release(self.conn)
+
+
+# --- Service AI ---
+
+def record_ai_call(outcome: str, duration: float):
+    AI_CALL_DURATION.labels(outcome).observe(duration)
+    AI_CALLS.labels(outcome).inc()
+
+
+# --- Exposition ---
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,774 @@
+import argparse
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Clé du verrou consultatif (pg_advisory_lock) pris pendant l'application des migrations,
+# pour que plusieurs processus uvicorn démarrés en même temps ne migrent pas en parallèle.
+MIGRATIONS_LOCK_KEY = 7_300_118
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    statements: List[str]
+
+
+# Liste ordonnée des migrations. Ne jamais modifier une migration déjà publiée :
+# ajouter une nouvelle version à la fin de la liste.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Tables initiales (feedbacks, ai_analysis, analysis_jobs, recall_requests, personalized_messages)", [
+        # IF NOT EXISTS : les bases créées avant le système de migrations ont déjà ces objets
+        """
+        CREATE TABLE IF NOT EXISTS feedbacks (
+            id SERIAL PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            note INTEGER,
+            emoji TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            patient_age REAL,
+            patient_gender TEXT,
+            department TEXT,
+            wait_time_min REAL,
+            resolution_time_min REAL
+        );
+        """,
+        # Index pour la pagination par curseur (timestamp, id) de GET /feedbacks
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedbacks_timestamp_id
+            ON feedbacks (timestamp DESC, id DESC);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedbacks_department_timestamp_id
+            ON feedbacks (department, timestamp DESC, id DESC);
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ai_analysis (
+            id SERIAL PRIMARY KEY,
+            feedback_id INTEGER REFERENCES feedbacks(id) ON DELETE CASCADE,
+            analysis JSONB,
+            recommendations JSONB,
+            analysis_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # File d'attente des analyses IA, dépilée par les workers de app/jobs.py
+        """
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id SERIAL PRIMARY KEY,
+            feedback_id INTEGER NOT NULL REFERENCES feedbacks(id) ON DELETE CASCADE,
+            status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_queued
+            ON analysis_jobs (run_after, id) WHERE status = 'queued';
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_running
+            ON analysis_jobs (started_at) WHERE status = 'running';
+        """,
+        # Table des demandes de rappel/rendez-vous
+        """
+        CREATE TABLE IF NOT EXISTS recall_requests (
+            id SERIAL PRIMARY KEY,
+            patient_id TEXT NOT NULL,
+            request_object TEXT NOT NULL,
+            requested_date DATE,
+            request_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending', -- Status of the request: 'pending', 'approved', 'rejected', 'completed'
+            approved_by TEXT,
+            approval_date TIMESTAMP
+        );
+        """,
+        # Table des messages personnalisés API
+        """
+        CREATE TABLE IF NOT EXISTS personalized_messages (
+            id SERIAL PRIMARY KEY,
+            recall_request_id INTEGER REFERENCES recall_requests(id) ON DELETE CASCADE,
+            patient_id TEXT NOT NULL,
+            message_content TEXT NOT NULL,
+            sent_by TEXT NOT NULL,
+            sent_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ai_message_analysis JSONB
+        );
+        """,
+    ]),
+    Migration(2, "Index secondaires pour les requêtes des routes", [
+        # Une seule analyse par feedback : on conserve la plus récente avant de poser l'index unique
+        """
+        DELETE FROM ai_analysis a
+        USING ai_analysis b
+        WHERE a.feedback_id = b.feedback_id AND a.id < b.id;
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_ai_analysis_feedback_id
+            ON ai_analysis (feedback_id);
+        """,
+        # GET /insights et GET /recommendations trient par date d'analyse
+        """
+        CREATE INDEX IF NOT EXISTS idx_ai_analysis_timestamp
+            ON ai_analysis (analysis_timestamp DESC);
+        """,
+        # GET /recall-requests?status_filter=... trié par request_timestamp
+        """
+        CREATE INDEX IF NOT EXISTS idx_recall_requests_status_timestamp
+            ON recall_requests (status, request_timestamp DESC);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_recall_requests_timestamp
+            ON recall_requests (request_timestamp DESC);
+        """,
+        # GET /personalized-messages/patient/{patient_id}
+        """
+        CREATE INDEX IF NOT EXISTS idx_personalized_messages_patient_timestamp
+            ON personalized_messages (patient_id, sent_timestamp DESC);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_personalized_messages_recall_request_id
+            ON personalized_messages (recall_request_id);
+        """,
+        # Clé étrangère de analysis_jobs : évite un parcours complet lors des suppressions en cascade
+        """
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_feedback_id
+            ON analysis_jobs (feedback_id);
+        """,
+    ]),
+    Migration(3, "Table d'agrégats insights_daily_summary maintenue par triggers", [
+        # Une ligne par (service, jour du feedback, sentiment principal) : sommes et effectifs,
+        # pour que GET /insights/summary ne lise jamais ai_analysis.
+        """
+        CREATE TABLE IF NOT EXISTS insights_daily_summary (
+            department TEXT NOT NULL,           -- '' si le feedback n'a pas de service
+            day DATE NOT NULL,
+            primary_sentiment TEXT NOT NULL,    -- '' si l'analyse n'a pas de sentiment
+            feedback_count INTEGER NOT NULL DEFAULT 0,
+            urgency_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            urgency_count INTEGER NOT NULL DEFAULT 0,
+            risk_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            risk_score_count INTEGER NOT NULL DEFAULT 0,
+            wait_time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            wait_time_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (department, day, primary_sentiment)
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_insights_daily_summary_day
+            ON insights_daily_summary (day);
+        """,
+        # Ajoute (sign = 1) ou retire (sign = -1) la contribution d'une analyse
+        """
+        CREATE OR REPLACE FUNCTION insights_summary_apply(
+            p_department TEXT, p_timestamp TIMESTAMP, p_wait_time REAL, p_analysis JSONB, p_sign INTEGER
+        ) RETURNS VOID AS $$
+        DECLARE
+            v_urgency DOUBLE PRECISION;
+            v_risk DOUBLE PRECISION;
+        BEGIN
+            IF jsonb_typeof(p_analysis -> 'urgency_level') = 'number' THEN
+                v_urgency := (p_analysis ->> 'urgency_level')::DOUBLE PRECISION;
+            END IF;
+            IF jsonb_typeof(p_analysis -> 'risk_factors' -> 'risk_score') = 'number' THEN
+                v_risk := (p_analysis -> 'risk_factors' ->> 'risk_score')::DOUBLE PRECISION;
+            END IF;
+
+            INSERT INTO insights_daily_summary AS s (
+                department, day, primary_sentiment, feedback_count,
+                urgency_sum, urgency_count, risk_score_sum, risk_score_count, wait_time_sum, wait_time_count
+            ) VALUES (
+                COALESCE(p_department, ''),
+                COALESCE(p_timestamp, CURRENT_TIMESTAMP)::DATE,
+                COALESCE(p_analysis ->> 'primary_sentiment', ''),
+                p_sign,
+                p_sign * COALESCE(v_urgency, 0), CASE WHEN v_urgency IS NULL THEN 0 ELSE p_sign END,
+                p_sign * COALESCE(v_risk, 0), CASE WHEN v_risk IS NULL THEN 0 ELSE p_sign END,
+                p_sign * COALESCE(p_wait_time, 0), CASE WHEN p_wait_time IS NULL THEN 0 ELSE p_sign END
+            )
+            ON CONFLICT (department, day, primary_sentiment) DO UPDATE SET
+                feedback_count = s.feedback_count + EXCLUDED.feedback_count,
+                urgency_sum = s.urgency_sum + EXCLUDED.urgency_sum,
+                urgency_count = s.urgency_count + EXCLUDED.urgency_count,
+                risk_score_sum = s.risk_score_sum + EXCLUDED.risk_score_sum,
+                risk_score_count = s.risk_score_count + EXCLUDED.risk_score_count,
+                wait_time_sum = s.wait_time_sum + EXCLUDED.wait_time_sum,
+                wait_time_count = s.wait_time_count + EXCLUDED.wait_time_count;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Trigger sur ai_analysis : chaque écriture d'analyse met à jour l'agrégat de son service/jour
+        """
+        CREATE OR REPLACE FUNCTION insights_summary_on_analysis() RETURNS TRIGGER AS $$
+        DECLARE
+            f RECORD;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                -- Lors d'une suppression en cascade depuis feedbacks, le feedback n'est plus visible :
+                -- sa contribution a déjà été retirée par insights_summary_on_feedback_delete.
+                SELECT department, timestamp, wait_time_min INTO f FROM feedbacks WHERE id = OLD.feedback_id;
+                IF FOUND THEN
+                    PERFORM insights_summary_apply(f.department, f.timestamp, f.wait_time_min, OLD.analysis, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT department, timestamp, wait_time_min INTO f FROM feedbacks WHERE id = NEW.feedback_id;
+                IF FOUND THEN
+                    PERFORM insights_summary_apply(f.department, f.timestamp, f.wait_time_min, NEW.analysis, 1);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE FUNCTION insights_summary_on_feedback_delete() RETURNS TRIGGER AS $$
+        DECLARE
+            a RECORD;
+        BEGIN
+            FOR a IN SELECT analysis FROM ai_analysis WHERE feedback_id = OLD.id LOOP
+                PERFORM insights_summary_apply(OLD.department, OLD.timestamp, OLD.wait_time_min, a.analysis, -1);
+            END LOOP;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_insights_summary_analysis ON ai_analysis;",
+        """
+        CREATE TRIGGER trg_insights_summary_analysis
+            AFTER INSERT OR UPDATE OF analysis, feedback_id OR DELETE ON ai_analysis
+            FOR EACH ROW EXECUTE FUNCTION insights_summary_on_analysis();
+        """,
+        "DROP TRIGGER IF EXISTS trg_insights_summary_feedback_delete ON feedbacks;",
+        """
+        CREATE TRIGGER trg_insights_summary_feedback_delete
+            BEFORE DELETE ON feedbacks
+            FOR EACH ROW EXECUTE FUNCTION insights_summary_on_feedback_delete();
+        """,
+        # Reconstruction complète (remplissage initial, ou réparation manuelle : SELECT insights_summary_rebuild();)
+        """
+        CREATE OR REPLACE FUNCTION insights_summary_rebuild() RETURNS VOID AS $$
+        BEGIN
+            LOCK TABLE insights_daily_summary IN EXCLUSIVE MODE;
+            DELETE FROM insights_daily_summary;
+            INSERT INTO insights_daily_summary (
+                department, day, primary_sentiment, feedback_count,
+                urgency_sum, urgency_count, risk_score_sum, risk_score_count, wait_time_sum, wait_time_count
+            )
+            SELECT department, day, primary_sentiment, COUNT(*),
+                   COALESCE(SUM(urgency), 0), COUNT(urgency),
+                   COALESCE(SUM(risk), 0), COUNT(risk),
+                   COALESCE(SUM(wait_time_min), 0), COUNT(wait_time_min)
+            FROM (
+                SELECT COALESCE(f.department, '') AS department,
+                       COALESCE(f.timestamp, a.analysis_timestamp)::DATE AS day,
+                       COALESCE(a.analysis ->> 'primary_sentiment', '') AS primary_sentiment,
+                       CASE WHEN jsonb_typeof(a.analysis -> 'urgency_level') = 'number'
+                            THEN (a.analysis ->> 'urgency_level')::DOUBLE PRECISION END AS urgency,
+                       CASE WHEN jsonb_typeof(a.analysis -> 'risk_factors' -> 'risk_score') = 'number'
+                            THEN (a.analysis -> 'risk_factors' ->> 'risk_score')::DOUBLE PRECISION END AS risk,
+                       f.wait_time_min
+                FROM ai_analysis a
+                JOIN feedbacks f ON f.id = a.feedback_id
+            ) rows
+            GROUP BY department, day, primary_sentiment;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "SELECT insights_summary_rebuild();",
+    ]),
+    Migration(4, "Notifications NOTIFY table_changes pour l'invalidation du cache de réponses", [
+        # Trigger par instruction (et non par ligne) : un import de 10 000 lignes ne produit
+        # qu'une notification, et PostgreSQL fusionne les doublons d'une même transaction.
+        """
+        CREATE OR REPLACE FUNCTION notify_table_change() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('table_changes', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_notify_table_change ON ai_analysis;",
+        """
+        CREATE TRIGGER trg_notify_table_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ai_analysis
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+        """,
+        "DROP TRIGGER IF EXISTS trg_notify_table_change ON recall_requests;",
+        """
+        CREATE TRIGGER trg_notify_table_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON recall_requests
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+        """,
+        "DROP TRIGGER IF EXISTS trg_notify_table_change ON personalized_messages;",
+        """
+        CREATE TRIGGER trg_notify_table_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON personalized_messages
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+        """,
+    ]),
+    Migration(5, "Cache persistant des analyses IA par empreinte de contenu", [
+        """
+        CREATE TABLE IF NOT EXISTS ai_analysis_cache (
+            content_hash TEXT PRIMARY KEY,   -- SHA-256 du texte normalisé et du contexte (app/analysis_cache.py)
+            analysis JSONB NOT NULL,
+            recommendations JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_ai_analysis_cache_created_at
+            ON ai_analysis_cache (created_at);
+        """,
+    ]),
+    Migration(6, "Notification NOTIFY urgent_analyses pour GET /insights/stream", [
+        # Trigger par ligne, filtré dans la base : seules les analyses au-dessus du seuil plancher
+        # (urgence >= 3 ou risque moyen/élevé) génèrent une notification, avec une charge utile réduite
+        # (bien en dessous de la limite de 8000 octets de NOTIFY).
+        """
+        CREATE OR REPLACE FUNCTION notify_urgent_analysis() RETURNS TRIGGER AS $$
+        DECLARE
+            v_urgency INTEGER;
+            v_risk_level TEXT := NEW.analysis -> 'risk_factors' ->> 'risk_level';
+        BEGIN
+            IF jsonb_typeof(NEW.analysis -> 'urgency_level') = 'number' THEN
+                v_urgency := (NEW.analysis ->> 'urgency_level')::NUMERIC::INTEGER;
+            END IF;
+            IF COALESCE(v_urgency, 0) >= 3 OR v_risk_level IN ('medium', 'high') THEN
+                PERFORM pg_notify('urgent_analyses', jsonb_build_object(
+                    'id', NEW.id,
+                    'feedback_id', NEW.feedback_id,
+                    'urgency_level', v_urgency,
+                    'risk_level', v_risk_level,
+                    'risk_score', NEW.analysis -> 'risk_factors' -> 'risk_score',
+                    'primary_sentiment', NEW.analysis ->> 'primary_sentiment',
+                    'provisional', COALESCE((NEW.analysis ->> 'provisional')::BOOLEAN, FALSE),
+                    'analysis_timestamp', NEW.analysis_timestamp
+                )::TEXT);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_notify_urgent_analysis ON ai_analysis;",
+        """
+        CREATE TRIGGER trg_notify_urgent_analysis
+            AFTER INSERT OR UPDATE OF analysis ON ai_analysis
+            FOR EACH ROW EXECUTE FUNCTION notify_urgent_analysis();
+        """,
+    ]),
+    Migration(7, "Recherche plein texte sur feedbacks.text (tsvector générés français/anglais + GIN)", [
+        # Colonnes générées : toujours à jour, sans trigger ni code applicatif
+        """
+        ALTER TABLE feedbacks
+            ADD COLUMN IF NOT EXISTS text_search_fr TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('french'::regconfig, COALESCE(text, ''))) STORED;
+        """,
+        """
+        ALTER TABLE feedbacks
+            ADD COLUMN IF NOT EXISTS text_search_en TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('english'::regconfig, COALESCE(text, ''))) STORED;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedbacks_text_search_fr
+            ON feedbacks USING GIN (text_search_fr);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedbacks_text_search_en
+            ON feedbacks USING GIN (text_search_en);
+        """,
+    ]),
+    Migration(8, "Partitionnement mensuel de feedbacks (timestamp) et ai_analysis (analysis_timestamp)", [
+        # Les tables existantes sont renommées puis recopiées dans des tables partitionnées
+        # par mois (app/partitions.py crée les mois suivants et archive les plus anciens).
+        "ALTER TABLE ai_analysis RENAME TO ai_analysis_legacy;",
+        "ALTER TABLE ai_analysis_legacy RENAME CONSTRAINT ai_analysis_pkey TO ai_analysis_legacy_pkey;",
+        "ALTER TABLE feedbacks RENAME TO feedbacks_legacy;",
+        "ALTER TABLE feedbacks_legacy RENAME CONSTRAINT feedbacks_pkey TO feedbacks_legacy_pkey;",
+        # Crée la partition du mois contenant p_month (nommée <table>_pAAAAMM) si elle n'existe pas.
+        # Retourne son nom, ou NULL si elle existait déjà.
+        """
+        CREATE OR REPLACE FUNCTION create_monthly_partition(p_parent TEXT, p_month DATE) RETURNS TEXT AS $$
+        DECLARE
+            v_start DATE := date_trunc('month', p_month)::DATE;
+            v_name TEXT := format('%s_p%s', p_parent, to_char(v_start, 'YYYYMM'));
+        BEGIN
+            IF to_regclass(v_name) IS NOT NULL THEN
+                RETURN NULL;
+            END IF;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                v_name, p_parent, v_start, (v_start + INTERVAL '1 month')::DATE
+            );
+            RETURN v_name;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # La clé primaire doit contenir la clé de partitionnement : (id, timestamp).
+        # timestamp devient NOT NULL (une clé NULL ne peut aller que dans la partition par défaut).
+        """
+        CREATE TABLE feedbacks (
+            id INTEGER NOT NULL DEFAULT nextval('feedbacks_id_seq'),
+            patient_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            note INTEGER,
+            emoji TEXT,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            patient_age REAL,
+            patient_gender TEXT,
+            department TEXT,
+            wait_time_min REAL,
+            resolution_time_min REAL,
+            text_search_fr TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('french'::regconfig, COALESCE(text, ''))) STORED,
+            text_search_en TSVECTOR
+                GENERATED ALWAYS AS (to_tsvector('english'::regconfig, COALESCE(text, ''))) STORED,
+            CONSTRAINT feedbacks_pkey PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        """,
+        # Plus de clé étrangère vers feedbacks : elle devrait référencer (id, timestamp).
+        # La suppression en cascade est reprise par le trigger trg_feedbacks_delete ci-dessous.
+        """
+        CREATE TABLE ai_analysis (
+            id INTEGER NOT NULL DEFAULT nextval('ai_analysis_id_seq'),
+            feedback_id INTEGER,
+            analysis JSONB,
+            recommendations JSONB,
+            analysis_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT ai_analysis_pkey PRIMARY KEY (id, analysis_timestamp)
+        ) PARTITION BY RANGE (analysis_timestamp);
+        """,
+        # Filet de sécurité : les lignes hors des mois créés ne font pas échouer les écritures
+        "CREATE TABLE feedbacks_default PARTITION OF feedbacks DEFAULT;",
+        "CREATE TABLE ai_analysis_default PARTITION OF ai_analysis DEFAULT;",
+        # Un mois par partition, du plus ancien mois présent jusqu'à trois mois à venir
+        """
+        DO $$
+        DECLARE
+            v_month DATE;
+        BEGIN
+            SELECT date_trunc('month', LEAST(
+                (SELECT MIN(timestamp) FROM feedbacks_legacy),
+                (SELECT MIN(analysis_timestamp) FROM ai_analysis_legacy),
+                CURRENT_TIMESTAMP::TIMESTAMP
+            ))::DATE INTO v_month;
+            WHILE v_month <= (date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '3 months')::DATE LOOP
+                PERFORM create_monthly_partition('feedbacks', v_month);
+                PERFORM create_monthly_partition('ai_analysis', v_month);
+                v_month := (v_month + INTERVAL '1 month')::DATE;
+            END LOOP;
+        END;
+        $$;
+        """,
+        """
+        INSERT INTO feedbacks (
+            id, patient_id, text, note, emoji, timestamp, patient_age, patient_gender,
+            department, wait_time_min, resolution_time_min
+        )
+        SELECT id, patient_id, text, note, emoji, COALESCE(timestamp, CURRENT_TIMESTAMP), patient_age, patient_gender,
+               department, wait_time_min, resolution_time_min
+        FROM feedbacks_legacy;
+        """,
+        """
+        INSERT INTO ai_analysis (id, feedback_id, analysis, recommendations, analysis_timestamp)
+        SELECT a.id, a.feedback_id, a.analysis, a.recommendations,
+               COALESCE(a.analysis_timestamp, f.timestamp, CURRENT_TIMESTAMP)
+        FROM ai_analysis_legacy a
+        LEFT JOIN feedbacks_legacy f ON f.id = a.feedback_id;
+        """,
+        # Les séquences des colonnes SERIAL suivent les nouvelles tables (pg_get_serial_sequence)
+        "ALTER SEQUENCE feedbacks_id_seq OWNED BY feedbacks.id;",
+        "ALTER SEQUENCE ai_analysis_id_seq OWNED BY ai_analysis.id;",
+        "ALTER TABLE analysis_jobs DROP CONSTRAINT IF EXISTS analysis_jobs_feedback_id_fkey;",
+        # Supprime aussi les anciens index et triggers, recréés ci-dessous sur les tables partitionnées
+        "DROP TABLE ai_analysis_legacy;",
+        "DROP TABLE feedbacks_legacy;",
+        """
+        CREATE INDEX idx_feedbacks_timestamp_id
+            ON feedbacks (timestamp DESC, id DESC);
+        """,
+        """
+        CREATE INDEX idx_feedbacks_department_timestamp_id
+            ON feedbacks (department, timestamp DESC, id DESC);
+        """,
+        """
+        CREATE INDEX idx_feedbacks_text_search_fr
+            ON feedbacks USING GIN (text_search_fr);
+        """,
+        """
+        CREATE INDEX idx_feedbacks_text_search_en
+            ON feedbacks USING GIN (text_search_en);
+        """,
+        # Index non unique : un index unique devrait contenir analysis_timestamp.
+        # L'unicité d'une analyse par feedback est assurée par upsert_ai_analysis.
+        """
+        CREATE INDEX idx_ai_analysis_feedback_id
+            ON ai_analysis (feedback_id);
+        """,
+        """
+        CREATE INDEX idx_ai_analysis_timestamp
+            ON ai_analysis (analysis_timestamp DESC);
+        """,
+        # Écriture de l'analyse d'un feedback : insertion, ou remplacement d'une analyse provisoire
+        # par une analyse définitive. Les écritures concurrentes pour un même feedback sont
+        # sérialisées par un verrou consultatif de transaction. Ne retourne aucune ligne si une
+        # analyse existait déjà et n'a pas été remplacée.
+        """
+        CREATE OR REPLACE FUNCTION upsert_ai_analysis(
+            p_feedback_id INTEGER, p_analysis JSONB, p_recommendations JSONB
+        ) RETURNS SETOF ai_analysis AS $$
+        DECLARE
+            v_existing ai_analysis%ROWTYPE;
+            v_row ai_analysis%ROWTYPE;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(7300119, p_feedback_id);
+            SELECT * INTO v_existing FROM ai_analysis
+            WHERE feedback_id = p_feedback_id
+            ORDER BY analysis_timestamp DESC
+            LIMIT 1;
+            IF NOT FOUND THEN
+                INSERT INTO ai_analysis (feedback_id, analysis, recommendations)
+                VALUES (p_feedback_id, p_analysis, p_recommendations)
+                RETURNING * INTO v_row;
+                RETURN NEXT v_row;
+            ELSIF v_existing.analysis ->> 'provisional' = 'true'
+                  AND COALESCE(p_analysis ->> 'provisional', 'false') <> 'true' THEN
+                UPDATE ai_analysis
+                SET analysis = p_analysis,
+                    recommendations = p_recommendations,
+                    analysis_timestamp = CURRENT_TIMESTAMP
+                WHERE id = v_existing.id AND analysis_timestamp = v_existing.analysis_timestamp
+                RETURNING * INTO v_row;
+                RETURN NEXT v_row;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Remplace la cascade ON DELETE des clés étrangères supprimées. Trigger AFTER : le feedback
+        # n'est plus visible, donc insights_summary_on_analysis ignore les analyses supprimées ici
+        # et leur contribution est retirée une seule fois.
+        """
+        CREATE OR REPLACE FUNCTION feedbacks_on_delete() RETURNS TRIGGER AS $$
+        DECLARE
+            a RECORD;
+        BEGIN
+            FOR a IN SELECT analysis FROM ai_analysis WHERE feedback_id = OLD.id LOOP
+                PERFORM insights_summary_apply(OLD.department, OLD.timestamp, OLD.wait_time_min, a.analysis, -1);
+            END LOOP;
+            DELETE FROM ai_analysis WHERE feedback_id = OLD.id;
+            DELETE FROM analysis_jobs WHERE feedback_id = OLD.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP FUNCTION IF EXISTS insights_summary_on_feedback_delete();",
+        """
+        CREATE TRIGGER trg_feedbacks_delete
+            AFTER DELETE ON feedbacks
+            FOR EACH ROW EXECUTE FUNCTION feedbacks_on_delete();
+        """,
+        # Triggers des migrations 3, 4 et 6, supprimés avec l'ancienne table ai_analysis
+        """
+        CREATE TRIGGER trg_insights_summary_analysis
+            AFTER INSERT OR UPDATE OF analysis, feedback_id OR DELETE ON ai_analysis
+            FOR EACH ROW EXECUTE FUNCTION insights_summary_on_analysis();
+        """,
+        """
+        CREATE TRIGGER trg_notify_table_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ai_analysis
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+        """,
+        """
+        CREATE TRIGGER trg_notify_urgent_analysis
+            AFTER INSERT OR UPDATE OF analysis ON ai_analysis
+            FOR EACH ROW EXECUTE FUNCTION notify_urgent_analysis();
+        """,
+    ]),
+    Migration(9, "Rappels automatiques : suivi d'envoi des messages personnalisés", [
+        # kind = 'manual' (POST /personalized-messages) ou 'recall_reminder' (app/reminders.py).
+        # delivery_status n'est renseigné que pour les messages envoyés par le répartiteur :
+        # 'queued', 'sending' (réservé jusqu'à delivery_run_after), 'sent' ou 'failed'.
+        """
+        ALTER TABLE personalized_messages
+            ADD COLUMN IF NOT EXISTS kind TEXT NOT NULL DEFAULT 'manual',
+            ADD COLUMN IF NOT EXISTS delivery_status TEXT,
+            ADD COLUMN IF NOT EXISTS delivery_attempts INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS delivery_run_after TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS last_delivery_error TEXT;
+        """,
+        # Un seul rappel par demande, quel que soit le nombre de processus ou de redémarrages
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_personalized_messages_recall_reminder
+            ON personalized_messages (recall_request_id) WHERE kind = 'recall_reminder';
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_personalized_messages_delivery
+            ON personalized_messages (delivery_run_after) WHERE delivery_status IN ('queued', 'sending');
+        """,
+        # Demandes approuvées à échéance proche, parcourues à chaque passe du répartiteur
+        """
+        CREATE INDEX IF NOT EXISTS idx_recall_requests_approved_date
+            ON recall_requests (requested_date) WHERE status = 'approved';
+        """,
+        # Dernier feedback d'un patient (brouillon de message de son analyse)
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedbacks_patient_timestamp
+            ON feedbacks (patient_id, timestamp DESC);
+        """,
+    ]),
+    Migration(10, "insights_daily_summary suit les modifications de service, date et attente des feedbacks", [
+        # Retire la contribution des analyses d'un feedback avec ses anciennes valeurs et l'ajoute
+        # avec les nouvelles
+        """
+        CREATE OR REPLACE FUNCTION insights_summary_move_feedback(p_old feedbacks, p_new feedbacks) RETURNS VOID AS $$
+        DECLARE
+            a RECORD;
+        BEGIN
+            FOR a IN SELECT analysis FROM ai_analysis WHERE feedback_id = p_new.id LOOP
+                PERFORM insights_summary_apply(p_old.department, p_old.timestamp, p_old.wait_time_min, a.analysis, -1);
+                PERFORM insights_summary_apply(p_new.department, p_new.timestamp, p_new.wait_time_min, a.analysis, 1);
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE FUNCTION feedbacks_on_summary_update() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM insights_summary_move_feedback(OLD, NEW);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_feedbacks_summary_update ON feedbacks;",
+        """
+        CREATE TRIGGER trg_feedbacks_summary_update
+            AFTER UPDATE OF department, timestamp, wait_time_min ON feedbacks
+            FOR EACH ROW
+            WHEN (OLD.department IS DISTINCT FROM NEW.department
+                  OR OLD.timestamp IS DISTINCT FROM NEW.timestamp
+                  OR OLD.wait_time_min IS DISTINCT FROM NEW.wait_time_min)
+            EXECUTE FUNCTION feedbacks_on_summary_update();
+        """,
+        # Un UPDATE de timestamp qui change de mois déplace la ligne vers une autre partition :
+        # PostgreSQL l'exécute comme DELETE + INSERT, sans déclencher les triggers AFTER UPDATE.
+        # Si le feedback existe toujours, il a été déplacé : ses analyses et tâches sont conservées
+        # et seule sa contribution aux agrégats est déplacée.
+        """
+        CREATE OR REPLACE FUNCTION feedbacks_on_delete() RETURNS TRIGGER AS $$
+        DECLARE
+            a RECORD;
+            moved feedbacks;
+        BEGIN
+            SELECT * INTO moved FROM feedbacks WHERE id = OLD.id;
+            IF FOUND THEN
+                PERFORM insights_summary_move_feedback(OLD, moved);
+                RETURN NULL;
+            END IF;
+            FOR a IN SELECT analysis FROM ai_analysis WHERE feedback_id = OLD.id LOOP
+                PERFORM insights_summary_apply(OLD.department, OLD.timestamp, OLD.wait_time_min, a.analysis, -1);
+            END LOOP;
+            DELETE FROM ai_analysis WHERE feedback_id = OLD.id;
+            DELETE FROM analysis_jobs WHERE feedback_id = OLD.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Réaligne les agrégats sur d'éventuelles modifications antérieures
+        "SELECT insights_summary_rebuild();",
+    ]),
+    Migration(11, "Notification NOTIFY table_changes pour les modifications de feedbacks", [
+        # /insights/summary (insights_daily_summary, tenu à jour depuis feedbacks) et /recommendations
+        # filtré par département dépendent des colonnes de feedbacks : leurs réponses en cache sont
+        # invalidées à chaque instruction qui modifie la table.
+        "DROP TRIGGER IF EXISTS trg_notify_table_change ON feedbacks;",
+        """
+        CREATE TRIGGER trg_notify_table_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON feedbacks
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+        """,
+    ]),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(conn) -> int:
+    """
+    Retourne la version de schéma appliquée (0 si la table schema_migrations n'existe pas encore).
+    """
+    table_exists = await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL;")
+    if not table_exists:
+        return 0
+    return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+
+
+async def run_migrations(conn) -> int:
+    """
+    Met le schéma à jour. Dans le cas courant (base déjà à jour) il ne s'agit que d'une
+    seule lecture de version ; sinon chaque migration en attente est appliquée dans sa propre
+    transaction sous un verrou consultatif, puis enregistrée dans schema_migrations.
+    Retourne la version finale du schéma.
+    """
+    current_version = await get_schema_version(conn)
+    if current_version >= LATEST_SCHEMA_VERSION:
+        return current_version
+
+    await conn.execute("SELECT pg_advisory_lock($1);", MIGRATIONS_LOCK_KEY)
+    try:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        # Relecture sous verrou : un autre processus a pu migrer pendant l'attente
+        current_version = await get_schema_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= current_version:
+                continue
+            async with conn.transaction():
+                for statement in migration.statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES ($1, $2);",
+                    migration.version, migration.description
+                )
+            current_version = migration.version
+            print(f"Migration {migration.version} appliquée : {migration.description}")
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1);", MIGRATIONS_LOCK_KEY)
+
+    return current_version
+
+
+# --- Point d'entrée CLI : python -m app.migrations ---
+
+async def _main(args):
+    from app.database import close_database_connection_pool, get_database_connection_pool
+
+    # get_database_connection_pool applique déjà les migrations en attente
+    pool = await get_database_connection_pool()
+    try:
+        async with pool.acquire() as conn:
+            version = await get_schema_version(conn)
+            print(f"Version du schéma : {version} (dernière connue : {LATEST_SCHEMA_VERSION})")
+            if args.list:
+                for row in await conn.fetch("SELECT version, description, applied_at FROM schema_migrations ORDER BY version;"):
+                    print(f"  {row['version']:>3}  {row['applied_at']:%Y-%m-%d %H:%M}  {row['description']}")
+    finally:
+        await close_database_connection_pool(pool)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Applique les migrations de schéma PostgreSQL en attente.")
+    parser.add_argument("--list", action="store_true", help="Affiche les migrations déjà appliquées.")
+    asyncio.run(_main(parser.parse_args()))
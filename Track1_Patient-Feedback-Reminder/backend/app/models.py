@@ -103,6 +103,8 @@ class AnalysisDataIn(BaseModel):
     contextual_data: Optional[ExternalAIContextualData] = None
     risk_factors: Optional[ExternalAIRiskFactors] = None
     sticker_analysis: Optional[ExternalAIStickerAnalysis] = None
+    # True si l'analyse vient de l'analyseur local de secours (service AI indisponible)
+    provisional: Optional[bool] = None
 
     class Config:
         extra = "allow"
@@ -123,6 +125,17 @@ class RecallRequestIn(BaseModel):
     request_object: str = Field(..., example="Demande de suivi pour le traitement X")
     requested_date: Optional[date] = Field(None, example="2025-08-15", description="Date souhaitée par le patient pour le rappel.")
 
+class RecallRequestStatusBatchIn(BaseModel):
+    """
+    Modèle pour le changement de statut groupé PUT /recall-requests/status.
+    Cible soit une liste d'IDs (`ids`), soit un filtre (`current_status` et/ou `patient_id`).
+    """
+    ids: Optional[List[int]] = Field(None, max_length=1000, example=[12, 13, 15], description="IDs des demandes à mettre à jour.")
+    current_status: Optional[str] = Field(None, example="pending", description="Filtre : statut actuel des demandes à mettre à jour.")
+    patient_id: Optional[str] = Field(None, example="P001", description="Filtre : patient des demandes à mettre à jour.")
+    new_status: str = Field(..., example="approved", description="Nouveau statut : 'pending', 'approved', 'rejected' ou 'completed'.")
+    approved_by: str = Field(..., min_length=1, example="Dr. Smith")
+
 class PersonalizedMessageIn(BaseModel):
     """
     Modèle pour l'envoi d'un message personnalisé (souvent généré ou validé par l'IA,
@@ -152,6 +165,67 @@ class FeedbackOut(BaseModel):
     class Config:
         from_attributes = True
 
+class FeedbackSearchHit(FeedbackOut):
+    """
+    Modèle pour un résultat de GET /feedbacks/search : le feedback, son score de pertinence
+    et un extrait du texte où les termes trouvés sont entourés de <mark>...</mark>.
+    """
+    department: Optional[str] = Field(None, example="Radiologie")
+    rank: float = Field(..., example=0.0759)
+    highlight: str = Field(
+        ...,
+        example="Beaucoup trop d'<mark>attente</mark> avant l'examen.",
+        description="HTML sûr : le texte du feedback est échappé (&, <, >) et seules les balises <mark> sont ajoutées."
+    )
+
+class FeedbackSearchPageOut(BaseModel):
+    """
+    Modèle pour une page de résultats de recherche (pagination par curseur).
+    """
+    items: List[FeedbackSearchHit]
+    next_cursor: Optional[str] = None
+
+class BulkFeedbackCreated(BaseModel):
+    """
+    Identifiant attribué à un enregistrement accepté, repéré par sa position dans le lot.
+    """
+    index: int = Field(..., example=0)
+    id: int = Field(..., example=1)
+
+class BulkFeedbackError(BaseModel):
+    """
+    Erreurs de validation d'un enregistrement rejeté, repéré par sa position dans le lot.
+    """
+    index: int = Field(..., example=3)
+    errors: List[str] = Field(..., example=["note: Input should be less than or equal to 5"])
+
+class BulkFeedbackResult(BaseModel):
+    """
+    Modèle de réponse de l'endpoint POST /feedbacks/bulk.
+    """
+    received: int = Field(..., example=1000)
+    inserted: int = Field(..., example=998)
+    created: List[BulkFeedbackCreated]
+    errors: List[BulkFeedbackError]
+    analysis_jobs_queued: int = Field(0, example=0)
+
+class BacklogProgressOut(BaseModel):
+    """
+    Modèle pour l'avancement d'une passe de rattrapage des analyses IA manquantes.
+    """
+    running: bool
+    total: int = Field(..., example=350)
+    analyzed: int = Field(..., example=120)
+    saved: int = Field(..., example=100)
+    failed: int = Field(..., example=2)
+    remaining: int = Field(..., example=228)
+    concurrency: int = Field(..., example=8)
+    elapsed_seconds: float = Field(..., example=42.5)
+    throughput_per_second: float = Field(..., example=2.87)
+    started_at: datetime = Field(..., example=datetime.now())
+    finished_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
 class AnalysisDataOut(BaseModel):
     """
     Modèle pour les données d'analyse IA contenues dans AnalysisOut.
@@ -172,6 +246,8 @@ class AnalysisDataOut(BaseModel):
     contextual_data: Optional[ExternalAIContextualData] = None
     risk_factors: Optional[ExternalAIRiskFactors] = None
     sticker_analysis: Optional[ExternalAIStickerAnalysis] = None
+    # True si l'analyse vient de l'analyseur local de secours (service AI indisponible)
+    provisional: Optional[bool] = None
 
     class Config:
         extra = "allow"
@@ -188,12 +264,44 @@ class AnalysisOut(BaseModel):
     class Config:
         from_attributes = True
 
-class FeedbackAndAnalysisResponse(BaseModel):
+class InsightsSummaryBucketOut(BaseModel):
+    """
+    Modèle pour un agrégat d'analyses IA par service et par période (GET /insights/summary).
+    Les moyennes valent None quand aucune analyse de la période ne fournit la valeur.
+    """
+    department: Optional[str] = Field(None, example="Cardiologie")
+    bucket_start: date = Field(..., example="2025-07-01")
+    feedback_count: int = Field(..., example=42)
+    sentiment_counts: Dict[str, int] = Field(..., example={"positive": 30, "negative": 10, "neutral": 2})
+    avg_urgency_level: Optional[float] = Field(None, example=2.4)
+    avg_risk_score: Optional[float] = Field(None, example=3.1)
+    avg_wait_time_min: Optional[float] = Field(None, example=37.5)
+
+class AnalysisJobOut(BaseModel):
+    """
+    Modèle pour la sortie d'un job d'analyse IA (file d'attente analysis_jobs).
+    `analysis` est renseigné une fois le job terminé (status 'done').
+    """
+    id: int = Field(..., example=1)
+    feedback_id: int = Field(..., example=1)
+    status: str = Field(..., example="queued", description="'queued', 'running', 'done' ou 'failed'.")
+    attempts: int = Field(..., example=0)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(..., example=datetime.now())
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    analysis: Optional[AnalysisOut] = None
+
+    class Config:
+        from_attributes = True
+
+class FeedbackAndJobResponse(BaseModel):
     """
-    Modèle de réponse combinée pour l'endpoint POST /feedback_and_analyze.
+    Modèle de réponse combinée pour l'endpoint POST /feedback_and_analyze :
+    le feedback créé et le job d'analyse IA mis en file.
     """
     feedback: FeedbackOut
-    analysis: AnalysisOut
+    job: AnalysisJobOut
 
 
 class RecommendationOut(BaseModel):
@@ -207,6 +315,29 @@ class RecommendationOut(BaseModel):
     class Config:
         from_attributes = True
 
+class RecommendationPageOut(BaseModel):
+    """
+    Modèle pour une page de recommandations (pagination par curseur sur
+    (analysis_timestamp, id de l'analyse, position dans la liste)).
+    """
+    items: List[RecommendationOut]
+    next_cursor: Optional[str] = None
+
+class RecommendationFrequencyOut(BaseModel):
+    """
+    Modèle pour une recommandation distincte et son nombre d'occurrences (mode `distinct`).
+    """
+    recommendation: str = Field(..., example="Schedule follow-up contact with patient")
+    frequency: int = Field(..., example=42)
+    last_seen: datetime = Field(..., example=datetime.now())
+
+class RecommendationFrequencyPageOut(BaseModel):
+    """
+    Modèle pour une page de recommandations distinctes, des plus fréquentes aux plus rares.
+    """
+    items: List[RecommendationFrequencyOut]
+    next_cursor: Optional[str] = None
+
 class RecallRequestOut(BaseModel):
     """
     Modèle pour la sortie d'une demande de rappel/rendez-vous.
@@ -223,6 +354,22 @@ class RecallRequestOut(BaseModel):
     class Config:
         from_attributes = True
 
+class RecallRequestStatusOutcome(BaseModel):
+    """
+    Résultat du changement de statut groupé pour une demande : 'updated' ou 'not_found'.
+    """
+    id: int = Field(..., example=12)
+    outcome: str = Field(..., example="updated")
+
+class RecallRequestStatusBatchResult(BaseModel):
+    """
+    Modèle de réponse de l'endpoint PUT /recall-requests/status.
+    """
+    requested: int = Field(..., example=3)
+    updated: int = Field(..., example=2)
+    results: List[RecallRequestStatusOutcome]
+    recall_requests: List[RecallRequestOut]
+
 class PersonalizedMessageOut(BaseModel):
     """
     Modèle pour la sortie d'un message personnalisé.
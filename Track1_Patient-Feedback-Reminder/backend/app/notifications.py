@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+from app.database import open_dedicated_connection
+
+logger = logging.getLogger(__name__)
+
+# Délai entre deux tentatives de reconnexion de la connexion LISTEN
+NOTIFY_LISTENER_RETRY_DELAY = float(os.getenv("NOTIFY_LISTENER_RETRY_DELAY", "5.0"))
+
+
+class PgNotificationListener:
+    """
+    Une connexion PostgreSQL dédiée par processus, abonnée (LISTEN) à plusieurs canaux.
+    Les modules s'enregistrent avec `subscribe(canal, callback)` avant `start()` ;
+    `on_state_change(connected: bool)` prévient les abonnés des pertes de connexion,
+    pendant lesquelles des notifications ont pu être manquées.
+    """
+
+    def __init__(self):
+        self._callbacks: Dict[str, List[Callable[[str], None]]] = {}
+        self._state_callbacks: List[Callable[[bool], None]] = []
+        self._conn = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._disconnected = asyncio.Event()
+        self.connected = False
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def on_state_change(self, callback: Callable[[bool], None]):
+        self._state_callbacks.append(callback)
+
+    def _set_connected(self, connected: bool):
+        self.connected = connected
+        for callback in self._state_callbacks:
+            callback(connected)
+
+    def _dispatch(self, connection, pid, channel, payload):
+        for callback in self._callbacks.get(channel, []):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception(f"Erreur dans le traitement d'une notification du canal {channel}.")
+
+    def _on_termination(self, connection):
+        logger.warning("Connexion LISTEN perdue.")
+        self._set_connected(False)
+        self._disconnected.set()
+
+    async def _connect(self):
+        self._conn = await open_dedicated_connection()
+        self._conn.add_termination_listener(self._on_termination)
+        for channel in self._callbacks:
+            await self._conn.add_listener(channel, self._dispatch)
+        self._set_connected(True)
+        logger.info(f"LISTEN actif sur les canaux : {', '.join(self._callbacks)}.")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                self._disconnected.clear()
+                await self._connect()
+                await self._disconnected.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    self._set_connected(False)
+                logger.warning(f"Connexion LISTEN indisponible ({e}), nouvel essai dans {NOTIFY_LISTENER_RETRY_DELAY}s.")
+            if not self._stopping:
+                await asyncio.sleep(NOTIFY_LISTENER_RETRY_DELAY)
+
+    def start(self):
+        if self._task is None and self._callbacks:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(), name="pg-notification-listener")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+        if self.connected:
+            self._set_connected(False)
+
+
+notification_listener = PgNotificationListener()
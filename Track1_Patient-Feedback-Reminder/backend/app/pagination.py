@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict
+
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """
+    Encode la position de la dernière ligne d'une page en un curseur opaque (base64 url-safe).
+    Les datetimes sont sérialisés en ISO 8601.
+    """
+    payload = {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+# Type attendu de chaque champ de curseur produit par les routes ; un curseur bien formé mais
+# dont une valeur a un autre type est refusé (400) au lieu d'échouer dans la requête SQL.
+CURSOR_FIELD_TYPES = {
+    "id": int,
+    "pos": int,
+    "freq": int,
+    "rank": (int, float),
+    "rec": str,
+}
+
+
+def decode_cursor(cursor: str, required_fields: tuple = (), datetime_fields: tuple = ("ts",)) -> Dict[str, Any]:
+    """
+    Décode un curseur produit par encode_cursor.
+    Lève une HTTPException 400 si le curseur est invalide, s'il lui manque l'un des
+    champs `required_fields` (par exemple un curseur produit pour un autre tri) ou si
+    l'un de ses champs n'a pas le type attendu (CURSOR_FIELD_TYPES, date ISO 8601 pour `ts`).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload is not an object")
+        missing = [field for field in required_fields if field not in payload]
+        if missing:
+            raise ValueError(f"cursor payload is missing {', '.join(missing)}")
+        for field in datetime_fields:
+            if field in payload:
+                payload[field] = datetime.fromisoformat(payload[field])
+        for field, expected in CURSOR_FIELD_TYPES.items():
+            value = payload.get(field)
+            # bool est une sous-classe de int
+            if field in payload and (isinstance(value, bool) or not isinstance(value, expected)):
+                raise ValueError(f"cursor field {field} has an invalid type")
+        return payload
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Curseur de pagination invalide.")
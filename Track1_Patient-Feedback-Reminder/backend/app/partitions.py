@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import asyncpg
+
+from app.database import close_database_connection_pool, get_database_connection_pool
+
+logger = logging.getLogger(__name__)
+
+# Tables partitionnées par mois (migration 8) et leur clé de partitionnement
+PARTITIONED_TABLES = {
+    "feedbacks": "timestamp",
+    "ai_analysis": "analysis_timestamp",
+}
+
+# Nombre de mois à venir dont les partitions existent toujours à l'avance
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+# Mois conservés en ligne ; au-delà, les partitions sont exportées puis supprimées (0 = jamais)
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))
+PARTITION_ARCHIVE_DIR = os.getenv("PARTITION_ARCHIVE_DIR", "archives")
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "86400"))
+
+# Verrou consultatif de session : un seul processus uvicorn fait la maintenance à la fois
+PARTITION_MAINTENANCE_LOCK_KEY = 7_300_120
+
+_PARTITION_NAME = re.compile(r"^(?P<parent>[a-z_]+)_p(?P<year>\d{4})(?P<month>\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """Premier jour du mois situé `months` mois après (ou avant) celui de `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+async def ensure_future_partitions(conn, months_ahead: int = PARTITION_PREMAKE_MONTHS) -> List[str]:
+    """
+    Crée les partitions manquantes du mois courant et des `months_ahead` mois suivants.
+    Retourne les noms des partitions créées.
+    """
+    current_month = date.today().replace(day=1)
+    created = []
+    for table in PARTITIONED_TABLES:
+        for offset in range(months_ahead + 1):
+            month = add_months(current_month, offset)
+            try:
+                name = await conn.fetchval("SELECT create_monthly_partition($1, $2);", table, month)
+            except asyncpg.exceptions.DuplicateTableError:
+                # Créée au même moment par un autre processus
+                continue
+            if name is not None:
+                created.append(name)
+                logger.info(f"Partition {name} créée.")
+    return created
+
+
+async def list_monthly_partitions(conn, table: str) -> List[Tuple[str, date]]:
+    """
+    Partitions mensuelles attachées à `table` (hors partition par défaut), avec leur mois,
+    de la plus ancienne à la plus récente.
+    """
+    rows = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = $1::regclass;
+    """, table)
+    partitions = []
+    for row in rows:
+        match = _PARTITION_NAME.match(row["relname"])
+        if match and match.group("parent") == table:
+            partitions.append((row["relname"], date(int(match.group("year")), int(match.group("month")), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def archive_partition(conn, table: str, partition: str, export_dir: Path) -> Path:
+    """
+    Exporte une partition en CSV dans `export_dir`, puis la détache et la supprime.
+    L'export a lieu avant le détachement pour ne pas bloquer la table parente pendant
+    l'écriture du fichier ; le nombre de lignes est revérifié sous verrou avant la suppression.
+
+    La suppression d'une partition ne déclenche pas trg_feedbacks_delete : pour une partition de
+    feedbacks, les analyses (partitionnées par analysis_timestamp, donc ailleurs) et les jobs de
+    ses feedbacks sont exportés puis supprimés dans la même transaction que le détachement.
+    """
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f"{partition}.csv"
+    partial_path = path.with_suffix(".csv.partial")
+    status = await conn.copy_from_table(partition, output=str(partial_path), format="csv", header=True)
+    exported_rows = int(status.split()[-1])
+    partial_path.replace(path)
+
+    async with conn.transaction():
+        # SHARE : bloque les écritures dans la partition jusqu'à sa suppression
+        await conn.execute(f"LOCK TABLE {_quote(partition)} IN SHARE MODE;")
+        current_rows = await conn.fetchval(f"SELECT COUNT(*) FROM {_quote(partition)};")
+        if current_rows != exported_rows:
+            raise RuntimeError(
+                f"La partition {partition} a changé pendant l'export ({exported_rows} lignes exportées, "
+                f"{current_rows} présentes) : archivage annulé."
+            )
+        feedback_ids = None
+        if table == "feedbacks":
+            feedback_ids = await conn.fetchval(f"SELECT COALESCE(array_agg(id), '{{}}') FROM {_quote(partition)};")
+            analyses_path = export_dir / f"{partition}_ai_analysis.csv"
+            await conn.copy_from_query(
+                "SELECT * FROM ai_analysis WHERE feedback_id = ANY($1::int[]) ORDER BY id",
+                feedback_ids, output=str(analyses_path.with_suffix(".csv.partial")), format="csv", header=True
+            )
+        await conn.execute(f"ALTER TABLE {_quote(table)} DETACH PARTITION {_quote(partition)};")
+        await conn.execute(f"DROP TABLE {_quote(partition)};")
+        if feedback_ids:
+            # Après la suppression : les feedbacks ne sont plus visibles, le trigger de
+            # insights_daily_summary ignore donc ces analyses et les agrégats sont conservés.
+            await conn.execute("DELETE FROM ai_analysis WHERE feedback_id = ANY($1::int[]);", feedback_ids)
+            await conn.execute("DELETE FROM analysis_jobs WHERE feedback_id = ANY($1::int[]);", feedback_ids)
+        # Une partition supprimée ne déclenche aucun trigger : les réponses en cache qui lisent
+        # cette table sont invalidées explicitement (envoyé au commit, comme les triggers)
+        await conn.execute("SELECT pg_notify('table_changes', $1);", table)
+    if table == "feedbacks":
+        analyses_path.with_suffix(".csv.partial").replace(analyses_path)
+    logger.info(f"Partition {partition} archivée dans {path} ({exported_rows} lignes) puis supprimée.")
+    return path
+
+
+async def archive_expired_partitions(
+    conn,
+    retention_months: int = PARTITION_RETENTION_MONTHS,
+    export_dir: str = PARTITION_ARCHIVE_DIR,
+) -> List[Path]:
+    """
+    Archive les partitions entièrement antérieures aux `retention_months` derniers mois
+    (mois courant compris). Les agrégats de insights_daily_summary sont conservés : la
+    suppression d'une partition ne déclenche pas les triggers de suppression.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(date.today().replace(day=1), -(retention_months - 1))
+    archived = []
+    for table in PARTITIONED_TABLES:
+        for partition, month in await list_monthly_partitions(conn, table):
+            if month < cutoff:
+                archived.append(await archive_partition(conn, table, partition, Path(export_dir)))
+    return archived
+
+
+async def run_partition_maintenance(pool, retention_months: int = PARTITION_RETENTION_MONTHS) -> bool:
+    """
+    Crée les partitions à venir et archive les partitions expirées. Retourne False si un
+    autre processus détient déjà le verrou de maintenance.
+    """
+    async with pool.acquire() as conn:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1);", PARTITION_MAINTENANCE_LOCK_KEY):
+            return False
+        try:
+            await ensure_future_partitions(conn)
+            await archive_expired_partitions(conn, retention_months)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1);", PARTITION_MAINTENANCE_LOCK_KEY)
+    return True
+
+
+async def _maintenance_loop():
+    pool = await get_database_connection_pool()
+    while True:
+        try:
+            await run_partition_maintenance(pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Erreur lors de la maintenance des partitions.")
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+
+_maintenance_task: Optional[asyncio.Task] = None
+
+
+def start_partition_maintenance():
+    """
+    Lance la maintenance périodique des partitions (PARTITION_MAINTENANCE_INTERVAL=0 pour la
+    désactiver dans ce processus, par exemple si elle est planifiée via la CLI).
+    """
+    global _maintenance_task
+    if _maintenance_task is None and PARTITION_MAINTENANCE_INTERVAL > 0:
+        _maintenance_task = asyncio.create_task(_maintenance_loop(), name="partition-maintenance")
+
+
+async def stop_partition_maintenance():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        await asyncio.gather(_maintenance_task, return_exceptions=True)
+        _maintenance_task = None
+
+
+# --- Point d'entrée CLI : python -m app.partitions ---
+
+async def _main(args):
+    pool = await get_database_connection_pool()
+    try:
+        async with pool.acquire() as conn:
+            if args.command == "ensure":
+                created = await ensure_future_partitions(conn, args.months_ahead)
+                print(f"{len(created)} partition(s) créée(s).")
+            elif args.command == "archive":
+                archived = await archive_expired_partitions(conn, args.retention_months, args.export_dir)
+                print(f"{len(archived)} partition(s) archivée(s).")
+            for table in PARTITIONED_TABLES:
+                partitions = await list_monthly_partitions(conn, table)
+                default_rows = await conn.fetchval(f"SELECT COUNT(*) FROM {_quote(table + '_default')};")
+                span = f"{partitions[0][1]:%Y-%m} → {partitions[-1][1]:%Y-%m}" if partitions else "aucune"
+                print(f"  {table} : {len(partitions)} partition(s) mensuelle(s) ({span}), "
+                      f"{default_rows} ligne(s) dans la partition par défaut")
+    finally:
+        await close_database_connection_pool(pool)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintenance des partitions mensuelles de feedbacks et ai_analysis.")
+    subparsers = parser.add_subparsers(dest="command")
+    ensure_parser = subparsers.add_parser("ensure", help="Crée les partitions des mois à venir.")
+    ensure_parser.add_argument("--months-ahead", type=int, default=PARTITION_PREMAKE_MONTHS)
+    archive_parser = subparsers.add_parser("archive", help="Exporte en CSV puis supprime les partitions expirées.")
+    archive_parser.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS or 24)
+    archive_parser.add_argument("--export-dir", default=PARTITION_ARCHIVE_DIR)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,397 @@
+import abc
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from app.database import close_database_connection_pool, get_database_connection_pool
+from app.resilience import jittered_backoff
+
+logger = logging.getLogger(__name__)
+
+# Désactivé par défaut : l'envoi de messages aux patients doit être activé explicitement
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() == "true"
+REMINDER_DISPATCH_INTERVAL = float(os.getenv("REMINDER_DISPATCH_INTERVAL", "60"))
+# Un rappel est préparé pour les demandes approuvées dont la date tombe dans les N jours
+REMINDER_LEAD_DAYS = int(os.getenv("REMINDER_LEAD_DAYS", "1"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+REMINDER_SEND_CONCURRENCY = int(os.getenv("REMINDER_SEND_CONCURRENCY", "4"))
+# Débit maximum d'envoi par processus (0 = illimité)
+REMINDER_RATE_PER_SECOND = float(os.getenv("REMINDER_RATE_PER_SECOND", "5"))
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+REMINDER_RETRY_BASE_DELAY = float(os.getenv("REMINDER_RETRY_BASE_DELAY", "30"))
+REMINDER_RETRY_MAX_DELAY = float(os.getenv("REMINDER_RETRY_MAX_DELAY", "3600"))
+# Un message resté 'sending' au-delà de ce délai (processus arrêté pendant l'envoi) est repris.
+# Doit dépasser le temps d'envoi d'un lot : REMINDER_BATCH_SIZE / REMINDER_RATE_PER_SECOND.
+REMINDER_DELIVERY_LEASE_SECONDS = float(os.getenv("REMINDER_DELIVERY_LEASE_SECONDS", "300"))
+# Seul le brouillon de message d'une analyse récente du patient est repris
+REMINDER_DRAFT_MAX_AGE_DAYS = int(os.getenv("REMINDER_DRAFT_MAX_AGE_DAYS", "90"))
+REMINDER_SENT_BY = os.getenv("REMINDER_SENT_BY", "Rappels automatiques")
+REMINDER_TEMPLATE = os.getenv(
+    "REMINDER_TEMPLATE",
+    "Bonjour, nous vous rappelons votre rendez-vous du {requested_date:%d/%m/%Y} ({request_object}). "
+    "En cas d'empêchement, merci de nous contacter. L'équipe soignante."
+)
+REMINDER_WEBHOOK_URL = os.getenv("REMINDER_WEBHOOK_URL")
+REMINDER_WEBHOOK_TIMEOUT = float(os.getenv("REMINDER_WEBHOOK_TIMEOUT", "10"))
+
+
+class ReminderMessage(NamedTuple):
+    id: int
+    recall_request_id: int
+    patient_id: str
+    message_content: str
+    attempts: int
+
+
+class PermanentDeliveryError(Exception):
+    """
+    Échec d'envoi qu'un nouvel essai ne corrigera pas (destinataire refusé, requête invalide) :
+    le message passe directement en 'failed'.
+    """
+
+
+class ReminderSender(abc.ABC):
+    """
+    Canal d'envoi des rappels. `send` lève une exception en cas d'échec (PermanentDeliveryError
+    pour un échec définitif, toute autre exception est réessayée). L'id du message peut servir
+    de clé d'idempotence : un envoi interrompu avant son acquittement est refait.
+    """
+
+    @abc.abstractmethod
+    async def send(self, message: ReminderMessage):
+        ...
+
+    async def close(self):
+        pass
+
+
+class LoggingReminderSender(ReminderSender):
+    """
+    Journalise le message sans l'envoyer (développement). Jamais utilisé par défaut : les rappels
+    seraient marqués 'sent' sans avoir été envoyés. À installer via set_reminder_sender.
+    """
+
+    async def send(self, message: ReminderMessage):
+        logger.info(f"Rappel {message.id} pour le patient {message.patient_id} : {message.message_content}")
+
+
+class WebhookReminderSender(ReminderSender):
+    """
+    Transmet chaque rappel en JSON à une passerelle SMS/e-mail (REMINDER_WEBHOOK_URL),
+    avec l'en-tête Idempotency-Key.
+    """
+
+    def __init__(self, url: str, timeout: float = REMINDER_WEBHOOK_TIMEOUT):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, message: ReminderMessage):
+        response = await self._client.post(
+            self.url,
+            json={
+                "id": message.id,
+                "recall_request_id": message.recall_request_id,
+                "patient_id": message.patient_id,
+                "message": message.message_content,
+            },
+            headers={"Idempotency-Key": f"reminder-{message.id}"},
+        )
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise PermanentDeliveryError(f"HTTP {response.status_code} : {response.text[:200]}")
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class AsyncRateLimiter:
+    """
+    Espace les envois d'au moins 1/rate seconde dans ce processus (0 = pas de limite).
+    """
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_sender: Optional[ReminderSender] = None
+
+
+def set_reminder_sender(sender: ReminderSender):
+    """
+    Remplace le canal d'envoi (à appeler avant start_reminder_dispatcher).
+    """
+    global _sender
+    _sender = sender
+
+
+def reminder_sender_configured() -> bool:
+    return _sender is not None or bool(REMINDER_WEBHOOK_URL)
+
+
+def get_reminder_sender() -> ReminderSender:
+    """
+    Canal d'envoi installé par set_reminder_sender, sinon le webhook REMINDER_WEBHOOK_URL.
+    Lève RuntimeError si aucun canal n'est configuré.
+    """
+    global _sender
+    if _sender is None:
+        if not REMINDER_WEBHOOK_URL:
+            raise RuntimeError("Aucun canal d'envoi des rappels : définir REMINDER_WEBHOOK_URL ou appeler set_reminder_sender.")
+        _sender = WebhookReminderSender(REMINDER_WEBHOOK_URL)
+    return _sender
+
+
+def render_reminder(request_object: str, requested_date: date, draft: Optional[str]) -> str:
+    """
+    Texte du rappel : le brouillon de message de la dernière analyse du patient s'il existe,
+    suivi du rappel de rendez-vous rendu depuis REMINDER_TEMPLATE.
+    """
+    reminder = REMINDER_TEMPLATE.format(request_object=request_object, requested_date=requested_date)
+    if draft and draft.strip():
+        return f"{draft.strip()}\n\n{reminder}"
+    return reminder
+
+
+async def enqueue_due_reminders(conn, lead_days: int = REMINDER_LEAD_DAYS, batch_size: int = REMINDER_BATCH_SIZE) -> int:
+    """
+    Crée, en une insertion groupée, les rappels des demandes approuvées arrivant à échéance
+    qui n'en ont pas encore. L'index unique uq_personalized_messages_recall_reminder rend
+    l'opération idempotente entre processus et redémarrages. Retourne le nombre de rappels créés.
+    """
+    due_rows = await conn.fetch("""
+        SELECT r.id, r.patient_id, r.request_object, r.requested_date,
+               d.analysis_id, d.feedback_id, d.draft
+        FROM recall_requests r
+        LEFT JOIN LATERAL (
+            SELECT a.id AS analysis_id, a.feedback_id, a.analysis ->> 'personalized_message_draft' AS draft
+            FROM feedbacks f
+            JOIN ai_analysis a ON a.feedback_id = f.id
+            WHERE f.patient_id = r.patient_id
+              AND f.timestamp >= CURRENT_TIMESTAMP - make_interval(days => $3)
+              AND COALESCE(a.analysis ->> 'personalized_message_draft', '') <> ''
+            ORDER BY f.timestamp DESC, a.analysis_timestamp DESC
+            LIMIT 1
+        ) d ON TRUE
+        WHERE r.status = 'approved'
+          AND r.requested_date BETWEEN CURRENT_DATE AND CURRENT_DATE + $1::INTEGER
+          AND NOT EXISTS (
+              SELECT 1 FROM personalized_messages m
+              WHERE m.recall_request_id = r.id AND m.kind = 'recall_reminder'
+          )
+        ORDER BY r.requested_date, r.id
+        LIMIT $2;
+    """, lead_days, batch_size, REMINDER_DRAFT_MAX_AGE_DAYS)
+    if not due_rows:
+        return 0
+
+    details: List[Dict[str, Any]] = [
+        {
+            "source": "analysis_draft" if row["draft"] else "template",
+            "analysis_id": row["analysis_id"],
+            "feedback_id": row["feedback_id"],
+            "requested_date": row["requested_date"].isoformat(),
+        }
+        for row in due_rows
+    ]
+    inserted = await conn.fetch("""
+        INSERT INTO personalized_messages (
+            recall_request_id, patient_id, message_content, sent_by, ai_message_analysis,
+            kind, delivery_status, delivery_run_after
+        )
+        SELECT m.recall_request_id, m.patient_id, m.message_content, $4, m.details,
+               'recall_reminder', 'queued', CURRENT_TIMESTAMP
+        FROM unnest($1::int[], $2::text[], $3::text[], $5::jsonb[])
+            AS m(recall_request_id, patient_id, message_content, details)
+        ON CONFLICT (recall_request_id) WHERE kind = 'recall_reminder' DO NOTHING
+        RETURNING id;
+    """,
+        [row["id"] for row in due_rows],
+        [row["patient_id"] for row in due_rows],
+        [render_reminder(row["request_object"], row["requested_date"], row["draft"]) for row in due_rows],
+        REMINDER_SENT_BY,
+        details,
+    )
+    return len(inserted)
+
+
+async def _claim_reminders(conn, batch_size: int) -> List[ReminderMessage]:
+    """
+    Réserve un lot de rappels à envoyer (FOR UPDATE SKIP LOCKED, comme la file analysis_jobs) :
+    plusieurs processus peuvent envoyer en parallèle sans jamais traiter le même message.
+    """
+    rows = await conn.fetch("""
+        UPDATE personalized_messages
+        SET delivery_status = 'sending',
+            delivery_attempts = delivery_attempts + 1,
+            delivery_run_after = CURRENT_TIMESTAMP + make_interval(secs => $1)
+        WHERE id IN (
+            SELECT id FROM personalized_messages
+            WHERE delivery_status IN ('queued', 'sending') AND delivery_run_after <= CURRENT_TIMESTAMP
+            ORDER BY delivery_run_after, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT $2
+        )
+        RETURNING id, recall_request_id, patient_id, message_content, delivery_attempts;
+    """, REMINDER_DELIVERY_LEASE_SECONDS, batch_size)
+    return [ReminderMessage(*row.values()) for row in rows]
+
+
+async def _record_outcomes(conn, outcomes: List[tuple]):
+    """
+    Enregistre en une instruction le résultat de chaque envoi du lot :
+    (id, statut 'sent' | 'queued' | 'failed', erreur, délai avant nouvel essai).
+    """
+    await conn.execute("""
+        UPDATE personalized_messages m
+        SET delivery_status = o.status,
+            delivered_at = CASE WHEN o.status = 'sent' THEN CURRENT_TIMESTAMP END,
+            last_delivery_error = o.error,
+            delivery_run_after = CASE WHEN o.status = 'queued'
+                                      THEN CURRENT_TIMESTAMP + make_interval(secs => o.delay) END
+        FROM unnest($1::int[], $2::text[], $3::text[], $4::float8[]) AS o(id, status, error, delay)
+        WHERE m.id = o.id;
+    """,
+        [outcome[0] for outcome in outcomes],
+        [outcome[1] for outcome in outcomes],
+        [outcome[2] for outcome in outcomes],
+        [outcome[3] for outcome in outcomes],
+    )
+
+
+async def _deliver(sender: ReminderSender, message: ReminderMessage, semaphore: asyncio.Semaphore,
+                   rate_limiter: AsyncRateLimiter) -> tuple:
+    async with semaphore:
+        await rate_limiter.wait()
+        try:
+            await sender.send(message)
+            return (message.id, "sent", None, 0.0)
+        except PermanentDeliveryError as e:
+            logger.error(f"Rappel {message.id} en échec définitif : {e}")
+            return (message.id, "failed", str(e)[:1000], 0.0)
+        except Exception as e:
+            if message.attempts >= REMINDER_MAX_ATTEMPTS:
+                logger.error(f"Rappel {message.id} en échec après {message.attempts} tentatives : {e}")
+                return (message.id, "failed", str(e)[:1000], 0.0)
+            delay = REMINDER_RETRY_BASE_DELAY + jittered_backoff(message.attempts, REMINDER_RETRY_BASE_DELAY, REMINDER_RETRY_MAX_DELAY)
+            logger.warning(f"Rappel {message.id} replanifié dans {delay:.0f}s : {e}")
+            return (message.id, "queued", str(e)[:1000], delay)
+
+
+async def dispatch_reminders(pool, sender: Optional[ReminderSender] = None) -> Dict[str, int]:
+    """
+    Une passe du répartiteur : création des rappels à échéance, puis envoi par lots de
+    REMINDER_BATCH_SIZE, au plus REMINDER_SEND_CONCURRENCY envois simultanés et
+    REMINDER_RATE_PER_SECOND envois par seconde. Retourne les compteurs de la passe.
+    """
+    sender = sender or get_reminder_sender()
+    counts = {"queued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+    while True:
+        async with pool.acquire() as conn:
+            created = await enqueue_due_reminders(conn)
+        counts["queued"] += created
+        if created < REMINDER_BATCH_SIZE:
+            break
+
+    semaphore = asyncio.Semaphore(REMINDER_SEND_CONCURRENCY)
+    rate_limiter = AsyncRateLimiter(REMINDER_RATE_PER_SECOND)
+    while True:
+        async with pool.acquire() as conn:
+            messages = await _claim_reminders(conn, REMINDER_BATCH_SIZE)
+        if not messages:
+            break
+        # Aucune connexion n'est gardée pendant les envois
+        outcomes = await asyncio.gather(*(_deliver(sender, message, semaphore, rate_limiter) for message in messages))
+        async with pool.acquire() as conn:
+            await _record_outcomes(conn, outcomes)
+        for outcome in outcomes:
+            counts["retried" if outcome[1] == "queued" else outcome[1]] += 1
+        if len(messages) < REMINDER_BATCH_SIZE:
+            break
+
+    if any(counts.values()):
+        logger.info(f"Rappels : {counts['queued']} préparés, {counts['sent']} envoyés, "
+                    f"{counts['retried']} replanifiés, {counts['failed']} en échec.")
+    return counts
+
+
+async def _dispatcher_loop():
+    pool = await get_database_connection_pool()
+    while True:
+        try:
+            await dispatch_reminders(pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Erreur dans le répartiteur de rappels.")
+        await asyncio.sleep(REMINDER_DISPATCH_INTERVAL)
+
+
+_dispatcher_task: Optional[asyncio.Task] = None
+
+
+def start_reminder_dispatcher():
+    """
+    Lance le répartiteur de rappels dans ce processus si REMINDERS_ENABLED=true.
+    Plusieurs processus peuvent le faire tourner en même temps. Sans canal d'envoi configuré,
+    le répartiteur n'est pas démarré : aucun rappel n'est marqué 'sent' sans avoir été envoyé.
+    """
+    global _dispatcher_task
+    if _dispatcher_task is None and REMINDERS_ENABLED:
+        if not reminder_sender_configured():
+            logger.error("REMINDERS_ENABLED=true mais REMINDER_WEBHOOK_URL n'est pas défini : répartiteur de rappels non démarré.")
+            return
+        _dispatcher_task = asyncio.create_task(_dispatcher_loop(), name="reminder-dispatcher")
+        logger.info("Répartiteur de rappels démarré.")
+
+
+async def stop_reminder_dispatcher():
+    """
+    Arrête le répartiteur. Un lot interrompu pendant l'envoi reste 'sending' et sera repris
+    à l'expiration de REMINDER_DELIVERY_LEASE_SECONDS.
+    """
+    global _dispatcher_task, _sender
+    if _dispatcher_task is not None:
+        _dispatcher_task.cancel()
+        await asyncio.gather(_dispatcher_task, return_exceptions=True)
+        _dispatcher_task = None
+    if _sender is not None:
+        await _sender.close()
+        _sender = None
+
+
+# --- Point d'entrée CLI : python -m app.reminders ---
+
+async def _main(args):
+    sender = get_reminder_sender()
+    pool = await get_database_connection_pool()
+    try:
+        counts = await dispatch_reminders(pool, sender)
+        print(f"Rappels : {counts}")
+    finally:
+        await sender.close()
+        await close_database_connection_pool(pool)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Exécute une passe du répartiteur de rappels (création et envoi).")
+    asyncio.run(_main(parser.parse_args()))
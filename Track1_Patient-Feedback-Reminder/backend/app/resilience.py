@@ -0,0 +1,91 @@
+import random
+import time
+from typing import Optional
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états autour d'une dépendance externe :
+
+    - 'closed' : les appels passent ; `failure_threshold` échecs consécutifs ouvrent le circuit ;
+    - 'open' : les appels sont refusés immédiatement pendant `reset_timeout` secondes ;
+    - 'half_open' : un seul appel d'essai à la fois ; un succès referme le circuit,
+      un échec le rouvre pour une nouvelle période.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """
+        Libère l'appel d'essai sans verdict (erreur non imputable à la dépendance, ex. 4xx).
+        """
+        self._probe_in_flight = False
+
+
+class RetryBudget:
+    """
+    Budget de nouvelles tentatives : chaque appel initial crédite `ratio` jeton,
+    chaque nouvelle tentative en consomme un. Les retries restent ainsi limités à environ
+    `ratio` × le trafic normal et ne peuvent pas multiplier la charge d'un service déjà saturé.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0, initial_tokens: Optional[float] = None):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens if initial_tokens is None else initial_tokens
+
+    def record_request(self):
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_acquire_retry(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+def jittered_backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Délai avant la tentative `attempt` (1 pour le premier retry), en « full jitter » :
+    valeur aléatoire entre 0 et base_delay × 2^(attempt-1), plafonnée à max_delay.
+    Évite que tous les clients relancent au même instant.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
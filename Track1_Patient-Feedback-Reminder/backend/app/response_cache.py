@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.notifications import notification_listener
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+# Canal NOTIFY alimenté par les triggers trg_notify_table_change (migration 4) ;
+# la charge utile est le nom de la table modifiée.
+TABLE_CHANGES_CHANNEL = "table_changes"
+
+
+class ResponseCache:
+    """
+    Cache en mémoire des réponses JSON des routes de liste, propre à chaque processus.
+
+    Chaque table a un compteur de génération, incrémenté à chaque notification de
+    modification. Une entrée mémorise les générations des tables lues au moment où elle
+    a été calculée : elle devient périmée dès qu'une de ces tables change.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, ...], str, bytes]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # Faux tant que l'écouteur LISTEN n'est pas connecté : sans notifications,
+        # le cache ne peut pas savoir quand invalider, il est donc contourné.
+        self.active = False
+        self.hits = 0
+        self.misses = 0
+
+    def generations(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(table, 0) for table in tables)
+
+    def get(self, key: str, tables: Tuple[str, ...]) -> Optional[Tuple[str, bytes]]:
+        if not self.active:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != self.generations(tables):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key: str, generations: Tuple[int, ...], etag: str, body: bytes):
+        if not self.active:
+            return
+        self._entries[key] = (generations, etag, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, table: str):
+        self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def _make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_json_response(
+    request: Request,
+    tables: Tuple[str, ...],
+    build: Callable[[], Awaitable[Any]],
+) -> Response:
+    """
+    Sert une réponse JSON depuis le cache si elle est encore valide, sinon appelle `build`
+    (qui interroge la base) et mémorise le résultat. Gère l'en-tête If-None-Match : un client
+    qui renvoie l'ETag reçu obtient un 304 sans corps.
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    cached = response_cache.get(key, tables) if RESPONSE_CACHE_ENABLED else None
+    if cached is not None:
+        etag, body = cached
+    else:
+        # Générations relevées AVANT la requête : une écriture concurrente rend l'entrée
+        # immédiatement périmée plutôt que de masquer la modification.
+        generations = response_cache.generations(tables)
+        payload = await build()
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = _make_etag(body)
+        if RESPONSE_CACHE_ENABLED:
+            response_cache.put(key, generations, etag, body)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _on_table_change(table: str):
+    response_cache.invalidate(table)
+
+
+def _on_listener_state(connected: bool):
+    if connected:
+        # Des notifications ont pu être manquées pendant la déconnexion
+        response_cache.clear()
+        logger.info("Cache de réponses actif (LISTEN %s).", TABLE_CHANGES_CHANNEL)
+    else:
+        logger.warning("Connexion LISTEN perdue : cache de réponses contourné.")
+    response_cache.active = connected
+
+
+def start_response_cache():
+    """
+    Abonne le cache au canal d'invalidation de la connexion LISTEN partagée
+    (RESPONSE_CACHE_ENABLED=false pour désactiver le cache). La connexion elle-même
+    est démarrée par main.py via notification_listener.start().
+    """
+    if RESPONSE_CACHE_ENABLED:
+        notification_listener.subscribe(TABLE_CHANGES_CHANNEL, _on_table_change)
+        notification_listener.on_state_change(_on_listener_state)
@@ -1,11 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 import app.models
-from app.database import get_connection
+from app.database import acquire_connection, get_connection, get_read_connection
+from app.ai_service import call_ai_analysis_service, save_ai_analysis
+from app.jobs import ANALYSIS_JOB_COLUMNS, enqueue_analysis_job, wake_analysis_workers
+from app.backlog import BACKLOG_BATCH_SIZE, BACKLOG_CONCURRENCY, get_backlog_progress, start_backlog_run
+from app.export import EXPORT_DATASETS, EXPORT_MEDIA_TYPES, stream_export
+from app.response_cache import cached_json_response
+from app.insights_stream import MIN_URGENCY_FLOOR, broadcaster, stream_available, urgent_analysis_events
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor
 import asyncpg
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+from datetime import date, datetime
 import json
-import httpx
 import os
 
 logging.basicConfig(level=logging.INFO)
@@ -13,96 +22,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-AI_API_URL = os.getenv("AI_API_URL")
-if not AI_API_URL:
-    logger.error("AI_API_URL environment variable not set. AI analysis will not function.")
-
-async def call_ai_analysis_service(
-    feedback_text: str,
-    patient_id: Optional[str] = None,
-    patient_age: Optional[float] = None,
-    patient_gender: Optional[str] = None,
-    department: Optional[str] = None,
-    wait_time_min: Optional[float] = None,
-    resolution_time_min: Optional[float] = None,
-    rating: Optional[float] = None
-) -> Dict[str, Any]:
-    """
-    Appelle le service AI externe pour obtenir l'analyse de sentiment, les recommandations,
-    et d'autres analyses détaillées pour un texte de feedback donné,
-    en envoyant un payload plat comme spécifié.
-    Parse la réponse pour l'adapter à la structure de notre modèle interne AnalysisIn.
-    """
-    if not AI_API_URL:
-        logger.error("AI_API_URL is not set, cannot call external AI service.")
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                            detail="Service AI externe non configuré.")
-
-    try:
-        async with httpx.AsyncClient() as client:
-            ai_request_body = {
-                "feedback_text": feedback_text,
-                "patient_id": patient_id,
-                "patient_age": patient_age,
-                "patient_gender": patient_gender,
-                "department": department,
-                "wait_time_min": wait_time_min,
-                "resolution_time_min": resolution_time_min,
-                "rating": rating
-            }
-            ai_request_body = {k: v for k, v in ai_request_body.items() if v is not None}
-
-            response = await client.post(AI_API_URL, json=ai_request_body, timeout=30.0)
-            response.raise_for_status()
-            raw_ai_result = response.json()
-
-            validated_overall_response = app.models.ExternalAIOverallResponse(**raw_ai_result)
-            ai_response_content = validated_overall_response.data 
-
-            analysis_data_for_db = app.models.AnalysisDataIn(
-                primary_sentiment=ai_response_content.ai_analysis.primary_sentiment,
-                confidence_score=ai_response_content.ai_analysis.confidence_score,
-                actionable_insights=ai_response_content.ai_analysis.actionable_insights,
-                keywords=ai_response_content.ai_analysis.key_themes,
-                personalized_message_draft=ai_response_content.ai_analysis.personalized_message_draft,
-                contextual_factors=ai_response_content.ai_analysis.contextual_factors,
-                department_specific_insights=ai_response_content.ai_analysis.department_specific_insights,
-                emotional_intensity=ai_response_content.ai_analysis.emotional_intensity,
-                key_themes=ai_response_content.ai_analysis.key_themes,
-                patient_behavior_analysis=ai_response_content.ai_analysis.patient_behavior_analysis,
-                sentiment_explanation=ai_response_content.ai_analysis.sentiment_explanation,
-                urgency_level=ai_response_content.ai_analysis.urgency_level,
-                contextual_data=ai_response_content.contextual_data,
-                risk_factors=ai_response_content.risk_factors,
-                sticker_analysis=ai_response_content.sticker_analysis
-            )
-
-            recommendations_for_db = ai_response_content.recommendations
-
-            return {
-                "analysis": analysis_data_for_db.model_dump(mode='json'),
-                "recommendations": recommendations_for_db
-            }
-
-    except httpx.RequestError as e:
-        logger.error(f"Erreur de connexion au service AI externe: {e}")
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                            detail=f"Impossible de se connecter au service AI externe: {e}")
-    except httpx.HTTPStatusError as e:
-        logger.error(f"Erreur du service AI externe (statut {e.response.status_code}): {e.response.text}")
-        logger.error(f"Réponse complète de l'erreur du service AI: {e.response.text}")
-        raise HTTPException(status_code=e.response.status_code,
-                            detail=f"Erreur du service AI externe: {e.response.text[:200]}...")
-    except json.JSONDecodeError:
-        logger.error("Réponse invalide (non-JSON) du service AI externe.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,
-                            detail="Réponse invalide du service AI externe.")
-    except Exception as e:
-        logger.exception("Erreur inattendue lors de l'appel au service AI externe ou de l'analyse de sa réponse.")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail=f"Erreur inattendue lors de l'intégration AI: {e}")
-
-
 # --- Route POST /feedback ---
 @router.post("/feedback", status_code=status.HTTP_201_CREATED, response_model=app.models.FeedbackOut)
 async def create_feedback(
@@ -160,14 +79,16 @@ async def create_feedback(
         )
 
 # --- NOUVELLE ROUTE: POST /feedback_and_analyze ---
-@router.post("/feedback_and_analyze", status_code=status.HTTP_201_CREATED, response_model=app.models.FeedbackAndAnalysisResponse)
+@router.post("/feedback_and_analyze", status_code=status.HTTP_202_ACCEPTED, response_model=app.models.FeedbackAndJobResponse)
 async def create_feedback_and_analyze(
     feedback: app.models.FeedbackIn,
     conn: asyncpg.Connection = Depends(get_connection)
 ):
     """
-    Enregistre un nouveau feedback patient et déclenche immédiatement son analyse IA,
-    retournant le feedback créé et l'analyse IA.
+    Enregistre un nouveau feedback patient et met son analyse IA en file d'attente.
+    La transaction est validée immédiatement : l'appel au service AI est fait par les workers
+    de app/jobs.py, sans bloquer de connexion du pool. Le résultat se consulte via
+    GET /analysis-jobs/{job_id}.
     """
     try:
         async with conn.transaction():
@@ -194,76 +115,22 @@ async def create_feedback_and_analyze(
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                     detail="Échec de l'insertion du feedback.")
 
-            created_feedback = app.models.FeedbackOut(
+            # Mettre l'analyse IA en file dans la même transaction que le feedback
+            job_row = await enqueue_analysis_job(conn, inserted_feedback_row["id"])
+
+        wake_analysis_workers()
+
+        return app.models.FeedbackAndJobResponse(
+            feedback=app.models.FeedbackOut(
                 id=inserted_feedback_row["id"],
                 patient_id=inserted_feedback_row["patient_id"],
                 text=inserted_feedback_row["text"],
                 note=inserted_feedback_row["note"],
                 emoji=inserted_feedback_row["emoji"],
                 timestamp=inserted_feedback_row["timestamp"]
-            )
-
-            # Préparer les données pour l'appel au service AI
-            ai_input_data = {
-                "feedback_text": feedback.text.strip(),
-                "patient_id": feedback.patient_id.strip(),
-                "patient_age": feedback.patient_age,
-                "patient_gender": feedback.patient_gender,
-                "department": feedback.department,
-                "wait_time_min": feedback.wait_time_min,
-                "resolution_time_min": feedback.resolution_time_min,
-                "rating": float(feedback.note) if feedback.note is not None else None
-            }
-
-            # Appele le service AI externe
-            ai_response_data_parsed = await call_ai_analysis_service(**ai_input_data)
-
-            # Convertir en modèle Pydantic AnalysisIn pour validation avant sauvegarde
-            analysis_payload = app.models.AnalysisIn(**ai_response_data_parsed)
-
-            # add l'analyse et les recommandations dans la table ai_analysis
-            insert_analysis_query = """
-                INSERT INTO ai_analysis (feedback_id, analysis, recommendations)
-                VALUES ($1, $2::jsonb, $3::jsonb)
-                RETURNING id, feedback_id, analysis, recommendations, analysis_timestamp;
-            """
-            inserted_analysis_row = await conn.fetchrow(
-                insert_analysis_query,
-                created_feedback.id,
-                json.dumps(analysis_payload.analysis.model_dump(mode='json')),
-                json.dumps(analysis_payload.recommendations) if analysis_payload.recommendations is not None else '[]'
-            )
-
-            if inserted_analysis_row is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                                    detail="Échec de l'enregistrement de l'analyse IA.")
-
-            # Préparer les données d'analyse pour le modèle de sortie
-            analysis_data_raw = inserted_analysis_row["analysis"]
-            if isinstance(analysis_data_raw, str):
-                analysis_dict = json.loads(analysis_data_raw)
-            else: # Assume it's already a dict or None
-                analysis_dict = analysis_data_raw or {}
-
-            # Préparer les données de recommandations pour le modèle de sortie
-            recommendations_data_raw = inserted_analysis_row["recommendations"]
-            if isinstance(recommendations_data_raw, str):
-                recommendations_list = json.loads(recommendations_data_raw)
-            else: # Assume it's already a list or None
-                recommendations_list = recommendations_data_raw or []
-
-            created_analysis = app.models.AnalysisOut(
-                feedback_id=inserted_analysis_row["feedback_id"],
-                analysis=app.models.AnalysisDataOut(**analysis_dict),
-                recommendations=recommendations_list,
-                analysis_timestamp=inserted_analysis_row["analysis_timestamp"]
-            )
-
-            # Retourner la réponse combinée
-            return app.models.FeedbackAndAnalysisResponse(
-                feedback=created_feedback,
-                analysis=created_analysis
-            )
+            ),
+            job=app.models.AnalysisJobOut(**job_row)
+        )
 
     except HTTPException as http_err:
         raise http_err
@@ -280,20 +147,106 @@ async def create_feedback_and_analyze(
             detail=f"Erreur inattendue lors du traitement: {e}"
         )
 
+# --- Route GET /analysis-jobs/{job_id} ---
+@router.get("/analysis-jobs/{job_id}", response_model=app.models.AnalysisJobOut)
+async def get_analysis_job(
+    job_id: int,
+    conn: asyncpg.Connection = Depends(get_connection)
+):
+    """
+    Récupère l'état d'un job d'analyse IA et, une fois terminé, l'analyse produite.
+    """
+    try:
+        job_row = await conn.fetchrow(f"SELECT {ANALYSIS_JOB_COLUMNS} FROM analysis_jobs WHERE id = $1;", job_id)
+        if not job_row:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job d'analyse introuvable.")
+
+        analysis_out = None
+        if job_row["status"] == "done":
+            analysis_row = await conn.fetchrow("""
+                SELECT feedback_id, analysis, recommendations, analysis_timestamp
+                FROM ai_analysis
+                WHERE feedback_id = $1;
+            """, job_row["feedback_id"])
+
+            if analysis_row:
+                analysis_out = app.models.AnalysisOut(
+                    feedback_id=analysis_row["feedback_id"],
+                    analysis=app.models.AnalysisDataOut(**(analysis_row["analysis"] or {})),
+                    recommendations=analysis_row["recommendations"] or [],
+                    analysis_timestamp=analysis_row["analysis_timestamp"]
+                )
+
+        return app.models.AnalysisJobOut(**job_row, analysis=analysis_out)
+
+    except HTTPException as http_err:
+        raise http_err
+    except Exception as e:
+        logger.exception(f"Erreur lors de la récupération du job d'analyse ID {job_id}.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur serveur lors de la récupération du job d'analyse: {e}"
+        )
+
 
 # --- Route GET /feedbacks ---
 @router.get("/feedbacks", response_model=List[app.models.FeedbackOut])
 async def get_all_feedbacks(
-    conn: asyncpg.Connection = Depends(get_connection)
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum de feedbacks par page."),
+    cursor: Optional[str] = Query(None, description="Curseur renvoyé dans l'en-tête X-Next-Cursor de la page précédente."),
+    department: Optional[str] = Query(None, description="Filtre sur le département."),
+    note_min: Optional[int] = Query(None, ge=1, le=5, description="Note minimale (incluse)."),
+    note_max: Optional[int] = Query(None, ge=1, le=5, description="Note maximale (incluse)."),
+    date_from: Optional[datetime] = Query(None, description="Début de la fenêtre temporelle (inclus)."),
+    date_to: Optional[datetime] = Query(None, description="Fin de la fenêtre temporelle (exclue)."),
+    conn: asyncpg.Connection = Depends(get_read_connection)
 ):
     """
-    Récupère tous les feedbacks patients enregistrés.
+    Récupère les feedbacks patients, du plus récent au plus ancien, page par page.
+    La pagination se fait par curseur (keyset) sur (timestamp, id) : chaque page coûte
+    le même prix quelle que soit sa profondeur, contrairement à un OFFSET.
+    Le corps reste une liste de feedbacks (format historique) ; le curseur de la page suivante
+    est renvoyé dans les en-têtes X-Next-Cursor et Link (rel="next"), absents sur la dernière page.
     """
     try:
-        rows = await conn.fetch("SELECT id, patient_id, text, note, emoji, timestamp FROM feedbacks ORDER BY timestamp DESC;")
+        conditions = []
+        params: List[Any] = []
+
+        if department:
+            params.append(department.strip())
+            conditions.append(f"department = ${len(params)}")
+        if note_min is not None:
+            params.append(note_min)
+            conditions.append(f"note >= ${len(params)}")
+        if note_max is not None:
+            params.append(note_max)
+            conditions.append(f"note <= ${len(params)}")
+        if date_from is not None:
+            params.append(date_from)
+            conditions.append(f"timestamp >= ${len(params)}")
+        if date_to is not None:
+            params.append(date_to)
+            conditions.append(f"timestamp < ${len(params)}")
+        if cursor:
+            position = decode_cursor(cursor, ("ts", "id"))
+            params.extend([position["ts"], position["id"]])
+            conditions.append(f"(timestamp, id) < (${len(params) - 1}, ${len(params)})")
+
+        query = "SELECT id, patient_id, text, note, emoji, timestamp FROM feedbacks"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Une ligne de plus que demandé pour savoir s'il existe une page suivante
+        params.append(limit + 1)
+        query += f" ORDER BY timestamp DESC, id DESC LIMIT ${len(params)};"
+
+        rows = await conn.fetch(query, *params)
 
-        if not rows:
-            return []
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor({"ts": rows[-1]["timestamp"], "id": rows[-1]["id"]})
 
         feedbacks = [
             app.models.FeedbackOut(
@@ -306,8 +259,14 @@ async def get_all_feedbacks(
             )
             for row in rows
         ]
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+            next_url = request.url.include_query_params(cursor=next_cursor)
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
         return feedbacks
 
+    except HTTPException as http_err:
+        raise http_err
     except Exception as e:
         logger.exception("Erreur lors de la récupération des feedbacks.")
         raise HTTPException(
@@ -315,6 +274,269 @@ async def get_all_feedbacks(
             detail=f"Erreur serveur lors de la récupération des feedbacks: {e}"
         )
 
+# --- Route GET /feedbacks/search ---
+# Langue de recherche -> (colonne tsvector générée, configuration PostgreSQL)
+FEEDBACK_SEARCH_CONFIGS = {
+    "fr": ("text_search_fr", "french"),
+    "en": ("text_search_en", "english"),
+}
+FEEDBACK_SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=8, MaxFragments=2"
+
+@router.get("/feedbacks/search", response_model=app.models.FeedbackSearchPageOut)
+async def search_feedbacks(
+    q: str = Query(..., min_length=1, max_length=500, description="Recherche (syntaxe web : \"mots exacts\", OR, -exclu)."),
+    lang: str = Query("fr", description="Configuration linguistique : 'fr' ou 'en'."),
+    sort: str = Query("rank", description="Tri : 'rank' (pertinence) ou 'recent' (plus récents d'abord)."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum de résultats par page."),
+    cursor: Optional[str] = Query(None, description="Curseur `next_cursor` renvoyé par la page précédente."),
+    department: Optional[str] = Query(None, description="Filtre sur le département."),
+    date_from: Optional[datetime] = Query(None, description="Début de la fenêtre temporelle (inclus)."),
+    date_to: Optional[datetime] = Query(None, description="Fin de la fenêtre temporelle (exclue)."),
+    conn: asyncpg.Connection = Depends(get_read_connection)
+):
+    """
+    Recherche plein texte dans le texte des feedbacks, via les colonnes tsvector générées
+    (index GIN). Résultats classés par pertinence (ts_rank) ou par date, avec extrait surligné
+    (ts_headline, calculé uniquement pour les lignes de la page) et pagination par curseur.
+    """
+    if lang not in FEEDBACK_SEARCH_CONFIGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Langue invalide. Valeurs possibles : {', '.join(FEEDBACK_SEARCH_CONFIGS)}")
+    if sort not in ("rank", "recent"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Tri invalide. Valeurs possibles : rank, recent")
+    search_column, search_config = FEEDBACK_SEARCH_CONFIGS[lang]
+
+    try:
+        params: List[Any] = [search_config, q]
+        rank_expression = f"ts_rank(f.{search_column}, query.tsq)"
+        conditions = [f"f.{search_column} @@ query.tsq"]
+
+        if department:
+            params.append(department.strip())
+            conditions.append(f"f.department = ${len(params)}")
+        if date_from is not None:
+            params.append(date_from)
+            conditions.append(f"f.timestamp >= ${len(params)}")
+        if date_to is not None:
+            params.append(date_to)
+            conditions.append(f"f.timestamp < ${len(params)}")
+        if cursor:
+            # Un curseur produit par l'autre tri est refusé (400)
+            position = decode_cursor(cursor, ("rank", "id") if sort == "rank" else ("ts", "id"))
+            if sort == "rank":
+                params.extend([position["rank"], position["id"]])
+                conditions.append(f"({rank_expression}, f.id) < (${len(params) - 1}::real, ${len(params)})")
+            else:
+                params.extend([position["ts"], position["id"]])
+                conditions.append(f"(f.timestamp, f.id) < (${len(params) - 1}, ${len(params)})")
+
+        order_by = "rank DESC, id DESC" if sort == "rank" else "timestamp DESC, id DESC"
+        params.append(limit + 1)
+        rows = await conn.fetch(f"""
+            WITH query AS (SELECT websearch_to_tsquery($1::regconfig, $2) AS tsq),
+            page AS (
+                SELECT f.id, f.patient_id, f.text, f.note, f.emoji, f.timestamp, f.department,
+                       {rank_expression} AS rank
+                FROM feedbacks f, query
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {order_by}
+                LIMIT ${len(params)}
+            )
+            SELECT page.*,
+                   -- Texte saisi par le patient échappé avant l'ajout des balises <mark> : highlight est du HTML sûr
+                   ts_headline($1::regconfig,
+                               replace(replace(replace(page.text, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'),
+                               query.tsq, '{FEEDBACK_SEARCH_HEADLINE_OPTIONS}') AS highlight
+            FROM page, query
+            ORDER BY {order_by};
+        """, *params)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            if sort == "rank":
+                next_cursor = encode_cursor({"rank": last["rank"], "id": last["id"]})
+            else:
+                next_cursor = encode_cursor({"ts": last["timestamp"], "id": last["id"]})
+
+        return app.models.FeedbackSearchPageOut(
+            items=[app.models.FeedbackSearchHit(**dict(row)) for row in rows],
+            next_cursor=next_cursor
+        )
+
+    except HTTPException as http_err:
+        raise http_err
+    except Exception as e:
+        logger.exception("Erreur lors de la recherche dans les feedbacks.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur serveur lors de la recherche dans les feedbacks: {e}"
+        )
+
+# --- Route POST /feedbacks/bulk ---
+FEEDBACK_BULK_MAX_RECORDS = int(os.getenv("FEEDBACK_BULK_MAX_RECORDS", "10000"))
+FEEDBACK_COPY_COLUMNS = [
+    "id", "patient_id", "text", "note", "emoji", "patient_age",
+    "patient_gender", "department", "wait_time_min", "resolution_time_min"
+]
+
+def _parse_bulk_feedback_body(body: bytes, content_type: str):
+    """
+    Découpe le corps d'une requête bulk en objets JSON bruts.
+    Retourne (objets, erreurs) ; une ligne NDJSON illisible n'invalide que cet enregistrement.
+    """
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Corps invalide : UTF-8 attendu (octet invalide en position {e.start}).")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        raw_records, parse_errors = [], []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                raw_records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                parse_errors.append(app.models.BulkFeedbackError(index=len(raw_records), errors=[f"JSON invalide: {e.msg}"]))
+                raw_records.append(None)
+        return raw_records, parse_errors
+
+    try:
+        raw_records = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Corps JSON invalide: {e.msg}")
+    if not isinstance(raw_records, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Le corps doit être un tableau JSON ou du NDJSON (application/x-ndjson).")
+    return raw_records, []
+
+@router.post("/feedbacks/bulk", status_code=status.HTTP_201_CREATED, response_model=app.models.BulkFeedbackResult)
+async def create_feedbacks_bulk(
+    request: Request,
+    analyze: bool = Query(False, description="Mettre en file l'analyse IA de chaque feedback inséré."),
+    conn: asyncpg.Connection = Depends(get_connection)
+):
+    """
+    Enregistre un lot de feedbacks (tableau JSON ou NDJSON de FeedbackIn) en un seul COPY.
+    Chaque enregistrement est validé individuellement : les enregistrements invalides sont
+    signalés dans `errors` (par position) sans empêcher l'insertion des autres.
+    """
+    raw_records, errors = _parse_bulk_feedback_body(await request.body(), request.headers.get("content-type", ""))
+
+    if len(raw_records) > FEEDBACK_BULK_MAX_RECORDS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Lot trop volumineux ({len(raw_records)} enregistrements, maximum {FEEDBACK_BULK_MAX_RECORDS}).")
+
+    # Emplacements des lignes NDJSON illisibles, déjà signalées dans `errors`
+    unparsed_indexes = {error.index for error in errors}
+    valid_indexes: List[int] = []
+    valid_feedbacks: List[app.models.FeedbackIn] = []
+    for index, raw_record in enumerate(raw_records):
+        if index in unparsed_indexes:
+            continue
+        if not isinstance(raw_record, dict):
+            errors.append(app.models.BulkFeedbackError(index=index, errors=["L'enregistrement doit être un objet JSON."]))
+            continue
+        try:
+            valid_feedbacks.append(app.models.FeedbackIn(**raw_record))
+            valid_indexes.append(index)
+        except ValidationError as e:
+            errors.append(app.models.BulkFeedbackError(
+                index=index,
+                errors=[f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()]
+            ))
+    errors.sort(key=lambda error: error.index)
+
+    if not valid_feedbacks:
+        return app.models.BulkFeedbackResult(received=len(raw_records), inserted=0, created=[], errors=errors)
+
+    try:
+        async with conn.transaction():
+            # COPY ne sait pas renvoyer les identifiants : on les réserve d'abord dans la séquence
+            id_rows = await conn.fetch(
+                "SELECT nextval(pg_get_serial_sequence('feedbacks', 'id')) AS id FROM generate_series(1, $1);",
+                len(valid_feedbacks)
+            )
+            ids = [id_row["id"] for id_row in id_rows]
+
+            records = [
+                (
+                    feedback_id,
+                    feedback.patient_id.strip(),
+                    feedback.text.strip(),
+                    feedback.note,
+                    feedback.emoji.strip() if feedback.emoji else None,
+                    feedback.patient_age,
+                    feedback.patient_gender.strip() if feedback.patient_gender else None,
+                    feedback.department.strip() if feedback.department else None,
+                    feedback.wait_time_min,
+                    feedback.resolution_time_min
+                )
+                for feedback_id, feedback in zip(ids, valid_feedbacks)
+            ]
+            await conn.copy_records_to_table("feedbacks", records=records, columns=FEEDBACK_COPY_COLUMNS)
+
+            if analyze:
+                await conn.copy_records_to_table(
+                    "analysis_jobs", records=[(feedback_id,) for feedback_id in ids], columns=["feedback_id"]
+                )
+
+        if analyze:
+            wake_analysis_workers()
+
+        return app.models.BulkFeedbackResult(
+            received=len(raw_records),
+            inserted=len(ids),
+            created=[app.models.BulkFeedbackCreated(index=index, id=feedback_id) for index, feedback_id in zip(valid_indexes, ids)],
+            errors=errors,
+            analysis_jobs_queued=len(ids) if analyze else 0
+        )
+
+    except asyncpg.exceptions.PostgresError as e:
+        logger.error(f"PostgreSQL error during bulk feedback creation: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur de la base de données: {e}"
+        )
+    except Exception as e:
+        logger.exception("Erreur inattendue lors de l'enregistrement du lot de feedbacks.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur inattendue lors du traitement du lot de feedbacks: {e}"
+        )
+
+# --- Routes POST/GET /feedbacks/analyze-backlog ---
+@router.post("/feedbacks/analyze-backlog", status_code=status.HTTP_202_ACCEPTED, response_model=app.models.BacklogProgressOut)
+async def start_analysis_backlog(
+    concurrency: int = Query(BACKLOG_CONCURRENCY, ge=1, le=64, description="Appels simultanés au service AI."),
+    batch_size: int = Query(BACKLOG_BATCH_SIZE, ge=1, le=1000, description="Nombre d'analyses écrites par insertion."),
+    limit: Optional[int] = Query(None, ge=1, description="Nombre maximum de feedbacks à traiter."),
+):
+    """
+    Lance en tâche de fond l'analyse de tous les feedbacks qui n'ont pas encore d'analyse IA
+    (par exemple après une panne du service AI). L'avancement se suit via GET /feedbacks/analyze-backlog.
+    Équivalent en ligne de commande : `python -m app.backlog --concurrency 8`.
+    """
+    try:
+        progress = start_backlog_run(concurrency=concurrency, batch_size=batch_size, limit=limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return app.models.BacklogProgressOut(**progress.snapshot())
+
+@router.get("/feedbacks/analyze-backlog", response_model=app.models.BacklogProgressOut)
+async def get_analysis_backlog_progress():
+    """
+    Retourne l'avancement et le débit de la dernière passe de rattrapage lancée par ce processus.
+    """
+    progress = get_backlog_progress()
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Aucune passe de rattrapage lancée.")
+    return app.models.BacklogProgressOut(**progress.snapshot())
+
 # --- Route GET /feedback/{feedback_id} ---
 @router.get("/feedback/{feedback_id}", response_model=Dict[str, Any])
 async def get_feedback_with_analysis(
@@ -351,24 +573,10 @@ async def get_feedback_with_analysis(
 
         analysis_out = None
         if analysis_row:
-            # Désérialiser explicitement la chaîne JSON en dict
-            analysis_data_raw = analysis_row["analysis"]
-            if isinstance(analysis_data_raw, str):
-                analysis_dict = json.loads(analysis_data_raw)
-            else:
-                analysis_dict = analysis_data_raw or {}
-
-            # Désérialiser explicitement la chaîne JSON en liste
-            recommendations_data_raw = analysis_row["recommendations"]
-            if isinstance(recommendations_data_raw, str):
-                recommendations_list = json.loads(recommendations_data_raw)
-            else:
-                recommendations_list = recommendations_data_raw or []
-
             analysis_out = app.models.AnalysisOut(
                 feedback_id=feedback_id,
-                analysis=app.models.AnalysisDataOut(**analysis_dict),
-                recommendations=recommendations_list,
+                analysis=app.models.AnalysisDataOut(**(analysis_row["analysis"] or {})),
+                recommendations=analysis_row["recommendations"] or [],
                 analysis_timestamp=analysis_row["analysis_timestamp"]
             )
 
@@ -418,7 +626,11 @@ async def analyze_and_save_feedback(
             resolution_time_min_from_db = feedback_row.get("resolution_time_min")
 
             # 2. Vérifier si une analyse existe déjà pour ce feedback_id
-            analysis_exists = await conn.fetchval("SELECT id FROM ai_analysis WHERE feedback_id = $1;", feedback_id)
+            # Une analyse provisoire (service AI indisponible) peut être refaite
+            analysis_exists = await conn.fetchval("""
+                SELECT id FROM ai_analysis
+                WHERE feedback_id = $1 AND COALESCE(analysis ->> 'provisional', 'false') <> 'true';
+            """, feedback_id)
             if analysis_exists is not None:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Une analyse existe déjà pour ce feedback.")
 
@@ -434,44 +646,17 @@ async def analyze_and_save_feedback(
                 rating=float(note_from_db) if note_from_db is not None else None
             )
 
-            # Convertir en modèle Pydantic AnalysisIn pour validation avant sauvegarde
-            analysis_payload = app.models.AnalysisIn(**ai_response_data_parsed)
-
-            # 4. Insérer l'analyse et les recommandations dans la table ai_analysis
-            insert_query = """
-                INSERT INTO ai_analysis (feedback_id, analysis, recommendations)
-                VALUES ($1, $2::jsonb, $3::jsonb)
-                RETURNING id, feedback_id, analysis, recommendations, analysis_timestamp;
-            """
-            inserted_row = await conn.fetchrow(
-                insert_query,
-                feedback_id,
-                json.dumps(analysis_payload.analysis.model_dump(mode='json')),
-                json.dumps(analysis_payload.recommendations) if analysis_payload.recommendations is not None else '[]'
-            )
+            # 4. Valider et insérer l'analyse et les recommandations dans la table ai_analysis
+            inserted_row = await save_ai_analysis(conn, feedback_id, ai_response_data_parsed)
 
             if inserted_row is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                                    detail="Échec de l'enregistrement de l'analyse IA.")
-
-            # Préparer les données d'analyse pour le modèle de sortie
-            analysis_data_raw = inserted_row["analysis"]
-            if isinstance(analysis_data_raw, str):
-                analysis_dict = json.loads(analysis_data_raw)
-            else:
-                analysis_dict = analysis_data_raw or {}
-
-            # Préparer les données de recommandations pour le modèle de sortie
-            recommendations_data_raw = inserted_row["recommendations"]
-            if isinstance(recommendations_data_raw, str):
-                recommendations_list = json.loads(recommendations_data_raw)
-            else:
-                recommendations_list = recommendations_data_raw or []
+                # Analyse enregistrée par un autre chemin (job, rattrapage) pendant l'appel AI
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Une analyse existe déjà pour ce feedback.")
 
             return app.models.AnalysisOut(
                 feedback_id=inserted_row["feedback_id"],
-                analysis=app.models.AnalysisDataOut(**analysis_dict),
-                recommendations=recommendations_list,
+                analysis=app.models.AnalysisDataOut(**(inserted_row["analysis"] or {})),
+                recommendations=inserted_row["recommendations"] or [],
                 analysis_timestamp=inserted_row["analysis_timestamp"]
             )
 
@@ -490,47 +675,47 @@ async def analyze_and_save_feedback(
 # --- Route GET /insights ---
 @router.get("/insights", response_model=List[app.models.AnalysisOut])
 async def get_all_analyses(
-    conn: asyncpg.Connection = Depends(get_connection)
+    request: Request,
+    date_from: Optional[datetime] = Query(None, description="Début de la fenêtre temporelle sur la date d'analyse (inclus)."),
+    date_to: Optional[datetime] = Query(None, description="Fin de la fenêtre temporelle sur la date d'analyse (exclue)."),
 ):
     """
-    Récupère toutes les analyses IA enregistrées.
+    Récupère les analyses IA enregistrées, éventuellement sur une fenêtre de dates :
+    seules les partitions mensuelles de ai_analysis couvrant la fenêtre sont lues.
+    Réponse mise en cache (ETag / If-None-Match), invalidée à chaque écriture dans ai_analysis.
     """
-    try:
-        rows = await conn.fetch("""
-            SELECT feedback_id, analysis, recommendations, analysis_timestamp
-            FROM ai_analysis
-            ORDER BY analysis_timestamp DESC;
-        """)
-
-        if not rows:
-            return []
+    async def load_insights():
+        conditions = []
+        params: List[Any] = []
+        if date_from is not None:
+            params.append(date_from)
+            conditions.append(f"analysis_timestamp >= ${len(params)}")
+        if date_to is not None:
+            params.append(date_to)
+            conditions.append(f"analysis_timestamp < ${len(params)}")
+        query = "SELECT feedback_id, analysis, recommendations, analysis_timestamp FROM ai_analysis"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY analysis_timestamp DESC;"
+
+        async with acquire_connection() as conn:
+            rows = await conn.fetch(query, *params)
 
         insights = []
         for row in rows:
-            # Désérialiser explicitement la chaîne JSON en dict
-            analysis_data_raw = row["analysis"]
-            if isinstance(analysis_data_raw, str):
-                analysis_dict = json.loads(analysis_data_raw)
-            else:
-                analysis_dict = analysis_data_raw or {}
-
-            # Désérialiser explicitement la chaîne JSON en liste
-            recommendations_data_raw = row["recommendations"]
-            if isinstance(recommendations_data_raw, str):
-                recommendations_list = json.loads(recommendations_data_raw)
-            else:
-                recommendations_list = recommendations_data_raw or []
-
             insights.append(
                 app.models.AnalysisOut(
                     feedback_id=row["feedback_id"],
-                    analysis=app.models.AnalysisDataOut(**analysis_dict),
-                    recommendations=recommendations_list,
+                    analysis=app.models.AnalysisDataOut(**(row["analysis"] or {})),
+                    recommendations=row["recommendations"] or [],
                     analysis_timestamp=row["analysis_timestamp"]
                 )
             )
         return insights
 
+    try:
+        return await cached_json_response(request, ("ai_analysis",), load_insights)
+
     except Exception as e:
         logger.exception("Erreur lors de la récupération des analyses IA.")
         raise HTTPException(
@@ -538,47 +723,255 @@ async def get_all_analyses(
             detail=f"Erreur serveur lors de la récupération des insights: {e}"
         )
 
-# --- Route GET /recommendations ---
-@router.get("/recommendations", response_model=List[app.models.RecommendationOut])
-async def get_all_recommendations(
-    conn: asyncpg.Connection = Depends(get_connection)
+# --- Route GET /insights/summary ---
+INSIGHTS_SUMMARY_BUCKETS = ("day", "week", "month")
+
+@router.get("/insights/summary", response_model=List[app.models.InsightsSummaryBucketOut])
+async def get_insights_summary(
+    request: Request,
+    bucket: str = Query("day", description="Granularité temporelle : 'day', 'week' ou 'month'."),
+    department: Optional[str] = Query(None, description="Filtre sur le département."),
+    date_from: Optional[date] = Query(None, description="Premier jour inclus (date du feedback)."),
+    date_to: Optional[date] = Query(None, description="Dernier jour exclu (date du feedback)."),
 ):
     """
-    Récupère toutes les recommandations extraites des analyses IA.
+    Agrégats des analyses IA par département et par période : nombre de feedbacks par
+    sentiment principal, urgence moyenne, score de risque moyen et temps d'attente moyen.
+    Lit uniquement la table insights_daily_summary, tenue à jour par trigger à chaque
+    écriture dans ai_analysis : le coût ne dépend pas du nombre total de feedbacks.
+    Réponse mise en cache (ETag / If-None-Match), invalidée à chaque écriture dans ai_analysis.
     """
+    if bucket not in INSIGHTS_SUMMARY_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Granularité invalide. Valeurs possibles : {', '.join(INSIGHTS_SUMMARY_BUCKETS)}"
+        )
+
+    async def load_summary():
+        conditions = []
+        params: List[Any] = [bucket]
+        if department:
+            params.append(department.strip())
+            conditions.append(f"department = ${len(params)}")
+        if date_from is not None:
+            params.append(date_from)
+            conditions.append(f"day >= ${len(params)}")
+        if date_to is not None:
+            params.append(date_to)
+            conditions.append(f"day < ${len(params)}")
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        async with acquire_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT department,
+                       date_trunc($1, day)::date AS bucket_start,
+                       primary_sentiment,
+                       SUM(feedback_count) AS feedback_count,
+                       SUM(urgency_sum) AS urgency_sum, SUM(urgency_count) AS urgency_count,
+                       SUM(risk_score_sum) AS risk_score_sum, SUM(risk_score_count) AS risk_score_count,
+                       SUM(wait_time_sum) AS wait_time_sum, SUM(wait_time_count) AS wait_time_count
+                FROM insights_daily_summary
+                {where_clause}
+                GROUP BY department, bucket_start, primary_sentiment
+                HAVING SUM(feedback_count) > 0
+                ORDER BY bucket_start DESC, department;
+            """, *params)
+
+        # Regroupement des sentiments d'un même (département, période) en une seule entrée
+        buckets: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row["department"], row["bucket_start"])
+            totals = buckets.setdefault(key, {
+                "sentiment_counts": {}, "feedback_count": 0,
+                "urgency_sum": 0.0, "urgency_count": 0,
+                "risk_score_sum": 0.0, "risk_score_count": 0,
+                "wait_time_sum": 0.0, "wait_time_count": 0,
+            })
+            sentiment = row["primary_sentiment"] or "unknown"
+            totals["sentiment_counts"][sentiment] = totals["sentiment_counts"].get(sentiment, 0) + row["feedback_count"]
+            for column in ("feedback_count", "urgency_sum", "urgency_count", "risk_score_sum",
+                           "risk_score_count", "wait_time_sum", "wait_time_count"):
+                totals[column] += row[column]
+
+        def average(total, count):
+            return round(total / count, 2) if count else None
+
+        return [
+            app.models.InsightsSummaryBucketOut(
+                department=department_name or None,
+                bucket_start=bucket_start,
+                feedback_count=totals["feedback_count"],
+                sentiment_counts=totals["sentiment_counts"],
+                avg_urgency_level=average(totals["urgency_sum"], totals["urgency_count"]),
+                avg_risk_score=average(totals["risk_score_sum"], totals["risk_score_count"]),
+                avg_wait_time_min=average(totals["wait_time_sum"], totals["wait_time_count"])
+            )
+            for (department_name, bucket_start), totals in buckets.items()
+        ]
+
     try:
-        rows = await conn.fetch("""
-            SELECT feedback_id, recommendations, analysis_timestamp
-            FROM ai_analysis
-            WHERE recommendations IS NOT NULL AND jsonb_array_length(recommendations) > 0
-            ORDER BY analysis_timestamp DESC;
-        """)
+        return await cached_json_response(request, ("ai_analysis", "feedbacks"), load_summary)
+
+    except Exception as e:
+        logger.exception("Erreur lors de la récupération du résumé des insights.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur serveur lors de la récupération du résumé des insights: {e}"
+        )
 
-        if not rows:
-            return []
+# --- Route GET /insights/stream ---
+@router.get("/insights/stream")
+async def stream_urgent_analyses(
+    request: Request,
+    min_urgency: int = Query(4, ge=MIN_URGENCY_FLOOR, le=5, description="Urgence minimale (urgency_level) d'une analyse poussée."),
+    min_risk_level: str = Query("high", description="Niveau de risque minimal poussé : 'medium' ou 'high'."),
+):
+    """
+    Flux Server-Sent Events des nouvelles analyses IA urgentes : une analyse est poussée
+    si son urgency_level atteint `min_urgency` OU si son risk_level atteint `min_risk_level`.
+    Alimenté par LISTEN/NOTIFY sur la connexion dédiée du processus ; l'en-tête Last-Event-ID
+    (envoyé automatiquement par EventSource à la reconnexion) renvoie les analyses manquées.
+    """
+    if min_risk_level not in ("medium", "high"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="min_risk_level doit valoir 'medium' ou 'high'.")
+    if not stream_available():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Flux temps réel momentanément indisponible (connexion LISTEN).")
 
-        recommendations_list = []
-        for row in rows:
-            feedback_id = row["feedback_id"]
-            # Désérialiser explicitement la chaîne JSON en list
-            recommendations_jsonb_raw = row["recommendations"]
-            if isinstance(recommendations_jsonb_raw, str):
-                recommendations_jsonb = json.loads(recommendations_jsonb_raw)
-            else:
-                recommendations_jsonb = recommendations_jsonb_raw or []
-            
-            timestamp = row["analysis_timestamp"]
-
-            if recommendations_jsonb and isinstance(recommendations_jsonb, list):
-                for rec_text in recommendations_jsonb:
-                    recommendations_list.append(
-                        app.models.RecommendationOut(
-                            feedback_id=feedback_id,
-                            recommendation=rec_text,
-                            timestamp=timestamp
-                        )
+    last_event_id = None
+    last_event_header = request.headers.get("last-event-id")
+    if last_event_header:
+        try:
+            last_event_id = int(last_event_header)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="En-tête Last-Event-ID invalide.")
+
+    try:
+        subscriber = broadcaster.subscribe(min_urgency, min_risk_level)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    return StreamingResponse(
+        urgent_analysis_events(request, subscriber, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Route GET /recommendations ---
+@router.get(
+    "/recommendations",
+    response_model=Union[app.models.RecommendationPageOut, app.models.RecommendationFrequencyPageOut]
+)
+async def get_all_recommendations(
+    request: Request,
+    distinct: bool = Query(False, description="Regroupe les recommandations identiques avec leur fréquence, des plus fréquentes aux plus rares."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum de recommandations par page."),
+    cursor: Optional[str] = Query(None, description="Curseur `next_cursor` renvoyé par la page précédente."),
+    department: Optional[str] = Query(None, description="Filtre sur le département du feedback."),
+    date_from: Optional[datetime] = Query(None, description="Début de la fenêtre temporelle sur la date d'analyse (inclus)."),
+    date_to: Optional[datetime] = Query(None, description="Fin de la fenêtre temporelle sur la date d'analyse (exclue)."),
+):
+    """
+    Recommandations extraites des analyses IA. Le dépliage des listes JSONB est fait par
+    PostgreSQL (jsonb_array_elements WITH ORDINALITY) : seule la page demandée est transférée.
+    Par défaut, une ligne par recommandation, des analyses les plus récentes aux plus anciennes ;
+    avec `distinct=true`, chaque recommandation une seule fois avec son nombre d'occurrences.
+    Réponse mise en cache (ETag / If-None-Match), invalidée à chaque écriture dans ai_analysis.
+    """
+    # Un curseur produit par l'autre mode est refusé (400)
+    cursor_fields = ("freq", "rec") if distinct else ("ts", "id", "pos")
+    position = decode_cursor(cursor, cursor_fields) if cursor else None
+
+    async def load_recommendations():
+        params: List[Any] = []
+        joins = ""
+        conditions = ["jsonb_typeof(a.recommendations) = 'array'"]
+        if department:
+            params.append(department.strip())
+            joins = f"JOIN feedbacks f ON f.id = a.feedback_id AND f.department = ${len(params)}"
+        if date_from is not None:
+            params.append(date_from)
+            conditions.append(f"a.analysis_timestamp >= ${len(params)}")
+        if date_to is not None:
+            params.append(date_to)
+            conditions.append(f"a.analysis_timestamp < ${len(params)}")
+        source = f"""
+            FROM ai_analysis a
+            {joins}
+            CROSS JOIN LATERAL jsonb_array_elements(a.recommendations) WITH ORDINALITY AS r(value, position)
+        """
+
+        async with acquire_connection() as conn:
+            if distinct:
+                page_conditions = []
+                if position:
+                    params.extend([position["freq"], position["rec"]])
+                    page_conditions.append(
+                        f"(frequency < ${len(params) - 1} OR (frequency = ${len(params) - 1} AND recommendation > ${len(params)}))"
                     )
-        return recommendations_list
+                params.append(limit + 1)
+                rows = await conn.fetch(f"""
+                    SELECT recommendation, frequency, last_seen
+                    FROM (
+                        SELECT r.value #>> '{{}}' AS recommendation,
+                               COUNT(*) AS frequency,
+                               MAX(a.analysis_timestamp) AS last_seen
+                        {source}
+                        WHERE {' AND '.join(conditions)}
+                        GROUP BY 1
+                    ) grouped
+                    {'WHERE ' + ' AND '.join(page_conditions) if page_conditions else ''}
+                    ORDER BY frequency DESC, recommendation
+                    LIMIT ${len(params)};
+                """, *params)
+
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = encode_cursor({"freq": rows[-1]["frequency"], "rec": rows[-1]["recommendation"]})
+                return app.models.RecommendationFrequencyPageOut(
+                    items=[app.models.RecommendationFrequencyOut(**row) for row in rows],
+                    next_cursor=next_cursor
+                )
+
+            if position:
+                # Ordre : analyses les plus récentes d'abord, puis ordre de la liste dans chaque analyse
+                params.extend([position["ts"], position["id"], position["pos"]])
+                conditions.append(
+                    f"(a.analysis_timestamp, a.id) <= (${len(params) - 2}, ${len(params) - 1})"
+                    f" AND NOT (a.analysis_timestamp = ${len(params) - 2} AND a.id = ${len(params) - 1}"
+                    f" AND r.position <= ${len(params)})"
+                )
+            params.append(limit + 1)
+            rows = await conn.fetch(f"""
+                SELECT a.id, a.feedback_id, a.analysis_timestamp, r.position,
+                       r.value #>> '{{}}' AS recommendation
+                {source}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY a.analysis_timestamp DESC, a.id DESC, r.position
+                LIMIT ${len(params)};
+            """, *params)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor({"ts": last["analysis_timestamp"], "id": last["id"], "pos": last["position"]})
+        return app.models.RecommendationPageOut(
+            items=[
+                app.models.RecommendationOut(
+                    feedback_id=row["feedback_id"],
+                    recommendation=row["recommendation"],
+                    timestamp=row["analysis_timestamp"]
+                )
+                for row in rows
+            ],
+            next_cursor=next_cursor
+        )
+
+    try:
+        return await cached_json_response(request, ("ai_analysis", "feedbacks"), load_recommendations)
 
     except Exception as e:
         logger.exception("Erreur lors de la récupération des recommandations.")
@@ -587,8 +980,40 @@ async def get_all_recommendations(
             detail=f"Erreur serveur lors de l'extraction des recommandations: {e}"
         )
 
+# --- Route GET /export/{dataset} ---
+@router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", description="Format de l'export : 'ndjson' ou 'csv'."),
+    date_from: Optional[datetime] = Query(None, description="Début de la fenêtre temporelle (inclus)."),
+    date_to: Optional[datetime] = Query(None, description="Fin de la fenêtre temporelle (exclue)."),
+):
+    """
+    Exporte en flux continu les feedbacks (`feedbacks`) ou les analyses IA (`insights`)
+    au format NDJSON ou CSV, à partir d'un curseur PostgreSQL côté serveur.
+    La mémoire du worker reste constante quelle que soit la taille de la table.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Jeu de données inconnu. Valeurs possibles : {', '.join(EXPORT_DATASETS)}.")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Format invalide. Valeurs possibles : 'ndjson', 'csv'.")
+
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(dataset, format, date_from, date_to),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # --- NOUVELLES ROUTES: Demandes de Rappel ---
 
+# Statuts possibles d'une demande de rappel (colonne recall_requests.status)
+RECALL_REQUEST_STATUSES = ("pending", "approved", "rejected", "completed")
+# Nombre maximum de demandes modifiées par un PUT /recall-requests/status en mode filtre
+RECALL_STATUS_BATCH_MAX_ROWS = int(os.getenv("RECALL_STATUS_BATCH_MAX_ROWS", "1000"))
+
 @router.post("/recall-requests", status_code=status.HTTP_201_CREATED, response_model=app.models.RecallRequestOut)
 async def create_recall_request(
     recall_request: app.models.RecallRequestIn,
@@ -638,13 +1063,14 @@ async def create_recall_request(
 
 @router.get("/recall-requests", response_model=List[app.models.RecallRequestOut])
 async def get_all_recall_requests(
-    status_filter: Optional[str] = None,
-    conn: asyncpg.Connection = Depends(get_connection)
+    request: Request,
+    status_filter: Optional[str] = None
 ):
     """
     Récupère toutes les demandes de rappel/rendez-vous, avec option de filtrage par statut.
+    Réponse mise en cache (ETag / If-None-Match), invalidée à chaque écriture dans recall_requests.
     """
-    try:
+    async def load_recall_requests():
         query = """
             SELECT id, patient_id, request_object, requested_date, request_timestamp, status, approved_by, approval_date
             FROM recall_requests
@@ -655,9 +1081,13 @@ async def get_all_recall_requests(
             params.append(status_filter.strip())
         query += " ORDER BY request_timestamp DESC;"
 
-        rows = await conn.fetch(query, *params)
+        async with acquire_connection() as conn:
+            rows = await conn.fetch(query, *params)
 
         return [app.models.RecallRequestOut(**row) for row in rows]
+
+    try:
+        return await cached_json_response(request, ("recall_requests",), load_recall_requests)
     except Exception as e:
         logger.exception("Erreur lors de la récupération des demandes de rappel.")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -691,6 +1121,85 @@ async def get_recall_request_by_id(
                             detail=f"Erreur serveur lors de la récupération de la demande de rappel: {e}"
         )
 
+# --- Route PUT /recall-requests/status ---
+@router.put("/recall-requests/status", response_model=app.models.RecallRequestStatusBatchResult)
+async def update_recall_requests_status_batch(
+    batch: app.models.RecallRequestStatusBatchIn,
+    conn: asyncpg.Connection = Depends(get_connection)
+):
+    """
+    Met à jour le statut de plusieurs demandes de rappel en une seule instruction UPDATE
+    (liste de médecin : approbation ou refus groupé). Les demandes sont désignées soit par
+    `ids`, soit par un filtre (`current_status`, `patient_id`) ; le résultat est détaillé par ID.
+    En mode filtre, la requête est refusée si plus de RECALL_STATUS_BATCH_MAX_ROWS demandes correspondent.
+    """
+    try:
+        new_status = batch.new_status.strip()
+        if new_status not in RECALL_REQUEST_STATUSES:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Statut invalide.")
+        current_status = batch.current_status.strip() if batch.current_status is not None else None
+        patient_id = batch.patient_id.strip() if batch.patient_id is not None else None
+        has_filter = bool(current_status) or bool(patient_id)
+        if (batch.ids is None) == (not has_filter):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Indiquer soit 'ids', soit un filtre non vide ('current_status', 'patient_id').")
+        if current_status and current_status not in RECALL_REQUEST_STATUSES:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Statut de filtre invalide.")
+
+        async with conn.transaction():
+            if batch.ids is not None:
+                # Doublons retirés en conservant l'ordre de la requête
+                requested_ids = list(dict.fromkeys(batch.ids))
+            else:
+                # Le filtre est résolu en IDs (lignes verrouillées) pour borner le nombre de demandes modifiées
+                params: List[Any] = []
+                conditions = []
+                if current_status:
+                    params.append(current_status)
+                    conditions.append(f"status = ${len(params)}")
+                if patient_id:
+                    params.append(patient_id)
+                    conditions.append(f"patient_id = ${len(params)}")
+                params.append(RECALL_STATUS_BATCH_MAX_ROWS + 1)
+                matching = await conn.fetch(f"""
+                    SELECT id FROM recall_requests
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY id
+                    LIMIT ${len(params)}
+                    FOR UPDATE;
+                """, *params)
+                if len(matching) > RECALL_STATUS_BATCH_MAX_ROWS:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Le filtre désigne plus de {RECALL_STATUS_BATCH_MAX_ROWS} demandes : le restreindre ou passer par 'ids'."
+                    )
+                requested_ids = [row["id"] for row in matching]
+
+            rows = await conn.fetch("""
+                UPDATE recall_requests
+                SET status = $1, approved_by = $2, approval_date = CURRENT_TIMESTAMP
+                WHERE id = ANY($3::int[])
+                RETURNING id, patient_id, request_object, requested_date, request_timestamp, status, approved_by, approval_date;
+            """, new_status, batch.approved_by.strip(), requested_ids)
+
+        updated = {row["id"]: app.models.RecallRequestOut(**row) for row in rows}
+        return app.models.RecallRequestStatusBatchResult(
+            requested=len(requested_ids),
+            updated=len(updated),
+            results=[
+                app.models.RecallRequestStatusOutcome(id=request_id, outcome="updated" if request_id in updated else "not_found")
+                for request_id in requested_ids
+            ],
+            recall_requests=[updated[request_id] for request_id in requested_ids if request_id in updated]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Erreur lors de la mise à jour groupée du statut des demandes de rappel.")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Erreur serveur lors de la mise à jour groupée du statut: {e}"
+        )
+
 @router.put("/recall-requests/{request_id}/status", response_model=app.models.RecallRequestOut)
 async def update_recall_request_status(
     request_id: int,
@@ -701,7 +1210,7 @@ async def update_recall_request_status(
     """
     Met à jour le statut d'une demande de rappel/rendez-vous.
     """
-    if new_status not in ["pending", "approved", "rejected", "completed"]:
+    if new_status not in RECALL_REQUEST_STATUSES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Statut invalide.")
 
     try:
@@ -786,20 +1295,23 @@ async def create_personalized_message(
         )
 
 @router.get("/personalized-messages", response_model=List[app.models.PersonalizedMessageOut])
-async def get_all_personalized_messages(
-    conn: asyncpg.Connection = Depends(get_connection)
-):
+async def get_all_personalized_messages(request: Request):
     """
     Récupère toutes les messages personnalisés envoyés.
+    Réponse mise en cache (ETag / If-None-Match), invalidée à chaque écriture dans personalized_messages.
     """
-    try:
-        rows = await conn.fetch("""
-            SELECT id, recall_request_id, patient_id, message_content, sent_by, sent_timestamp, ai_message_analysis
-            FROM personalized_messages
-            ORDER BY sent_timestamp DESC;
-        """)
+    async def load_personalized_messages():
+        async with acquire_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT id, recall_request_id, patient_id, message_content, sent_by, sent_timestamp, ai_message_analysis
+                FROM personalized_messages
+                ORDER BY sent_timestamp DESC;
+            """)
 
         return [app.models.PersonalizedMessageOut(**row) for row in rows]
+
+    try:
+        return await cached_json_response(request, ("personalized_messages",), load_personalized_messages)
     except Exception as e:
         logger.exception("Erreur lors de la récupération des messages personnalisés.")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -836,7 +1348,7 @@ async def get_personalized_message_by_id(
 @router.get("/personalized-messages/patient/{patient_id}", response_model=List[app.models.PersonalizedMessageOut])
 async def get_personalized_messages_for_patient(
     patient_id: str,
-    conn: asyncpg.Connection = Depends(get_connection)
+    conn: asyncpg.Connection = Depends(get_read_connection)
 ):
     """
     Récupère tous les messages personnalisés envoyés à un patient spécifique.
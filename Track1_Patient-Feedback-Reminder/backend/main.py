@@ -1,6 +1,14 @@
 from fastapi import FastAPI
 from app.routes import router as feedback_router
-from app.database import get_database_connection_pool, close_database_connection_pool
+from app.database import get_database_connection_pool, close_database_connection_pool, close_read_database_connection_pool
+from app.ai_service import create_ai_http_client, close_ai_http_client
+from app.jobs import start_analysis_workers, stop_analysis_workers
+from app.notifications import notification_listener
+from app.response_cache import start_response_cache
+from app.insights_stream import start_insights_stream
+from app.partitions import start_partition_maintenance, stop_partition_maintenance
+from app.reminders import start_reminder_dispatcher, stop_reminder_dispatcher
+from app.metrics import http_metrics_middleware, metrics_response
 
 app = FastAPI(
     title="Patient Feedback API - Track 1",
@@ -8,6 +16,8 @@ app = FastAPI(
     version="0.1.0",
 )
 
+app.middleware("http")(http_metrics_middleware)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -17,6 +27,15 @@ async def startup_event():
     print("Démarrage de l'application : Connexion à la base de données...")
     app.state.db_pool = await get_database_connection_pool()
     print("Connexion à la base de données établie.")
+    app.state.ai_http_client = create_ai_http_client()
+    app.state.analysis_workers = await start_analysis_workers()
+    # Partitions mensuelles des mois à venir, puis archivage si PARTITION_RETENTION_MONTHS est défini
+    start_partition_maintenance()
+    start_reminder_dispatcher()
+    start_response_cache()
+    start_insights_stream()
+    # Une seule connexion LISTEN par processus pour le cache de réponses et le flux SSE
+    notification_listener.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -24,14 +43,28 @@ async def shutdown_event():
     Ferme la connexion à la base de données PostgreSQL à l'arrêt de l'application.
     """
     print("Arrêt de l'application : Fermeture de la connexion à la base de données...")
+    await notification_listener.stop()
+    await stop_analysis_workers()
+    await stop_partition_maintenance()
+    await stop_reminder_dispatcher()
+    await close_ai_http_client()
     if hasattr(app.state, 'db_pool') and app.state.db_pool:
         await close_database_connection_pool(app.state.db_pool)
+    await close_read_database_connection_pool()
     print("Connexion à la base de données fermée.")
 
 
 # --- Routes ---
 app.include_router(feedback_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Métriques au format texte Prometheus : latence par route, attente du pool,
+    durée des requêtes SQL, appels au service AI et saturation du pool.
+    """
+    return metrics_response()
+
 @app.get("/")
 async def read_root():
     return {"message": "Bienvenue sur l'API Patient Feedback System !"}
\ No newline at end of file